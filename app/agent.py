@@ -1,23 +1,22 @@
 # app/agent.py
-import google.generativeai as genai
-import os
 import json
-from dotenv import load_dotenv
-
-# Load .env from the project root (one level up from 'app' directory)
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
+import logging
+import os
+import re
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
-genai.configure(api_key=GEMINI_API_KEY)
+from .breakdown_cache import CACHE_ENABLED, breakdown_cache, make_cache_key
+from .llm import generate, generate_stream, get_backend
+from .metrics import record_event, span
+from .similarity import SIMILARITY_ENABLED, similarity_index
+from .stream_parser import IncrementalArrayParser, salvage_json_array
 
-# Using the model name specified by the user
-model = genai.GenerativeModel('gemini-2.0-flash-001')
+logger = logging.getLogger(__name__)
 
 TASK_CATEGORIES = ["Frontend", "Backend", "Database", "API", "QA", "DevOps", "Documentation", "Design", "Research"]
 EFFORT_SCALE = ["Small", "Medium", "Large"] # MODIFIED
+# Ask Gemini to fix only the invalid or cut-off tasks of a breakdown instead of discarding it.
+BREAKDOWN_REASK_ENABLED = os.getenv("BREAKDOWN_REASK_ENABLED", "1") != "0"
+_REASK_RAW_TASK_CHARS = 500
 
 def generate_task_breakdown_prompt(use_case_description):
     prompt = f"""
@@ -46,65 +45,252 @@ def generate_task_breakdown_prompt(use_case_description):
     """
     return prompt
 
-def split_use_case_into_tasks(use_case_description):
+REQUIRED_TASK_KEYS = ["title", "description", "category", "effort"]
+
+def task_validation_error(task, check_category=False):
+    """Returns why a task object from Gemini is invalid, or None if it is valid."""
+    if not isinstance(task, dict):
+        return "Task is not a dictionary."
+    if not all(key in task for key in REQUIRED_TASK_KEYS):
+        return "Task is missing one or more required keys (title, description, category, effort)."
+    if task.get("effort") not in EFFORT_SCALE:
+        return f"Task has an invalid effort value '{task.get('effort')}'. Expected one of {EFFORT_SCALE}."
+    if check_category and task.get("category") not in TASK_CATEGORIES:
+        return f"Task has an invalid category '{task.get('category')}'. Expected one of {TASK_CATEGORIES}."
+    return None
+
+def normalize_title(title):
+    """Lower-cased title with punctuation dropped and whitespace collapsed, for matching titles Gemini echoes back."""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(title or "")).lower().split())
+
+def normalize_task(task):
+    """
+    Returns a copy of a task object with trivially fixable values corrected: effort and category
+    are matched case-insensitively against EFFORT_SCALE and TASK_CATEGORIES. Non-dicts are returned as is.
+    """
+    if not isinstance(task, dict):
+        return task
+    task = dict(task)
+    for key, allowed in (("effort", EFFORT_SCALE), ("category", TASK_CATEGORIES)):
+        value = task.get(key)
+        if isinstance(value, str) and value not in allowed:
+            task[key] = next((option for option in allowed if option.lower() == value.strip().lower()), value)
+    return task
+
+def parse_task_list(text):
+    """
+    Extracts the valid tasks from a breakdown response, even if it is malformed or truncated.
+    Returns (tasks, rejected, truncated) where rejected holds (task or raw text, reason) pairs.
+    """
+    items, errors, truncated = salvage_json_array(text)
+    tasks = []
+    rejected = [(raw, f"Invalid JSON: {error}") for raw, error in errors]
+    for item in items:
+        task = normalize_task(item)
+        error = task_validation_error(task)
+        if error:
+            rejected.append((item, error))
+        else:
+            tasks.append(task)
+    return tasks, rejected, truncated
+
+def generate_breakdown_repair_prompt(use_case_description, accepted_tasks, rejected, truncated):
+    """
+    Generates a follow-up prompt that asks only for corrected versions of the rejected tasks and,
+    if the previous answer was cut off, for the tasks that are still missing.
+    """
+    accepted_titles = "\n".join(f"    - {task['title']}" for task in accepted_tasks) or "    (none)"
+    rejected_lines = "\n".join(
+        f"    - {(raw if isinstance(raw, str) else json.dumps(raw))[:_REASK_RAW_TASK_CHARS]}\n      Problem: {reason}"
+        for raw, reason in rejected
+    )
+    problems = []
+    if rejected:
+        problems.append(f"These tasks from your previous answer were invalid:\n{rejected_lines}")
+    if truncated:
+        problems.append("Your previous answer was cut off before the JSON list was closed, so some tasks may be missing.")
+    problems_text = "\n\n    ".join(problems)
+    prompt = f"""
+    You are an expert AI project manager and software architect.
+    You already broke down the use case below into technical sub-tasks, but part of your answer could not be used.
+
+    These tasks were accepted and must NOT be repeated:
+{accepted_titles}
+
+    {problems_text}
+
+    Each task needs a "title", a "description", a "category" from the following list: {', '.join(TASK_CATEGORIES)},
+    and an "effort" from the following scale: {', '.join(EFFORT_SCALE)}.
+
+    User Case / Feature Request:
+    "{use_case_description}"
+
+    Please format your output as a valid JSON list containing only the corrected tasks and any missing tasks, with the keys "title", "description", "category", and "effort".
+    Provide only the JSON list in your response, nothing else.
+    """
+    return prompt
+
+def _repair_breakdown(use_case_description, tasks, rejected, truncated):
+    """
+    Re-asks Gemini for the rejected or missing tasks only and merges the answer into tasks.
+    Returns (tasks, rejected, truncated) for the merged breakdown.
+    """
+    record_event("breakdown_reask")
+    logger.info(f"Breakdown agent: re-asking for {len(rejected)} invalid task(s)"
+                f"{' and the tasks missing after a truncated answer' if truncated else ''}; keeping {len(tasks)}.")
+    prompt = generate_breakdown_repair_prompt(use_case_description, tasks, rejected, truncated)
+    try:
+        response = generate(prompt, purpose="breakdown_repair")
+    except Exception as e:
+        record_event("breakdown_reask_error")
+        logger.error(f"Breakdown agent: re-ask failed: {e}")
+        return tasks, rejected, truncated
+    repaired, still_rejected, repair_truncated = parse_task_list(response.text)
+    seen = {normalize_title(task['title']) for task in tasks}
+    merged = list(tasks)
+    for task in repaired:
+        key = normalize_title(task['title'])
+        if key not in seen:
+            seen.add(key)
+            merged.append(task)
+    return merged, still_rejected, repair_truncated
+
+def breakdown_cache_key(use_case_description):
+    """Cache key for a use case under the current model, categories, effort scale and prompt."""
+    backend = get_backend()
+    return make_cache_key(
+        use_case_description, f"{backend.name}/{backend.model_name}", TASK_CATEGORIES, EFFORT_SCALE,
+        prompt_template=generate_task_breakdown_prompt("")
+    )
+
+def breakdown_scope():
+    """Identifies the model, categories, effort scale and prompt that shape breakdowns (without the use case)."""
+    return breakdown_cache_key("")
+
+def split_use_case_into_tasks(use_case_description, use_cache=True, similar_match=None):
     """
     Uses Gemini API to split a use case into sub-tasks.
+    Results are cached by normalized description; pass use_cache=False to force a fresh Gemini call
+    (the fresh result still refreshes the cache).
+    On an exact cache miss, the breakdown of a near-duplicate use case (see app/similarity.py) is
+    reused; if a dict is passed as `similar_match`, it is filled with the match score and use case.
+    Valid tasks are salvaged from malformed or truncated responses, and only the invalid or
+    missing ones are requested again; a breakdown that stays incomplete is returned but not cached.
     Returns a list of task dictionaries or None if an error occurs.
     """
     if not use_case_description:
-        print("Error: No use case description provided to split_use_case_into_tasks.")
+        logger.error("No use case description provided to split_use_case_into_tasks.")
         return None
 
+    cache_key = breakdown_cache_key(use_case_description) if CACHE_ENABLED else None
+    if cache_key:
+        if use_cache:
+            cached_tasks = breakdown_cache.get(cache_key)
+            if cached_tasks is not None:
+                return cached_tasks
+        else:
+            breakdown_cache.record_bypass()
+
+    scope = breakdown_scope() if SIMILARITY_ENABLED else None
+    if scope and use_cache:
+        with span("similarity_lookup"):
+            match = similarity_index.find(use_case_description, scope)
+        if match is not None:
+            record_event("breakdown_similar_reuse")
+            logger.info(f"Breakdown agent: reusing the breakdown of a similar use case (score {match['score']}).")
+            if similar_match is not None:
+                similar_match.update({"score": match["score"], "use_case": match["use_case"]})
+            return match["tasks"]
+
     prompt = generate_task_breakdown_prompt(use_case_description)
     try:
-        response = model.generate_content(prompt)
+        response = generate(prompt, purpose="breakdown")
         # print("--- Gemini Raw Response ---")
         # print(response.text)
         # print("---------------------------")
-
-        cleaned_response_text = response.text.strip()
-        if cleaned_response_text.startswith("```json"):
-            cleaned_response_text = cleaned_response_text[7:]
-        if cleaned_response_text.endswith("```"):
-            cleaned_response_text = cleaned_response_text[:-3]
-        
-        cleaned_response_text = cleaned_response_text.strip()
-
-        tasks = json.loads(cleaned_response_text)
-        
-        if isinstance(tasks, list) and all(
-            isinstance(task, dict) and
-            all(key in task for key in ["title", "description", "category", "effort"]) and
-            task.get("effort") in EFFORT_SCALE # Validate effort against the defined scale
-            for task in tasks
-        ):
-            return tasks
-        else:
-            print("Error: Gemini response was not in the expected JSON list format or effort value is invalid.")
-            print("Received (cleaned):", cleaned_response_text)
-            # Attempt to identify specific issues for better debugging
-            if not isinstance(tasks, list):
-                print("Validation Error: Parsed JSON is not a list.")
-            else:
-                for i, task in enumerate(tasks):
-                    if not isinstance(task, dict):
-                        print(f"Validation Error: Task at index {i} is not a dictionary.")
-                        continue
-                    if not all(key in task for key in ["title", "description", "category", "effort"]):
-                        print(f"Validation Error: Task at index {i} is missing one or more required keys (title, description, category, effort). Task: {task}")
-                    if task.get("effort") not in EFFORT_SCALE:
-                         print(f"Validation Error: Task at index {i} has an invalid effort value '{task.get('effort')}'. Expected one of {EFFORT_SCALE}. Task: {task}")
-            return None
-
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from Gemini: {e}")
-        print("Received text (raw) was:", response.text)
-        return None
     except Exception as e:
-        # This can catch errors from genai.GenerativeModel if the model name is invalid
-        print(f"An unexpected error occurred with Gemini API or response processing: {e}")
+        # This can catch errors from the LLM backend, e.g. a missing API key or an invalid model name
+        record_event("breakdown_error")
+        logger.error(f"An unexpected error occurred with Gemini API or response processing: {e}")
         return None
 
+    # Malformed or truncated JSON and invalid tasks no longer discard the whole breakdown:
+    # every valid task is kept and only the rest is asked for again.
+    with span("breakdown_parse", response_bytes=len(response.text)):
+        tasks, rejected, truncated = parse_task_list(response.text)
+    if rejected or truncated:
+        if truncated or any(reason.startswith("Invalid JSON") for _, reason in rejected):
+            record_event("breakdown_json_decode_error")
+        if any(not reason.startswith("Invalid JSON") for _, reason in rejected):
+            record_event("breakdown_validation_error")
+        for raw, reason in rejected:
+            logger.error(f"Validation Error: {reason} Task: {raw}")
+        if truncated:
+            logger.error("Gemini response ended before the JSON list was closed. Received text (raw) was: %s", response.text)
+        if BREAKDOWN_REASK_ENABLED and (tasks or rejected):
+            tasks, rejected, truncated = _repair_breakdown(use_case_description, tasks, rejected, truncated)
+
+    if not tasks and (rejected or truncated):
+        logger.error("Gemini response contained no valid tasks.")
+        return None
+    if rejected or truncated:
+        record_event("breakdown_partial")
+        logger.warning(f"Breakdown agent: returning {len(tasks)} salvaged task(s); {len(rejected)} could not be repaired.")
+    else:
+        if cache_key:
+            breakdown_cache.set(cache_key, tasks)
+        if scope:
+            similarity_index.add(use_case_description, scope, tasks)
+    return tasks
+
+def stream_use_case_tasks(use_case_description, use_cache=True, rejected=None):
+    """
+    Streaming variant of split_use_case_into_tasks: yields each task dictionary as soon as Gemini
+    has generated it and it passes validation against TASK_CATEGORIES and EFFORT_SCALE.
+    Invalid tasks are skipped; if a list is passed as `rejected`, (task, reason) pairs are appended to it.
+    A cached breakdown is replayed without calling Gemini, and a complete, fully valid stream is cached.
+    Raises on Gemini errors so the caller can report them to the client.
+    """
+    if not use_case_description:
+        logger.error("No use case description provided to stream_use_case_tasks.")
+        return
+
+    cache_key = breakdown_cache_key(use_case_description) if CACHE_ENABLED else None
+    if cache_key:
+        if use_cache:
+            cached_tasks = breakdown_cache.get(cache_key)
+            if cached_tasks is not None:
+                yield from cached_tasks
+                return
+        else:
+            breakdown_cache.record_bypass()
+
+    prompt = generate_task_breakdown_prompt(use_case_description)
+    parser = IncrementalArrayParser()
+    streamed_tasks = []
+    all_valid = True
+    for chunk in generate_stream(prompt, purpose="breakdown"):
+        for task in parser.feed(chunk):
+            task = normalize_task(task)
+            error = task_validation_error(task, check_category=True)
+            if error:
+                all_valid = False
+                record_event("breakdown_stream_rejected_task")
+                logger.warning(f"Validation Error (stream): {error} Task: {task}")
+                if rejected is not None:
+                    rejected.append((task, error))
+                continue
+            streamed_tasks.append(task)
+            yield task
+
+    for raw, error in parser.errors:
+        record_event("breakdown_json_decode_error")
+        logger.error(f"Error decoding streamed task JSON from Gemini: {error}. Received: {raw}")
+    if parser.truncated:
+        logger.warning("Gemini task stream ended before the JSON list was closed.")
+    if cache_key and all_valid and not parser.errors and not parser.truncated:
+        breakdown_cache.set(cache_key, streamed_tasks)
+
 if __name__ == '__main__':
     sample_use_case = "As a user, I want to be able to register for a new account using my email and password, so I can access the platform's features. This should include email verification."
     print(f"Processing use case: {sample_use_case}")
@@ -1,23 +1,21 @@
 # app/allocation.py
-import google.generativeai as genai
-import os
+import difflib
 import json
-from dotenv import load_dotenv
-
-# Load .env from the project root (one level up from 'app' directory)
-dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-load_dotenv(dotenv_path=dotenv_path)
-
-GEMINI_API_KEY_ALLOCATION = os.getenv("GEMINI_API_KEY") # Reuse the same key
-if not GEMINI_API_KEY_ALLOCATION:
-    raise ValueError("GEMINI_API_KEY not found for allocation agent.")
-genai.configure(api_key=GEMINI_API_KEY_ALLOCATION)
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Using the model name specified by the user previously for consistency,
-# though a more powerful model might be better for complex allocation.
-# If this model struggles, consider 'gemini-1.0-pro' or 'gemini-1.5-pro-latest'.
-allocation_model = genai.GenerativeModel('gemini-2.0-flash-001')
+from .agent import normalize_title
+from .llm import estimate_tokens, generate
+from .metrics import ALLOCATION_PROMPT_DEVELOPERS, ALLOCATION_ROSTER_TOKENS, record_event, span
+from .roster import JSON_ROSTER_DESCRIPTION, encode_roster, resolve_aliases
+from .scheduler import current_priority, llm_priority
+from .stream_parser import salvage_json_array
+from .local_allocation import assign_tasks_locally, build_category_index, developer_matches_category, top_candidates
+from .solver import solve_assignments
 
+logger = logging.getLogger(__name__)
 
 EFFORT_TO_SCORE = {
     "Small": 2,
@@ -26,13 +24,31 @@ EFFORT_TO_SCORE = {
     "Default": 3  # Default if effort string is not recognized
 }
 
+ALLOCATION_MODES = ("local", "ai", "hybrid", "optimal")
+DEFAULT_ALLOCATION_MODE = os.getenv("ALLOCATION_MODE", "ai")
+
+# Large teams and task lists: only the top-K candidates per category go into the prompt, and task
+# lists are split into shards that are allocated in parallel, then reconciled.
+ALLOCATION_PREFILTER_MIN_TEAM = int(os.getenv("ALLOCATION_PREFILTER_MIN_TEAM", "25"))  # Smaller teams are sent whole
+ALLOCATION_TOP_K = int(os.getenv("ALLOCATION_TOP_K", "8"))
+ALLOCATION_SHARD_SIZE = int(os.getenv("ALLOCATION_SHARD_SIZE", "10"))
+ALLOCATION_SHARD_WORKERS = int(os.getenv("ALLOCATION_SHARD_WORKERS", "4"))
+# Most effort one developer may receive from a single sharded allocation before tasks are moved.
+ALLOCATION_MAX_WORKLOAD_PER_DEVELOPER = int(os.getenv("ALLOCATION_MAX_WORKLOAD_PER_DEVELOPER", "10"))
+# Tasks missing from the AI's answer, or assigned to no valid developer, are asked for again in one small follow-up call.
+ALLOCATION_REASK_ENABLED = os.getenv("ALLOCATION_REASK_ENABLED", "1") != "0"
+# How similar (0-1) a returned title must be to a task title to count as the same task.
+ALLOCATION_TITLE_MATCH_CUTOFF = float(os.getenv("ALLOCATION_TITLE_MATCH_CUTOFF", "0.85"))
+
 def get_effort_score(effort_str):
     """Converts effort string to a numeric score."""
     return EFFORT_TO_SCORE.get(effort_str, EFFORT_TO_SCORE["Default"])
 
-def generate_ai_allocation_prompt(tasks_json_str, developers_json_str):
+def generate_ai_allocation_prompt(tasks_json_str, developers_json_str, developers_description=JSON_ROSTER_DESCRIPTION,
+                                  example_developer_id="dev1"):
     """
     Generates the prompt for the AI allocation agent.
+    developers_description explains the roster format (see app/roster.py).
     """
     prompt = f"""
     You are an expert AI Resource Allocation Manager.
@@ -48,7 +64,7 @@ def generate_ai_allocation_prompt(tasks_json_str, developers_json_str):
 
     You will be given:
     1.  A JSON list of tasks to be assigned. Each task has a "title", "description", "category", and "effort" (Small, Medium, Large).
-    2.  A JSON list of available developers. Each developer has an "id", "name", "skills" (list of strings), "experience" (an object mapping skill category to years of experience, e.g., {{"Frontend": 5, "Backend": 2}}), and "current_workload_score".
+    2.  {developers_description}
 
     TASKS TO ASSIGN:
     {tasks_json_str}
@@ -71,8 +87,8 @@ def generate_ai_allocation_prompt(tasks_json_str, developers_json_str):
         "category": "Frontend",
         "effort": "Medium",
         "description": "Develop the HTML, CSS, and JavaScript for the user login page.",
-        "assigned_developer_id": "dev1",
-        "reasoning": "Alice (dev1) has strong Frontend skills (5 years experience) and a manageable workload score of 2."
+        "assigned_developer_id": "{example_developer_id}",
+        "reasoning": "Alice ({example_developer_id}) has strong Frontend skills (5 years experience) and a manageable workload score of 2."
     }}
 
     Ensure every task from the input "TASKS TO ASSIGN" list is present in your output JSON list.
@@ -80,28 +96,60 @@ def generate_ai_allocation_prompt(tasks_json_str, developers_json_str):
     """
     return prompt
 
-def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original):
+def match_assignments(tasks, ai_assignment_results):
     """
-    Uses a Gemini AI agent to allocate tasks.
-    Returns a list of task objects, where each task includes AI's assignment decision
-    (assigned_developer_id and reasoning) and original task details.
-    Developer workloads are NOT updated by this function directly.
+    Pairs each task with the AI's answer for it. Titles are matched exactly first, then after
+    normalization (case, punctuation, whitespace), then by similarity (ALLOCATION_TITLE_MATCH_CUTOFF).
+    Returns a list aligned with tasks holding the matching answer or None.
+    """
+    by_title = {}
+    by_normalized_title = {}
+    for item in ai_assignment_results:
+        if isinstance(item, dict) and "title" in item:
+            by_title.setdefault(item["title"], item)
+            by_normalized_title.setdefault(normalize_title(item["title"]), item)
+        else:
+            record_event("allocation_invalid_item")
+            logger.warning(f"AI returned an invalid item in assignment list: {item}")
+
+    matches = [None] * len(tasks)
+    used = set()
+    for i, task in enumerate(tasks):
+        item = by_title.get(task.get("title"))
+        if item is None:
+            item = by_normalized_title.get(normalize_title(task.get("title")))
+        if item is not None and id(item) not in used:
+            matches[i] = item
+            used.add(id(item))
+
+    unmatched = [i for i, item in enumerate(matches) if item is None]
+    if unmatched:
+        remaining = {key: item for key, item in by_normalized_title.items() if id(item) not in used}
+        for i in unmatched:
+            title = normalize_title(tasks[i].get("title"))
+            close = difflib.get_close_matches(title, list(remaining), n=1, cutoff=ALLOCATION_TITLE_MATCH_CUTOFF)
+            if close:
+                matches[i] = remaining.pop(close[0])
+                record_event("allocation_fuzzy_title_match")
+                logger.info(f"Matched task '{tasks[i].get('title')}' to AI title '{matches[i]['title']}'.")
+    return matches
+
+def _assignment_problem(ai_assignment_details, developers_by_id):
+    """Why an AI answer for a task cannot be used as is, or None."""
+    if ai_assignment_details is None:
+        return "missing"
+    assigned_dev_id = ai_assignment_details.get("assigned_developer_id")
+    if not assigned_dev_id:
+        return "no developer id"
+    if assigned_dev_id != "unassigned" and assigned_dev_id not in developers_by_id:
+        return "unknown developer id"
+    return None
+
+def _request_assignments(tasks_from_breakdown, developers_data_original, developers_by_id, purpose="allocation"):
+    """
+    Sends one allocation prompt and returns the assignment objects that could be salvaged from the
+    answer, even if it is malformed or truncated.
     """
-    if not tasks_from_breakdown:
-        print("Allocation AI: No tasks provided to assign.")
-        return []
-    if not developers_data_original:
-        print("Allocation AI: No developers data provided. Tasks will be marked unassigned.")
-        # Prepare tasks to be returned as unassigned
-        return [
-            {
-                **task.copy(),
-                'assigned_to': {"id": "unassigned", "name": "Unassigned - No Developers Available"},
-                'ai_reasoning': 'No developers were available for assignment.',
-                'effort_score': get_effort_score(task.get('effort'))
-            } for task in tasks_from_breakdown
-        ]
-
     # Prepare JSON strings for the prompt
     # Ensure tasks for AI have essential fields. The breakdown agent should provide these.
     tasks_for_ai_prompt = json.dumps([
@@ -109,55 +157,88 @@ def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original):
         for t in tasks_from_breakdown
     ])
     
-    # Ensure developers for AI have essential fields.
-    developers_for_ai_prompt = json.dumps([
-        {"id": d.get("id"), "name": d.get("name"), "skills": d.get("skills"), "experience": d.get("experience"), "current_workload_score": d.get("current_workload_score", 0)}
-        for d in developers_data_original
-    ])
-
-    prompt = generate_ai_allocation_prompt(tasks_for_ai_prompt, developers_for_ai_prompt)
-
+    # Compact roster (cached per team version, only workloads filled in) unless ALLOCATION_COMPACT_ROSTER=0.
+    with span("allocation_roster", developers=len(developers_data_original)):
+        developers_for_ai_prompt, developers_description, alias_to_id = encode_roster(developers_data_original)
+
+    prompt = generate_ai_allocation_prompt(
+        tasks_for_ai_prompt, developers_for_ai_prompt, developers_description,
+        example_developer_id="d1" if alias_to_id else "dev1"
+    )
+    prompt_bytes = len(prompt.encode("utf-8"))
+    roster_tokens = estimate_tokens(developers_for_ai_prompt)
+    ALLOCATION_PROMPT_DEVELOPERS.observe(len(developers_data_original))
+    ALLOCATION_ROSTER_TOKENS.observe(roster_tokens, format="compact" if alias_to_id else "json")
+    logger.info(
+        f"Allocation AI: prompt of {prompt_bytes} bytes (~{estimate_tokens(prompt)} tokens, roster ~{roster_tokens}) for "
+        f"{len(tasks_from_breakdown)} task(s) and {len(developers_data_original)} of {len(developers_by_id)} developers."
+    )
+
+    # print("\n--- Allocation AI Prompt ---")
+    # print(prompt)
+    # print("---------------------------\n")
+    response = generate(prompt, purpose=purpose)
+
+    with span("allocation_parse", response_bytes=len(response.text)):
+        ai_assignment_results, errors, truncated = salvage_json_array(response.text)
+        resolve_aliases(ai_assignment_results, alias_to_id)
+    if errors or truncated:
+        record_event("allocation_json_decode_error")
+        for raw, error in errors:
+            logger.error(f"Error decoding an assignment from Allocation AI: {error}. Received: {raw}")
+        if truncated:
+            logger.error("Allocation AI response ended before the JSON list was closed. Received text was: %s", response.text)
+    return ai_assignment_results
+
+def _allocate_with_prompt(tasks_from_breakdown, developers_data_original, developers_by_id):
+    """
+    Sends one allocation prompt for the given tasks and developers and merges the answer back
+    into the tasks. developers_by_id (the whole team) is used to validate the returned ids.
+    Tasks the answer leaves out or assigns to no valid developer are asked for again in a
+    single follow-up prompt that contains only those tasks.
+    """
     final_assigned_tasks = []
 
     try:
-        # print("\n--- Allocation AI Prompt ---")
-        # print(prompt)
-        # print("---------------------------\n")
-        response = allocation_model.generate_content(prompt)
-        
-        cleaned_response_text = response.text.strip()
-        if cleaned_response_text.startswith("```json"):
-            cleaned_response_text = cleaned_response_text[7:]
-        if cleaned_response_text.endswith("```"):
-            cleaned_response_text = cleaned_response_text[:-3]
-        cleaned_response_text = cleaned_response_text.strip()
-        
-        # print("\n--- Allocation AI Raw Response ---")
-        # print(cleaned_response_text)
-        # print("--------------------------------\n")
-
-        ai_assignment_results = json.loads(cleaned_response_text)
-
-        if not isinstance(ai_assignment_results, list):
-            print("Error: AI allocation response was not a list.")
-            raise ValueError("AI response format error.")
-
-        # Create a map of AI assignments by title for easy lookup
-        ai_assignments_map = {}
-        for item in ai_assignment_results:
-            if isinstance(item, dict) and "title" in item:
-                ai_assignments_map[item["title"]] = item
-            else:
-                print(f"Warning: AI returned an invalid item in assignment list: {item}")
+        ai_assignment_results = _request_assignments(tasks_from_breakdown, developers_data_original, developers_by_id)
+        if not ai_assignment_results:
+            raise ValueError("AI allocation response contained no assignments.")
+        matches = match_assignments(tasks_from_breakdown, ai_assignment_results)
 
+        retry_indexes = [
+            i for i, item in enumerate(matches) if _assignment_problem(item, developers_by_id)
+        ]
+        if retry_indexes and ALLOCATION_REASK_ENABLED:
+            record_event("allocation_reask")
+            logger.info(f"Allocation AI: re-asking for {len(retry_indexes)} of {len(tasks_from_breakdown)} task(s).")
+            retry_tasks = [tasks_from_breakdown[i] for i in retry_indexes]
+            # Show the workload the accepted assignments add, so the follow-up does not pile onto the same developers.
+            assigned_effort = {}
+            for i, (task, item) in enumerate(zip(tasks_from_breakdown, matches)):
+                if i not in retry_indexes:
+                    dev_id = item.get("assigned_developer_id")
+                    if dev_id in developers_by_id:
+                        assigned_effort[dev_id] = assigned_effort.get(dev_id, 0) + get_effort_score(task.get("effort"))
+            retry_developers = [
+                {**d, "current_workload_score": (d.get("current_workload_score", 0) or 0) + assigned_effort[d.get("id")]}
+                if d.get("id") in assigned_effort else d
+                for d in developers_data_original
+            ]
+            try:
+                retry_results = _request_assignments(retry_tasks, retry_developers, developers_by_id,
+                                                     purpose="allocation_reask")
+                for i, item in zip(retry_indexes, match_assignments(retry_tasks, retry_results)):
+                    if item is not None and _assignment_problem(item, developers_by_id) is None:
+                        matches[i] = item
+            except Exception as e:
+                record_event("allocation_reask_error")
+                logger.error(f"Allocation AI: re-ask failed: {e}")
 
         # Merge AI assignments with original task data
-        for original_task in tasks_from_breakdown:
+        for original_task, ai_assignment_details in zip(tasks_from_breakdown, matches):
             task_copy = original_task.copy() # Start with original task details
             task_title = original_task.get("title")
 
-            ai_assignment_details = ai_assignments_map.get(task_title)
-
             if ai_assignment_details:
                 assigned_dev_id = ai_assignment_details.get("assigned_developer_id")
                 reasoning = ai_assignment_details.get("reasoning", "No reasoning provided by AI.")
@@ -165,18 +246,20 @@ def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original):
                 assigned_dev_info = None
                 if assigned_dev_id and assigned_dev_id != "unassigned":
                     # Find developer details from the original list
-                    dev_match = next((dev for dev in developers_data_original if dev['id'] == assigned_dev_id), None)
+                    dev_match = developers_by_id.get(assigned_dev_id)
                     if dev_match:
                         assigned_dev_info = {"id": dev_match['id'], "name": dev_match['name']}
                     else:
                         # AI might have hallucinated an ID or there's a mismatch
                         assigned_dev_info = {"id": assigned_dev_id, "name": f"Unknown Dev ID: {assigned_dev_id} (AI Suggestion)"}
-                        print(f"Warning: AI assigned task '{task_title}' to non-existent developer ID '{assigned_dev_id}'.")
+                        record_event("hallucinated_developer_id")
+                        logger.warning(f"AI assigned task '{task_title}' to non-existent developer ID '{assigned_dev_id}'.")
                 elif assigned_dev_id == "unassigned":
                     assigned_dev_info = {"id": "unassigned", "name": "Unassigned by AI"}
                 else: # AI didn't provide an ID or a valid "unassigned"
                     assigned_dev_info = {"id": "unassigned", "name": "Unassigned (AI provided no valid ID)"}
-                    print(f"Warning: AI provided no valid assigned_developer_id for task '{task_title}'. Details: {ai_assignment_details}")
+                    record_event("allocation_missing_developer_id")
+                    logger.warning(f"AI provided no valid assigned_developer_id for task '{task_title}'. Details: {ai_assignment_details}")
 
                 task_copy['assigned_to'] = assigned_dev_info
                 task_copy['ai_reasoning'] = reasoning
@@ -184,7 +267,8 @@ def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original):
                 # Task was in original list but AI didn't return an assignment for it
                 task_copy['assigned_to'] = {"id": "unassigned", "name": "Unassigned (Not in AI response)"}
                 task_copy['ai_reasoning'] = "This task was not included in the AI allocator's assignment list."
-                print(f"Warning: Task '{task_title}' was not found in AI allocation agent's response.")
+                record_event("task_missing_from_allocation")
+                logger.warning(f"Task '{task_title}' was not found in AI allocation agent's response.")
             
             # Add effort score for subsequent workload calculation
             task_copy['effort_score'] = get_effort_score(task_copy.get('effort', "Medium"))
@@ -192,25 +276,217 @@ def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original):
 
         return final_assigned_tasks
 
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from Allocation AI: {e}")
-        print("Received text was:", response.text if 'response' in locals() else "N/A")
     except Exception as e:
-        print(f"An unexpected error occurred with Allocation AI: {e}")
-        import traceback
-        traceback.print_exc()
-
-    # Fallback: if any error, return original tasks marked as unassigned due to AI error
-    print("Allocation AI: Falling back to unassigned due to error.")
-    for task in tasks_from_breakdown:
-        task_copy = task.copy()
-        if 'assigned_to' not in task_copy: # Avoid overwriting if partially processed
-            task_copy['assigned_to'] = {"id": "unassigned", "name": "Unassigned due to AI allocation error"}
-            task_copy['ai_reasoning'] = 'An error occurred during the AI-driven allocation process.'
-            task_copy['effort_score'] = get_effort_score(task_copy.get('effort', "Medium"))
-        final_assigned_tasks.append(task_copy)
-    return final_assigned_tasks
+        record_event("allocation_error")
+        logger.exception(f"An unexpected error occurred with Allocation AI: {e}")
+
+    # Fallback: if any error, allocate with the local rule-based engine instead of leaving everything unassigned
+    record_event("allocation_fallback_local")
+    logger.warning("Allocation AI: Falling back to the local allocation engine due to error.")
+    fallback_tasks, _ = assign_tasks_locally(tasks_from_breakdown, developers_data_original, get_effort_score)
+    for task_copy in fallback_tasks:
+        task_copy['ai_reasoning'] = f"{task_copy['ai_reasoning']} (Local engine fallback after an AI allocation error.)"
+    return fallback_tasks
+
+
+def _shard_candidates(shards, tasks, developers, category_index):
+    """
+    Picks the developers to include in each shard's prompt: the top ALLOCATION_TOP_K per category.
+    When a category appears in several shards, a deeper ranking is dealt out round-robin so that
+    parallel shards do not all pile work onto the same few developers.
+    """
+    shards_by_category = {}
+    for shard_number, shard in enumerate(shards):
+        for category in {tasks[i].get('category') for i in shard}:
+            shards_by_category.setdefault(category, []).append(shard_number)
+
+    candidates = [set() for _ in shards]
+    generalists = None
+    for category, shard_numbers in shards_by_category.items():
+        ranked = top_candidates(developers, category, ALLOCATION_TOP_K * len(shard_numbers), category_index)
+        if not ranked:
+            # No skill match: let the AI judge among the least busy developers instead.
+            if generalists is None:
+                generalists = sorted(
+                    range(len(developers)), key=lambda i: developers[i].get('current_workload_score', 0) or 0
+                )[:ALLOCATION_TOP_K]
+            ranked = generalists
+        for position, shard_number in enumerate(shard_numbers):
+            if len(ranked) >= ALLOCATION_TOP_K * len(shard_numbers):
+                candidates[shard_number].update(ranked[position::len(shard_numbers)])
+            else:
+                candidates[shard_number].update(ranked)
+    return [[developers[i] for i in sorted(shard_candidates)] for shard_candidates in candidates]
+
+
+def _reconcile_workload(allocated_tasks, developers, category_index, max_workload):
+    """
+    Caps the effort any one developer receives across shards. Tasks that would push a developer
+    past the cap are moved to the best matching developer with room left (lowest workload, then most
+    experience); if nobody has room, the shard's choice is kept. The cap is never set below an even
+    share of the total effort, so small teams with long task lists are not flagged on every task.
+    """
+    total_effort = sum(task.get('effort_score', 0) for task in allocated_tasks)
+    max_workload = max(max_workload, math.ceil(total_effort / len(developers)))
+    position_by_id = {dev.get('id'): i for i, dev in enumerate(developers)}
+    added = {}
+    for task in allocated_tasks:
+        assignee_id = task.get('assigned_to', {}).get('id')
+        if assignee_id not in position_by_id:
+            continue
+        score = task.get('effort_score', 0)
+        if added.get(assignee_id, 0) + score <= max_workload:
+            added[assignee_id] = added.get(assignee_id, 0) + score
+            continue
+
+        category = task.get('category')
+        members = category_index.get(category) if category_index else None
+        if members is None:
+            members = [i for i, dev in enumerate(developers) if developer_matches_category(dev, category)]
+        with_room = [i for i in members if added.get(developers[i].get('id'), 0) + score <= max_workload]
+        if not with_room:
+            record_event("allocation_workload_cap_exceeded")
+            logger.info(f"Allocation reconciliation: no developer has room for '{task.get('title')}'; keeping {assignee_id}.")
+            added[assignee_id] = added.get(assignee_id, 0) + score
+            continue
+
+        def rank(i):
+            dev = developers[i]
+            workload = (dev.get('current_workload_score', 0) or 0) + added.get(dev.get('id'), 0)
+            return (workload, -((dev.get('experience') or {}).get(category, 0) or 0))
+
+        replacement = developers[min(with_room, key=rank)]
+        task['ai_reasoning'] = (
+            f"{task.get('ai_reasoning', '')} (Reassigned from {assignee_id} to {replacement.get('id')} during "
+            f"reconciliation: {assignee_id} would exceed the per-allocation workload cap of {max_workload}.)"
+        ).strip()
+        task['assigned_to'] = {"id": replacement.get('id'), "name": replacement.get('name')}
+        added[replacement.get('id')] = added.get(replacement.get('id'), 0) + score
+        record_event("allocation_reconciled")
+    return allocated_tasks
+
+
+def assign_tasks_with_ai(tasks_from_breakdown, developers_data_original, category_index=None):
+    """
+    Uses a Gemini AI agent to allocate tasks.
+    Returns a list of task objects, where each task includes AI's assignment decision
+    (assigned_developer_id and reasoning) and original task details.
+    Developer workloads are NOT updated by this function directly.
+
+    Small teams and task lists are sent in a single prompt. Otherwise only the top candidates per
+    category are included, task lists longer than ALLOCATION_SHARD_SIZE are allocated as parallel
+    shards, and a reconciliation pass caps the workload any developer receives across shards.
+    category_index (category -> developer positions) speeds up candidate selection.
+    """
+    if not tasks_from_breakdown:
+        logger.info("Allocation AI: No tasks provided to assign.")
+        return []
+    if not developers_data_original:
+        logger.info("Allocation AI: No developers data provided. Tasks will be marked unassigned.")
+        # Prepare tasks to be returned as unassigned
+        return [
+            {
+                **task.copy(),
+                'assigned_to': {"id": "unassigned", "name": "Unassigned - No Developers Available"},
+                'ai_reasoning': 'No developers were available for assignment.',
+                'effort_score': get_effort_score(task.get('effort'))
+            } for task in tasks_from_breakdown
+        ]
+
+    developers_by_id = {dev.get('id'): dev for dev in developers_data_original}
+    if len(developers_data_original) <= ALLOCATION_PREFILTER_MIN_TEAM and len(tasks_from_breakdown) <= ALLOCATION_SHARD_SIZE:
+        return _allocate_with_prompt(tasks_from_breakdown, developers_data_original, developers_by_id)
+
+    if category_index is None:
+        categories = {task.get('category') for task in tasks_from_breakdown}
+        category_index = build_category_index(developers_data_original, categories)
+
+    # Group tasks by category before sharding so each shard needs fewer distinct candidates.
+    order = sorted(range(len(tasks_from_breakdown)), key=lambda i: str(tasks_from_breakdown[i].get('category')))
+    shards = [order[start:start + ALLOCATION_SHARD_SIZE] for start in range(0, len(order), ALLOCATION_SHARD_SIZE)]
+    shard_developers = _shard_candidates(shards, tasks_from_breakdown, developers_data_original, category_index)
+
+    priority = current_priority()  # Worker threads do not inherit the caller's LLM priority
+
+    def allocate_shard(shard_number):
+        shard_tasks = [tasks_from_breakdown[i] for i in shards[shard_number]]
+        with llm_priority(priority):
+            return _allocate_with_prompt(shard_tasks, shard_developers[shard_number], developers_by_id)
+
+    with span("allocation_shards", shards=len(shards), team_size=len(developers_data_original)) as details:
+        if len(shards) == 1:
+            shard_results = [allocate_shard(0)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(ALLOCATION_SHARD_WORKERS, len(shards))) as executor:
+                shard_results = list(executor.map(allocate_shard, range(len(shards))))
+        details["prompt_developers"] = sum(len(candidates) for candidates in shard_developers)
+
+    allocated_tasks = [None] * len(tasks_from_breakdown)
+    for shard, results in zip(shards, shard_results):
+        for i, result in zip(shard, results):
+            allocated_tasks[i] = result
+    if len(shards) > 1:
+        _reconcile_workload(allocated_tasks, developers_data_original, category_index,
+                            ALLOCATION_MAX_WORKLOAD_PER_DEVELOPER)
+    return allocated_tasks
+
+
+def resolve_allocation_mode(mode=None):
+    """The allocation mode assign_tasks runs for a requested mode (None means DEFAULT_ALLOCATION_MODE)."""
+    return mode or DEFAULT_ALLOCATION_MODE
+
+def assign_tasks(tasks_from_breakdown, developers_data_original, mode=None, category_index=None):
+    """
+    Allocates tasks using the requested mode:
+    - "local": the deterministic rule-based engine only (no Gemini call).
+    - "ai": the Gemini allocation agent (the local engine is used as its error fallback).
+    - "hybrid": the local engine places what it can; only tasks it cannot place go to Gemini.
+    - "optimal": the workload-balancing min-cost solver (no Gemini call), see app/solver.py.
+    Returns the same task shape as assign_tasks_with_ai, in the same order as the input tasks.
+    category_index (category -> developer positions) lets the local engine skip its skill scan.
+    """
+    mode = resolve_allocation_mode(mode)
+    if mode not in ALLOCATION_MODES:
+        raise ValueError(f"Unknown allocation mode '{mode}'. Expected one of {ALLOCATION_MODES}.")
+
+    if mode == "ai":
+        return assign_tasks_with_ai(tasks_from_breakdown, developers_data_original, category_index=category_index)
+
+    if not tasks_from_breakdown:
+        return []
+
+    if mode == "optimal":
+        with span("allocation_solver", task_count=len(tasks_from_breakdown), team_size=len(developers_data_original or [])):
+            solver_results, _ = solve_assignments(
+                tasks_from_breakdown, developers_data_original, get_effort_score, category_index=category_index
+            )
+        return solver_results
+
+    local_results, unplaced_indexes = assign_tasks_locally(
+        tasks_from_breakdown, developers_data_original, get_effort_score, category_index=category_index
+    )
+    if mode == "local" or not unplaced_indexes or not developers_data_original:
+        return local_results
+
+    # Hybrid: the AI sees workloads that already include the tasks the engine placed.
+    added_workload = {}
+    for task in local_results:
+        assignee_id = task['assigned_to']['id']
+        if assignee_id != "unassigned":
+            added_workload[assignee_id] = added_workload.get(assignee_id, 0) + task['effort_score']
+    developers_for_ai = [
+        {**dev, 'current_workload_score': dev.get('current_workload_score', 0) + added_workload[dev.get('id')]}
+        if dev.get('id') in added_workload else dev
+        for dev in developers_data_original
+    ]
 
+    logger.info(f"Allocation (hybrid): {len(unplaced_indexes)} task(s) could not be placed locally, asking AI.")
+    ai_results = assign_tasks_with_ai(
+        [tasks_from_breakdown[i] for i in unplaced_indexes], developers_for_ai, category_index=category_index
+    )
+    for i, ai_result in zip(unplaced_indexes, ai_results):
+        local_results[i] = ai_result
+    return local_results
 
 if __name__ == '__main__':
     # Mock data for testing the allocation agent
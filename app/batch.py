@@ -0,0 +1,221 @@
+# app/batch.py
+"""
+Batch processing of JSONL files of use cases.
+
+Each input line is a JSON object with either a "use_case" or a "title" (+ optional "body"), and
+optionally "allocation_mode", "pipeline_mode" and "bypass_cache". Records are identified by
+"request_id", "id" or their line number. Results are written to a JSONL output file as they finish, so an
+interrupted run can be resumed: records already completed in the output file are skipped.
+
+    python -m app.batch requests.jsonl -o results.jsonl --concurrency 4 --allocation-mode local
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from .allocation import get_effort_score
+from .data_manager import get_developer_snapshot
+from .pipeline import create_workload_overlay, parse_pipeline_request, run_use_case_pipeline
+from .scheduler import PRIORITY_BATCH, llm_priority
+from .workload_ledger import WORKLOAD_LEDGER_ENABLED
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_STATUS_OK = "ok"
+BATCH_STATUS_ERROR = "error"
+
+
+def parse_batch_record(line, line_number, defaults=None):
+    """
+    Parses one JSONL line. Returns (record_id, options, error) where options are keyword arguments
+    for run_use_case_pipeline; blank lines return (None, None, None).
+    """
+    if not line.strip():
+        return None, None, None
+    record_id = f"line-{line_number}"
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        return record_id, None, f"Invalid JSON on line {line_number}: {e}"
+    if not isinstance(record, dict):
+        return record_id, None, f"Line {line_number} is not a JSON object"
+
+    record_id = str(record.get('request_id') or record.get('id') or record_id)
+    use_case = record.get('use_case')
+    if not use_case and record.get('title'):
+        use_case = f"{record['title']}\n\n{record.get('body', '')}".strip()
+    overrides = {key: record[key] for key in ('allocation_mode', 'pipeline_mode', 'bypass_cache') if key in record}
+    data = {**(defaults or {}), **overrides}
+    data['use_case'] = use_case
+    options, error = parse_pipeline_request(data)
+    return record_id, options, error
+
+
+def _replay_workload(workload_overlay, result):
+    """Adds the assignments of an already completed record to the batch overlay."""
+    for task in (result or {}).get('allocated_tasks', []):
+        assignee_id = task.get('assigned_to', {}).get('id')
+        if assignee_id and assignee_id != "unassigned":
+            workload_overlay.add_workload(assignee_id, task.get('effort_score', get_effort_score(task.get('effort'))))
+
+
+def run_batch(records, concurrency=BATCH_CONCURRENCY, completed=None, workload_overlay=None):
+    """
+    Runs the pipeline for (line_number, record_id, options, error) tuples with at most
+    `concurrency` use cases in flight, yielding one result dict per record as it finishes.
+
+    All records share one workload overlay, so each allocation sees the workload assigned by the
+    records that finished before it started. `completed` maps record ids to the results of an
+    earlier run; those records are skipped and their workload is replayed into the overlay
+    (unless the workload ledger, which already holds it, is enabled).
+    """
+    completed = completed or {}
+    if workload_overlay is None:
+        workload_overlay = create_workload_overlay(get_developer_snapshot())
+    if not WORKLOAD_LEDGER_ENABLED:
+        for result in completed.values():
+            _replay_workload(workload_overlay, result.get('result'))
+
+    def process(line_number, record_id, options):
+        started = time.perf_counter()
+        try:
+            with llm_priority(PRIORITY_BATCH):
+                body, http_status = run_use_case_pipeline(**options, workload_overlay=workload_overlay)
+        except Exception as e:
+            logger.exception(f"Batch: record {record_id} failed: {e}")
+            body, http_status = {"error": str(e)}, 500
+        assignee_ids = {
+            task.get('assigned_to', {}).get('id') for task in body.get('allocated_tasks', [])
+        } - {None, "unassigned"}
+        # The full team preview would repeat for every record; keep only this record's assignees.
+        body.pop('updated_developer_workloads_preview', None)
+        body['assignee_workloads'] = {
+            dev['id']: dev['current_workload_score'] for dev in workload_overlay.developers(sorted(assignee_ids))
+        }
+        return {
+            "id": record_id,
+            "line": line_number,
+            "status": BATCH_STATUS_OK if http_status < 400 else BATCH_STATUS_ERROR,
+            "http_status": http_status,
+            "result": body,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-worker") as executor:
+        in_flight = set()
+        for line_number, record_id, options, error in records:
+            if record_id in completed:
+                continue
+            if error:
+                yield {"id": record_id, "line": line_number, "status": BATCH_STATUS_ERROR,
+                       "http_status": 400, "error": error}
+                continue
+            # Keep the input streaming: never hold more than `concurrency` pending records.
+            if len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(executor.submit(process, line_number, record_id, options))
+        for future in as_completed(in_flight):
+            yield future.result()
+
+
+def iter_batch_file(lines, defaults=None):
+    """Yields (line_number, record_id, options, error) for every non-blank JSONL line."""
+    for line_number, line in enumerate(lines, start=1):
+        record_id, options, error = parse_batch_record(line, line_number, defaults)
+        if record_id is not None:
+            yield line_number, record_id, options, error
+
+
+def load_completed_results(output_path):
+    """
+    Reads the results of a previous run from output_path, keyed by record id. Successful and
+    invalid (HTTP 400) records count as completed; pipeline failures are retried. A partially written last line (from a
+    crash mid-write) is truncated so that new results are appended cleanly.
+    """
+    completed = {}
+    if not os.path.exists(output_path):
+        return completed
+    valid_length = 0
+    needs_newline = False
+    with open(output_path, 'rb') as f:
+        for raw_line in f:
+            try:
+                result = json.loads(raw_line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                if not raw_line.endswith(b"\n"):
+                    break  # Partially written last line
+                logger.warning(f"Batch: ignoring an unreadable line in {output_path}.")
+                valid_length += len(raw_line)
+                continue
+            valid_length += len(raw_line)
+            needs_newline = not raw_line.endswith(b"\n")
+            if isinstance(result, dict) and (result.get('status') == BATCH_STATUS_OK or result.get('http_status') == 400):
+                completed[result.get('id')] = result
+    if valid_length < os.path.getsize(output_path):
+        logger.warning(f"Batch: truncating a partially written line at the end of {output_path}.")
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_length)
+    elif needs_newline:
+        with open(output_path, 'ab') as f:
+            f.write(b"\n")
+    return completed
+
+
+def process_batch_file(input_path, output_path, concurrency=BATCH_CONCURRENCY, allocation_mode=None,
+                       bypass_cache=False, resume=True, pipeline_mode=None):
+    """Runs a JSONL file through the pipeline, appending results to output_path. Returns a summary."""
+    completed = load_completed_results(output_path) if resume else {}
+    if completed:
+        logger.info(f"Batch: resuming, {len(completed)} record(s) already completed in {output_path}.")
+    defaults = {"bypass_cache": bypass_cache}
+    if allocation_mode:
+        defaults["allocation_mode"] = allocation_mode
+    if pipeline_mode:
+        defaults["pipeline_mode"] = pipeline_mode
+
+    summary = {"skipped": len(completed), BATCH_STATUS_OK: 0, BATCH_STATUS_ERROR: 0}
+    started = time.perf_counter()
+    with open(input_path, 'r', encoding='utf-8') as lines, \
+            open(output_path, 'a' if resume else 'w', encoding='utf-8') as out:
+        for result in run_batch(iter_batch_file(lines, defaults), concurrency, completed):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            summary[result['status']] += 1
+            logger.info(f"Batch: {result['id']} -> {result['status']} ({result.get('duration_ms', 0)} ms)")
+    summary["duration_s"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Break down and allocate a JSONL file of use cases.")
+    parser.add_argument("input", help="JSONL file with one use case per line")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--allocation-mode", default=None, help="Default allocation_mode for records without one")
+    parser.add_argument("--pipeline-mode", default=None, help="Default pipeline_mode (two_stage, fused or hierarchical)")
+    parser.add_argument("--bypass-cache", action="store_true", help="Do not use the breakdown cache")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of resuming")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+    summary = process_batch_file(
+        args.input, output_path, concurrency=args.concurrency, allocation_mode=args.allocation_mode,
+        bypass_cache=args.bypass_cache, resume=not args.no_resume, pipeline_mode=args.pipeline_mode
+    )
+    print(f"Batch finished: {summary[BATCH_STATUS_OK]} ok, {summary[BATCH_STATUS_ERROR]} failed, "
+          f"{summary['skipped']} skipped in {summary['duration_s']}s. Results: {output_path}")
+    return 1 if summary[BATCH_STATUS_ERROR] else 0
+
+
+if __name__ == '__main__':
+    import sys
+
+    sys.exit(main())
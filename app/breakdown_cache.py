@@ -0,0 +1,197 @@
+# app/breakdown_cache.py
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# On-disk store shared by every worker process; lives next to developers.json by default.
+CACHE_DB_PATH = os.getenv(
+    "BREAKDOWN_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'breakdown_cache.sqlite3')
+)
+CACHE_ENABLED = os.getenv("BREAKDOWN_CACHE_ENABLED", "1") != "0"
+CACHE_TTL_SECONDS = int(os.getenv("BREAKDOWN_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+CACHE_MAX_ENTRIES = int(os.getenv("BREAKDOWN_CACHE_MAX_ENTRIES", "512"))  # In-process LRU size
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("BREAKDOWN_CACHE_DISK_MAX_ENTRIES", "10000"))
+_DISK_PRUNE_EVERY = 50  # Expired/overflow rows are pruned once every this many stores
+
+
+def normalize_use_case(use_case_description):
+    """Collapses whitespace and case so trivially edited resubmissions share a cache entry."""
+    return re.sub(r"\s+", " ", use_case_description or "").strip().lower()
+
+
+def make_cache_key(use_case_description, model_name, task_categories, effort_scale, prompt_template=""):
+    """
+    Hashes the normalized use case together with everything that shapes the breakdown prompt,
+    so changing the model, TASK_CATEGORIES, EFFORT_SCALE or the prompt text invalidates old entries.
+    """
+    payload = json.dumps({
+        "use_case": normalize_use_case(use_case_description),
+        "model": model_name,
+        "categories": list(task_categories),
+        "effort_scale": list(effort_scale),
+        "prompt": hashlib.sha256(prompt_template.encode("utf-8")).hexdigest(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BreakdownCache:
+    """
+    Two-tier cache for task breakdowns: an in-process LRU with TTL in front of a SQLite file
+    that survives restarts and is shared across worker processes.
+    Disk errors are reported and the cache keeps working in memory only.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, ttl_seconds=CACHE_TTL_SECONDS,
+                 max_entries=CACHE_MAX_ENTRIES, disk_max_entries=CACHE_DISK_MAX_ENTRIES):
+        self.db_path = os.path.abspath(db_path) if db_path else None
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()  # key -> (stored_at, tasks)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stores_since_prune = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "stores": 0, "disk_errors": 0}
+
+    # --- Disk tier ---
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS breakdowns ("
+                "key TEXT PRIMARY KEY, tasks TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _disk_get(self, key, now):
+        if not self.db_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT tasks, stored_at FROM breakdowns WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            logger.warning(f"Breakdown cache: disk read failed ({e}), continuing without disk tier.")
+            return None
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key, tasks, now):
+        if not self.db_path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO breakdowns (key, tasks, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(tasks), now)
+            )
+            self._stores_since_prune += 1
+            if self._stores_since_prune >= _DISK_PRUNE_EVERY:
+                self._stores_since_prune = 0
+                conn.execute("DELETE FROM breakdowns WHERE stored_at < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM breakdowns WHERE key NOT IN "
+                    "(SELECT key FROM breakdowns ORDER BY stored_at DESC LIMIT ?)",
+                    (self.disk_max_entries,)
+                )
+            conn.commit()
+        except sqlite3.Error as e:
+            self._count("disk_errors")
+            logger.warning(f"Breakdown cache: disk write failed ({e}), entry kept in memory only.")
+
+    # --- Memory tier ---
+    def _memory_put(self, key, stored_at, tasks):
+        with self._lock:
+            self._memory[key] = (stored_at, tasks)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        """Returns a fresh copy of the cached task list for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return [dict(task) for task in entry[1]]
+                del self._memory[key]
+
+        entry = self._disk_get(key, now)
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count("disk_hits")
+        self._memory_put(key, entry[0], entry[1])
+        return [dict(task) for task in entry[1]]
+
+    def set(self, key, tasks):
+        now = time.time()
+        tasks = [dict(task) for task in tasks]
+        self._memory_put(key, now, tasks)
+        self._disk_set(key, tasks, now)
+        self._count("stores")
+
+    def record_bypass(self):
+        self._count("bypasses")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM breakdowns")
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Breakdown cache: failed to clear disk tier ({e}).")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+breakdown_cache = BreakdownCache()
+
+
+def _cache_lookup_metrics():
+    stats = breakdown_cache.stats()
+    return {(name,): stats[name] for name in ("memory_hits", "disk_hits", "misses", "bypasses")}
+
+
+registry.callback(
+    "taskmgr_breakdown_cache_lookups_total", "Breakdown cache lookups by result.",
+    _cache_lookup_metrics, ("result",), kind="counter"
+)
+registry.callback(
+    "taskmgr_breakdown_cache_entries", "Entries in the in-process breakdown cache.",
+    lambda: {(): breakdown_cache.stats()["memory_entries"]}
+)
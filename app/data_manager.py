@@ -1,58 +1,90 @@
 # app/data_manager.py
-import json
+import logging
 import os
+import threading
+
+from .developer_store import DeveloperRepository, JSONDeveloperBackend, SQLiteDeveloperBackend
+
+logger = logging.getLogger(__name__)
 
 # Path to the developers.json file, assuming it's in a 'data' folder at the project root
 # __file__ is app/data_manager.py
 # os.path.dirname(__file__) is app/
 # os.path.join(os.path.dirname(__file__), '..') is project_root/
 # os.path.join(os.path.dirname(__file__), '..', 'data', 'developers.json') is project_root/data/developers.json
-DATA_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'developers.json')
+DATA_FILE_PATH = os.getenv(
+    "DEVELOPERS_FILE",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'developers.json')
+)
+
+# "json" (developers.json) or "sqlite" (DEVELOPERS_DB_PATH) for teams of tens of thousands
+DEVELOPER_STORE = os.getenv("DEVELOPER_STORE", "json")
+DEVELOPERS_DB_PATH = os.getenv(
+    "DEVELOPERS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'developers.sqlite3')
+)
+
+_repository = None
+_repository_lock = threading.Lock()
+
+def get_developer_repository():
+    """
+    Returns the process-wide developer repository, which keeps an indexed in-memory snapshot
+    and only re-reads the store when it changes on disk.
+    """
+    global _repository
+    path = os.path.abspath(DEVELOPERS_DB_PATH if DEVELOPER_STORE == "sqlite" else DATA_FILE_PATH)
+    repository = _repository
+    if repository is None or repository.backend.path != path:
+        with _repository_lock:
+            if _repository is None or _repository.backend.path != path:
+                backend_class = SQLiteDeveloperBackend if DEVELOPER_STORE == "sqlite" else JSONDeveloperBackend
+                _repository = DeveloperRepository(backend_class(path))
+            repository = _repository
+    return repository
+
+def get_developer_snapshot():
+    """Current indexed, read-only snapshot of the team."""
+    return get_developer_repository().snapshot()
 
 def load_developers():
-    """Loads developer data from the JSON file."""
+    """
+    Loads developer data. Served from the repository snapshot, so the store is only parsed
+    again after it changes; returns copies that callers are free to modify.
+    """
     try:
-        abs_path = os.path.abspath(DATA_FILE_PATH)
-        if not os.path.exists(abs_path):
-            print(f"Error: The file {abs_path} was not found.")
-            # Create an empty developers.json if it doesn't exist to prevent startup errors
-            # though it's better to ensure it exists with actual data.
-            # For this example, we'll return an empty list and let the app handle it.
-            # os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-            # with open(abs_path, 'w') as f:
-            #     json.dump([], f)
-            # print(f"Created an empty developers file at {abs_path}. Please populate it.")
-            return []
-
-        with open(abs_path, 'r') as f:
-            developers = json.load(f)
-        # Initialize workload score if not present
-        for dev in developers:
-            if 'current_workload_score' not in dev:
-                dev['current_workload_score'] = 0
-        return developers
-    except FileNotFoundError: # Should be caught by os.path.exists now
-        print(f"Error: The file {abs_path} was not found (FileNotFoundError).")
-        return []
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {abs_path}.")
-        return []
+        return [
+            {**dev, 'skills': list(dev['skills']), 'experience': dict(dev['experience'])}
+            for dev in get_developer_snapshot().developers
+        ]
     except Exception as e:
-        print(f"An unexpected error occurred while loading developers: {e}")
+        logger.error(f"An unexpected error occurred while loading developers: {e}")
         return []
 
 def save_developers(developers_data):
-    """Saves developer data back to the JSON file."""
+    """Saves developer data back to the store (atomically, via write-and-rename for JSON)."""
     try:
-        abs_path = os.path.abspath(DATA_FILE_PATH)
-        os.makedirs(os.path.dirname(abs_path), exist_ok=True) # Ensure data directory exists
-        with open(abs_path, 'w') as f:
-            json.dump(developers_data, f, indent=4)
-        print(f"Developer data saved to {abs_path}")
+        repository = get_developer_repository()
+        repository.save(developers_data)
+        logger.info(f"Developer data saved to {repository.backend.path}")
     except Exception as e:
-        print(f"An error occurred while saving developers: {e}")
+        logger.error(f"An error occurred while saving developers: {e}")
+
+def import_developers_to_sqlite(json_path=None, db_path=None):
+    """Copies developers.json into the SQLite store used when DEVELOPER_STORE=sqlite."""
+    developers = JSONDeveloperBackend(json_path or DATA_FILE_PATH).load()
+    SQLiteDeveloperBackend(db_path or DEVELOPERS_DB_PATH).save(developers)
+    return len(developers)
 
 if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--import-sqlite':
+        # python -m app.data_manager --import-sqlite  (then run the app with DEVELOPER_STORE=sqlite)
+        count = import_developers_to_sqlite()
+        print(f"Imported {count} developers into {os.path.abspath(DEVELOPERS_DB_PATH)}.")
+        sys.exit(0)
+
     # Test loading
     devs = load_developers()
     if devs:
@@ -64,4 +96,4 @@ if __name__ == '__main__':
         #     save_developers(devs)
         #     print("Tested saving.")
     else:
-        print("No developers loaded or an error occurred during loading.")
\ No newline at end of file
+        print("No developers loaded or an error occurred during loading.")
@@ -0,0 +1,267 @@
+# app/developer_store.py
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+
+from .local_allocation import CATEGORY_SKILL_HINTS, developer_matches_category
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_developer(dev):
+    """Fills in the optional fields the rest of the app expects on every developer."""
+    dev.setdefault('skills', [])
+    dev.setdefault('experience', {})
+    if 'current_workload_score' not in dev:
+        dev['current_workload_score'] = 0
+    return dev
+
+
+class DeveloperSnapshot:
+    """
+    Immutable view of the team at one point in time, with lookup indexes.
+    The developer dicts are shared between requests and must be treated as read-only;
+    use a WorkloadOverlay to preview workload changes.
+    """
+
+    def __init__(self, developers, version):
+        self.developers = [_normalize_developer(dev) for dev in developers]
+        self.version = version
+        self.by_id = {dev.get('id'): i for i, dev in enumerate(self.developers)}
+        self.by_skill = {}
+        for i, dev in enumerate(self.developers):
+            for skill in dev['skills']:
+                self.by_skill.setdefault(str(skill).lower(), []).append(i)
+        self.by_category = {
+            category: [i for i, dev in enumerate(self.developers) if developer_matches_category(dev, category)]
+            for category in CATEGORY_SKILL_HINTS
+        }
+
+    def get(self, developer_id):
+        index = self.by_id.get(developer_id)
+        return self.developers[index] if index is not None else None
+
+    def with_skill(self, skill):
+        return [self.developers[i] for i in self.by_skill.get(str(skill).lower(), [])]
+
+    def in_category(self, category):
+        indexes = self.by_category.get(category)
+        if indexes is None:
+            indexes = [i for i, dev in enumerate(self.developers) if developer_matches_category(dev, category)]
+        return [self.developers[i] for i in indexes]
+
+    def overlay(self, base_workloads=None):
+        return WorkloadOverlay(self, base_workloads)
+
+
+class WorkloadOverlay:
+    """
+    Copy-on-write workload view over a snapshot for one request (or one batch of requests).
+    Only developers whose workload changes are copied; everyone else is served straight from the
+    shared snapshot. base_workloads optionally overrides starting workloads ({developer_id: score}).
+    """
+
+    def __init__(self, snapshot, base_workloads=None):
+        self.snapshot = snapshot
+        self._workloads = dict(base_workloads or {})
+        self.touched_ids = set()
+        self._lock = threading.Lock()
+
+    def workload(self, developer_id):
+        if developer_id in self._workloads:
+            return self._workloads[developer_id]
+        dev = self.snapshot.get(developer_id)
+        return dev.get('current_workload_score', 0) if dev else 0
+
+    def add_workload(self, developer_id, amount):
+        """Adds workload to a developer in this overlay. Returns False for unknown developer ids."""
+        if developer_id not in self.snapshot.by_id:
+            return False
+        with self._lock:
+            self._workloads[developer_id] = self.workload(developer_id) + amount
+            self.touched_ids.add(developer_id)
+        return True
+
+    def _view(self, dev):
+        developer_id = dev.get('id')
+        if developer_id in self._workloads:
+            return {**dev, 'current_workload_score': self._workloads[developer_id]}
+        return dev
+
+    def developers(self, ids=None):
+        """Developers with overlay workloads applied, in snapshot order (or only the given ids)."""
+        if ids is None:
+            return [self._view(dev) for dev in self.snapshot.developers]
+        return [self._view(self.snapshot.developers[self.snapshot.by_id[i]]) for i in ids if i in self.snapshot.by_id]
+
+
+class JSONDeveloperBackend:
+    """developers.json on disk; writes go to a temp file that atomically replaces the original."""
+    name = "json"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, developers):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".developers-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(developers, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def update_workloads(self, deltas):
+        developers = self.load()
+        for dev in developers:
+            if dev.get('id') in deltas:
+                dev['current_workload_score'] = dev.get('current_workload_score', 0) + deltas[dev['id']]
+        self.save(developers)
+
+
+class SQLiteDeveloperBackend:
+    """
+    SQLite developer table for large teams. Workload updates touch only the affected rows, and
+    PRAGMA user_version is bumped on every write so readers can cheaply detect changes.
+    """
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS developers ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, current_workload_score NUMERIC NOT NULL DEFAULT 0)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _bump_version(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.execute(f"PRAGMA user_version = {int(version) + 1}")
+
+    def signature(self):
+        if not os.path.exists(self.path):
+            return None
+        return self._connection().execute("PRAGMA user_version").fetchone()[0]
+
+    def load(self):
+        developers = []
+        for data, workload in self._connection().execute(
+                "SELECT data, current_workload_score FROM developers ORDER BY rowid"):
+            dev = json.loads(data)
+            dev['current_workload_score'] = workload
+            developers.append(dev)
+        return developers
+
+    def save(self, developers):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM developers")
+            conn.executemany(
+                "INSERT INTO developers (id, data, current_workload_score) VALUES (?, ?, ?)",
+                [
+                    (dev['id'], json.dumps({k: v for k, v in dev.items() if k != 'current_workload_score'}),
+                     dev.get('current_workload_score', 0))
+                    for dev in developers
+                ]
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update_workloads(self, deltas):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE developers SET current_workload_score = current_workload_score + ? WHERE id = ?",
+                [(delta, developer_id) for developer_id, delta in deltas.items()]
+            )
+            self._bump_version(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class DeveloperRepository:
+    """
+    Serves developer data from an in-memory snapshot that is rebuilt only when the backing
+    store changes (file mtime/inode/size for JSON, user_version for SQLite).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._snapshot = DeveloperSnapshot([], version=None)
+        self._signature = object()  # Never equal to a real signature, so the first call loads
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        try:
+            signature = self.backend.signature()
+        except Exception as e:
+            logger.error(f"Could not check developer store {self.backend.path} for changes: {e}")
+            return self._snapshot
+        if signature == self._signature:
+            return self._snapshot
+
+        with self._lock:
+            if signature == self._signature:
+                return self._snapshot
+            if signature is None:
+                logger.error(f"The developer store {self.backend.path} was not found.")
+                self._snapshot = DeveloperSnapshot([], version=None)
+            else:
+                try:
+                    developers = self.backend.load()
+                    self._snapshot = DeveloperSnapshot(developers, version=signature)
+                    logger.info(f"Loaded {len(developers)} developers from {self.backend.path}")
+                except json.JSONDecodeError:
+                    logger.error(f"Could not decode JSON from {self.backend.path}; keeping the previous snapshot.")
+                except Exception as e:
+                    logger.error(f"An unexpected error occurred while loading developers: {e}")
+            self._signature = signature
+            return self._snapshot
+
+    def save(self, developers):
+        """Persists the full developer list atomically."""
+        with self._lock:
+            self.backend.save(developers)
+            self._signature = object()
+
+    def update_workloads(self, deltas):
+        """Adds {developer_id: delta} to the persisted workloads."""
+        with self._lock:
+            self.backend.update_workloads(deltas)
+            self._signature = object()
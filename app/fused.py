@@ -0,0 +1,171 @@
+# app/fused.py
+import logging
+
+from .agent import EFFORT_SCALE, TASK_CATEGORIES, task_validation_error
+from .allocation import ALLOCATION_PREFILTER_MIN_TEAM, ALLOCATION_TOP_K, get_effort_score
+from .llm import estimate_tokens, generate
+from .local_allocation import top_candidates
+from .metrics import record_event, span
+from .roster import JSON_ROSTER_DESCRIPTION, encode_roster, resolve_aliases
+from .stream_parser import salvage_json_array
+
+logger = logging.getLogger(__name__)
+
+
+def generate_fused_prompt(use_case_description, developers_json_str, developers_description=JSON_ROSTER_DESCRIPTION,
+                          example_developer_id="dev1"):
+    """
+    Generates a single prompt that asks for the task breakdown and the allocation at once.
+    The breakdown and allocation instructions are the same as in the two-stage prompts.
+    developers_description explains the roster format (see app/roster.py).
+    """
+    prompt = f"""
+    You are an expert AI project manager, software architect and resource allocation manager.
+    Your task is to break down the following use case or feature request into smaller, actionable technical sub-tasks,
+    and to assign each sub-task to ONE developer from the team below.
+
+    For each sub-task, provide:
+    1. A concise "title" for the task.
+    2. A "description" of what needs to be done.
+    3. A "category" from the following list: {', '.join(TASK_CATEGORIES)}. If unsure, choose the closest or 'Research'.
+    4. An estimated "effort" level from the following scale: {', '.join(EFFORT_SCALE)}.
+    5. An "assigned_developer_id": the "id" of the developer you assign, or "unassigned" if no developer is suitable.
+    6. A brief "reasoning" for your choice of developer, or why the task was left unassigned.
+
+    Assign developers using these criteria, in approximate order of importance:
+    1.  **Skill Match:** The developer MUST have the primary skill related to the task's "category" (or a more specific skill, e.g. "React" for "Frontend").
+    2.  **Current Workload:** Prefer developers with a lower `current_workload_score`. Tasks you assign add to it (Small 2, Medium 3, Large 5).
+    3.  **Experience:** Prefer more `experience` (years) in the task's category.
+    4.  **Fair Distribution:** Avoid overloading one developer if others are available and suitable.
+
+    The team is given as: {developers_description}
+
+    User Case / Feature Request:
+    "{use_case_description}"
+
+    AVAILABLE DEVELOPERS:
+    {developers_json_str}
+
+    Please format your output as a valid JSON list of objects with the keys "title", "description", "category", "effort", "assigned_developer_id" and "reasoning".
+    Example of a single task object:
+    {{
+        "title": "Create User Login UI",
+        "description": "Develop the HTML, CSS, and JavaScript for the user login page.",
+        "category": "Frontend",
+        "effort": "Medium",
+        "assigned_developer_id": "{example_developer_id}",
+        "reasoning": "Alice ({example_developer_id}) has strong Frontend skills (5 years experience) and a manageable workload score of 2."
+    }}
+
+    Provide only the JSON list in your response, nothing else.
+    """
+    return prompt
+
+
+def build_fused_roster(developers, category_index=None):
+    """
+    Developers to include in the fused prompt. The tasks are not known yet, so large teams are
+    reduced to the top ALLOCATION_TOP_K candidates of every task category.
+    """
+    if len(developers) <= ALLOCATION_PREFILTER_MIN_TEAM:
+        selected = developers
+    else:
+        positions = set()
+        for category in TASK_CATEGORIES:
+            positions.update(top_candidates(developers, category, ALLOCATION_TOP_K, category_index))
+        selected = [developers[i] for i in sorted(positions)]
+    return selected
+
+
+def fused_task_error(task, developers_by_id):
+    """Applies the breakdown agent's task rules and the allocation agent's assignment rules to one task."""
+    error = task_validation_error(task)
+    if error:
+        return error
+    assigned_dev_id = task.get("assigned_developer_id")
+    if not assigned_dev_id:
+        return "Task has no assigned_developer_id."
+    if assigned_dev_id != "unassigned" and assigned_dev_id not in developers_by_id:
+        return f"Task is assigned to unknown developer ID '{assigned_dev_id}'."
+    return None
+
+
+def fused_breakdown_and_allocation(use_case_description, developers, category_index=None):
+    """
+    Breaks down and allocates a use case with a single LLM call.
+    Returns (original_tasks, allocated_tasks, None) in the same shapes as the two-stage pipeline,
+    or (None, None, reason) if the call fails or no task of its answer can be parsed and validated,
+    in which case the caller should fall back to the two-stage path. Tasks that are damaged or fail
+    validation are dropped while the valid ones are kept.
+    """
+    roster = build_fused_roster(developers, category_index)
+    roster_text, developers_description, alias_to_id = encode_roster(roster)
+    prompt = generate_fused_prompt(
+        use_case_description, roster_text, developers_description, example_developer_id="d1" if alias_to_id else "dev1"
+    )
+    logger.info(
+        f"Fused agent: prompt of {len(prompt.encode('utf-8'))} bytes (~{estimate_tokens(prompt)} tokens, "
+        f"roster ~{estimate_tokens(roster_text)}) with {len(roster)} of {len(developers)} developers."
+    )
+    try:
+        response = generate(prompt, purpose="fused")
+    except Exception as e:
+        record_event("fused_error")
+        logger.error(f"Fused agent: LLM call failed: {e}")
+        return None, None, f"LLM call failed: {e}"
+
+    # Like the two-stage agents, keep every valid task of a malformed or truncated answer.
+    with span("fused_parse", response_bytes=len(response.text)):
+        items, errors, truncated = salvage_json_array(response.text)
+        resolve_aliases(items, alias_to_id)
+    if errors or truncated:
+        record_event("fused_json_decode_error")
+        for raw, error in errors:
+            logger.error(f"Fused agent: error decoding a task: {error}. Received: {raw}")
+        if truncated:
+            logger.error("Fused agent: response ended before the JSON list was closed. Received text was: %s", response.text)
+
+    developers_by_id = {dev.get('id'): dev for dev in developers}
+    fused_tasks = []
+    rejected = []
+    for i, task in enumerate(items):
+        error = fused_task_error(task, developers_by_id)
+        if error:
+            rejected.append(f"Task at index {i}: {error}")
+        else:
+            fused_tasks.append(task)
+    if rejected:
+        record_event("fused_validation_error")
+        for error in rejected:
+            logger.error(f"Fused agent: validation failed: {error}")
+
+    if not fused_tasks and (errors or truncated or rejected):
+        if rejected:
+            return None, None, rejected[0]
+        if errors:
+            return None, None, f"Invalid JSON: {errors[0][1]}"
+        return None, None, "Response is not a complete JSON list."
+    if errors or truncated or rejected:
+        record_event("fused_partial")
+        logger.warning(
+            f"Fused agent: keeping {len(fused_tasks)} valid task(s); {len(errors) + len(rejected)} were dropped"
+            f"{' and the answer was cut off' if truncated else ''}."
+        )
+
+    original_tasks = []
+    allocated_tasks = []
+    for task in fused_tasks:
+        original_task = {key: task[key] for key in ("title", "description", "category", "effort")}
+        assigned_dev_id = task["assigned_developer_id"]
+        if assigned_dev_id == "unassigned":
+            assigned_to = {"id": "unassigned", "name": "Unassigned by AI"}
+        else:
+            assigned_to = {"id": assigned_dev_id, "name": developers_by_id[assigned_dev_id].get('name')}
+        original_tasks.append(original_task)
+        allocated_tasks.append({
+            **original_task,
+            'assigned_to': assigned_to,
+            'ai_reasoning': task.get("reasoning", "No reasoning provided by AI."),
+            'effort_score': get_effort_score(task["effort"]),
+        })
+    return original_tasks, allocated_tasks, None
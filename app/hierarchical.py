@@ -0,0 +1,197 @@
+# app/hierarchical.py
+"""
+Hierarchical breakdown of long specifications (pipeline_mode "hierarchical").
+
+A long use case is split into sections on heading boundaries, or on paragraph boundaries where a
+heading section is itself too long, and small neighbouring sections are packed together up to
+HIERARCHICAL_SECTION_CHARS. Every section is broken down by its own (cached) breakdown call, at
+most HIERARCHICAL_CONCURRENCY at a time. The results are then merged in document order:
+near-identical tasks from different sections (same category, similar titles) are kept once, and
+every task records the sections it came from in 'source_sections'.
+"""
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .agent import normalize_title, split_use_case_into_tasks
+from .metrics import record_event, span
+from .scheduler import current_priority, llm_priority
+from .similarity import jaccard, shingles
+
+logger = logging.getLogger(__name__)
+
+# Use cases up to this many characters are broken down in one call; longer ones are split into sections of at most this size.
+HIERARCHICAL_SECTION_CHARS = int(os.getenv("HIERARCHICAL_SECTION_CHARS", "4000"))
+HIERARCHICAL_CONCURRENCY = int(os.getenv("HIERARCHICAL_CONCURRENCY", "4"))
+# Tasks of the same category whose title words overlap at least this much (Jaccard) are merged.
+HIERARCHICAL_DEDUP_THRESHOLD = float(os.getenv("HIERARCHICAL_DEDUP_THRESHOLD", "0.8"))
+
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^\s{0,3}\d+(\.\d+)*[.)]?\s+[A-Z][^.!?]{0,78}$")
+_UNDERLINE = re.compile(r"^\s{0,3}(=+|-+)\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _is_heading(lines, i):
+    line = lines[i]
+    if _MARKDOWN_HEADING.match(line) or _NUMBERED_HEADING.match(line):
+        return True
+    # Setext heading: a short text line underlined with === or ---.
+    return (
+        i + 1 < len(lines) and bool(line.strip()) and len(line.strip()) <= 80
+        and bool(_UNDERLINE.match(lines[i + 1])) and len(lines[i + 1].strip()) >= 3
+    )
+
+
+def _heading_blocks(text):
+    """Splits text into (heading, body_text) blocks; text before the first heading has heading None."""
+    lines = text.split("\n")
+    blocks = []
+    heading, start = None, 0
+    for i in range(len(lines)):
+        if i > start and _is_heading(lines, i):
+            blocks.append((heading, "\n".join(lines[start:i]).strip()))
+            heading, start = lines[i].strip().lstrip("#").strip(), i
+        elif i == 0 and _is_heading(lines, 0):
+            heading = lines[0].strip().lstrip("#").strip()
+    blocks.append((heading, "\n".join(lines[start:]).strip()))
+    return [(heading, body) for heading, body in blocks if body]
+
+
+def _split_long(text, max_chars):
+    """Splits text on paragraph, then line, then sentence boundaries into pieces of at most max_chars."""
+    if len(text) <= max_chars:
+        return [text]
+    for separator in (re.compile(r"\n\s*\n"), re.compile(r"\n"), _SENTENCE_END):
+        parts = [part.strip() for part in separator.split(text) if part.strip()]
+        if len(parts) > 1:
+            break
+    else:
+        return [text[start:start + max_chars] for start in range(0, len(text), max_chars)]
+    pieces = []
+    for part in parts:
+        for piece in _split_long(part, max_chars):
+            if pieces and len(pieces[-1]) + len(piece) + 2 <= max_chars:
+                pieces[-1] = f"{pieces[-1]}\n\n{piece}"
+            else:
+                pieces.append(piece)
+    return pieces
+
+
+def split_into_sections(text, max_chars=HIERARCHICAL_SECTION_CHARS):
+    """
+    Returns the sections of a specification as dicts with 'index' (1-based), 'headings' and 'text'.
+    Text of up to max_chars is a single section. A heading section longer than max_chars is split on
+    paragraph boundaries, each part repeating the heading for context.
+    """
+    text = (text or "").replace("\r\n", "\n").strip()
+    if len(text) <= max_chars:
+        return [{"index": 1, "headings": [], "text": text}]
+
+    units = []
+    for heading, body in _heading_blocks(text):
+        if len(body) <= max_chars:
+            units.append((heading, body))
+            continue
+        prefix = f"{heading} (continued)\n\n" if heading else ""
+        pieces = _split_long(body, max_chars - len(prefix))
+        units.extend((heading, piece if n == 0 else prefix + piece) for n, piece in enumerate(pieces))
+
+    sections = []
+    for heading, unit_text in units:
+        last = sections[-1] if sections else None
+        if last and len(last["text"]) + len(unit_text) + 2 <= max_chars:
+            last["text"] = f"{last['text']}\n\n{unit_text}"
+            if heading and heading not in last["headings"]:
+                last["headings"].append(heading)
+        else:
+            sections.append({"index": len(sections) + 1, "headings": [heading] if heading else [], "text": unit_text})
+    return sections
+
+
+def _title_key(task):
+    title = normalize_title(task.get('title'))
+    return str(task.get('category')), title, shingles(title, size=1)
+
+
+def _is_duplicate(key, kept_key):
+    category, title, words = key
+    kept_category, kept_title, kept_words = kept_key
+    if category != kept_category:
+        return False
+    return title == kept_title or jaccard(words, kept_words) >= HIERARCHICAL_DEDUP_THRESHOLD
+
+
+def merge_section_tasks(section_tasks):
+    """
+    Merges (section_index, tasks) pairs in order into one task list. A task that duplicates a task
+    of an earlier section is dropped and its section is added to that task's 'source_sections';
+    tasks of the same section are never merged. Returns (merged_tasks, duplicate_count).
+    """
+    merged = []
+    keys = []
+    duplicates = 0
+    for section_index, tasks in section_tasks:
+        earlier = len(merged)  # Only tasks of earlier sections are candidates
+        for task in tasks:
+            key = _title_key(task)
+            existing = next((i for i in range(earlier) if _is_duplicate(key, keys[i])), None)
+            if existing is not None:
+                duplicates += 1
+                if section_index not in merged[existing]['source_sections']:
+                    merged[existing]['source_sections'].append(section_index)
+                continue
+            merged.append({**task, "source_sections": [section_index]})
+            keys.append(key)
+    return merged, duplicates
+
+
+def hierarchical_breakdown(use_case_description, use_cache=True, max_chars=HIERARCHICAL_SECTION_CHARS,
+                           concurrency=HIERARCHICAL_CONCURRENCY):
+    """
+    Breaks down a long use case section by section (see the module docstring).
+    Returns (tasks, sections) where sections describe each section's headings, size, task count and
+    status ("ok" or "failed"). tasks is None if every section failed; sections that failed while
+    others succeeded only leave their tasks out.
+    """
+    sections = split_into_sections(use_case_description, max_chars)
+    priority = current_priority()  # Worker threads do not inherit the caller's LLM priority
+
+    def breakdown_section(section):
+        with llm_priority(priority):
+            return split_use_case_into_tasks(section["text"], use_cache=use_cache)
+
+    with span("hierarchical_breakdown", sections=len(sections)) as details:
+        if len(sections) == 1:
+            results = [breakdown_section(sections[0])]
+        else:
+            logger.info(f"Hierarchical breakdown: {len(sections)} sections, up to {concurrency} at a time.")
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(sections))),
+                                    thread_name_prefix="section-breakdown") as executor:
+                results = list(executor.map(breakdown_section, sections))
+
+        summaries = []
+        section_tasks = []
+        for section, tasks in zip(sections, results):
+            summaries.append({
+                "index": section["index"],
+                "headings": section["headings"],
+                "chars": len(section["text"]),
+                "task_count": len(tasks) if tasks is not None else 0,
+                "status": "ok" if tasks is not None else "failed",
+            })
+            if tasks is not None:
+                section_tasks.append((section["index"], tasks))
+
+        failed = len(sections) - len(section_tasks)
+        if failed:
+            record_event("hierarchical_section_failed", failed)
+            logger.warning(f"Hierarchical breakdown: {failed} of {len(sections)} section(s) failed.")
+        if not section_tasks:
+            return None, summaries
+        tasks, duplicates = merge_section_tasks(section_tasks)
+        details["duplicates"] = duplicates
+    if duplicates:
+        logger.info(f"Hierarchical breakdown: merged {duplicates} duplicate task(s) across sections.")
+    return tasks, summaries
@@ -0,0 +1,320 @@
+# app/history.py
+"""
+Queryable history of allocation results.
+
+Every processed use case and each of its task assignments (assignee, effort score, reasoning,
+model and timing) are kept in SQLite at HISTORY_DB_PATH. Recording only puts the result on an
+in-memory queue; a background writer thread inserts queued results in batches of up to
+HISTORY_BATCH_SIZE, in one transaction per batch, so requests never wait for the database.
+If the queue is full (HISTORY_QUEUE_MAX), results are dropped and counted rather than blocking.
+
+Queries are paginated newest first with an id cursor, and aggregates sum task counts and effort
+per developer or per category, optionally per day, week or month (UTC).
+"""
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") != "0"
+HISTORY_DB_PATH = os.getenv(
+    "HISTORY_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'history.sqlite3')
+)
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "1.0"))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "10000"))
+HISTORY_PAGE_MAX = 500
+
+HISTORY_GROUPS = ("developer", "category")
+# SQLite expressions that map created_at to the start of its bucket (weeks start on Monday).
+HISTORY_BUCKETS = {
+    "day": "date(t.created_at, 'unixepoch')",
+    "week": "date(t.created_at, 'unixepoch', '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', t.created_at, 'unixepoch')",
+}
+_TASK_FILTERS = {
+    "developer_id": "t.developer_id = ?",
+    "category": "t.category = ?",
+    "effort": "t.effort = ?",
+    "model": "u.model = ?",
+    "use_case_id": "t.use_case_id = ?",
+    "since": "t.created_at >= ?",
+    "until": "t.created_at < ?",
+}
+
+
+def _parse_time(value):
+    """Epoch seconds, or an ISO 8601 date/datetime (UTC unless it has an offset)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_history_filters(args):
+    """
+    Validates query parameters (a dict-like of strings) for the history endpoints.
+    Returns (filters, None), or (None, error_message) if a parameter is invalid.
+    """
+    filters = {}
+    for key in _TASK_FILTERS:
+        value = args.get(key)
+        if value in (None, ""):
+            continue
+        if key in ("since", "until"):
+            try:
+                value = _parse_time(value)
+            except ValueError:
+                return None, f"Invalid {key} '{value}'. Expected epoch seconds or an ISO 8601 date."
+        filters[key] = value
+    return filters, None
+
+
+def parse_history_page(args, default_limit=100):
+    """
+    Validates the ?limit= and ?cursor= query parameters of the history endpoints.
+    Returns ({"limit", "cursor"}, None), or (None, error_message) if one is not an integer.
+    """
+    page = {"limit": default_limit, "cursor": None}
+    for key in page:
+        value = args.get(key)
+        if value in (None, ""):
+            continue
+        try:
+            page[key] = int(value)
+        except ValueError:
+            return None, f"Invalid {key} '{value}'. Expected an integer."
+    return page, None
+
+
+def _where(filters):
+    clauses = [_TASK_FILTERS[key] for key in filters]
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", list(filters.values())
+
+
+class HistoryStore:
+    """SQLite tables of processed use cases and their task assignments, with a batched background writer."""
+
+    def __init__(self, db_path=HISTORY_DB_PATH, batch_size=HISTORY_BATCH_SIZE,
+                 flush_interval=HISTORY_FLUSH_INTERVAL_SECONDS, max_queue=HISTORY_QUEUE_MAX):
+        self.db_path = os.path.abspath(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._counters = {"written": 0, "dropped": 0, "errors": 0}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS use_cases ("
+                "id TEXT PRIMARY KEY, use_case TEXT NOT NULL, pipeline_mode TEXT, allocation_mode TEXT, "
+                "model TEXT, task_count INTEGER NOT NULL, duration_ms REAL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_assignments ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, use_case_id TEXT NOT NULL, title TEXT, description TEXT, "
+                "category TEXT, effort TEXT, effort_score NUMERIC, developer_id TEXT, developer_name TEXT, "
+                "reasoning TEXT, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_use_cases_created_at ON use_cases (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_assignments_use_case ON task_assignments (use_case_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_assignments_created_at ON task_assignments (created_at)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_assignments_developer ON task_assignments (developer_id, created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_assignments_category ON task_assignments (category, created_at)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    # --- Writing ---
+
+    def record(self, use_case_description, allocated_tasks, pipeline_mode=None, allocation_mode=None, model=None,
+               duration_ms=None):
+        """
+        Queues a processed use case and its allocated tasks for the background writer and returns
+        its history id, or None if the queue is full.
+        """
+        history_id = uuid.uuid4().hex
+        now = time.time()
+        use_case_row = (history_id, use_case_description, pipeline_mode, allocation_mode, model,
+                        len(allocated_tasks), duration_ms, now)
+        task_rows = [
+            (history_id, task.get('title'), task.get('description'), task.get('category'), task.get('effort'),
+             task.get('effort_score'), (task.get('assigned_to') or {}).get('id'),
+             (task.get('assigned_to') or {}).get('name'), task.get('ai_reasoning'), now)
+            for task in allocated_tasks
+        ]
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((use_case_row, task_rows))
+        except queue.Full:
+            self._count("dropped")
+            logger.warning("History: queue is full, dropping a result.")
+            return None
+        return history_id
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="history-writer", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO use_cases (id, use_case, pipeline_mode, allocation_mode, model, task_count, "
+                    "duration_ms, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [use_case_row for use_case_row, _ in batch]
+                )
+                conn.executemany(
+                    "INSERT INTO task_assignments (use_case_id, title, description, category, effort, effort_score, "
+                    "developer_id, developer_name, reasoning, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for _, task_rows in batch for row in task_rows]
+                )
+            with self._lock:
+                self._counters["written"] += len(batch)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.error(f"History: could not write {len(batch)} result(s): {e}")
+
+    def flush(self):
+        """Blocks until every queued result has been written (or failed)."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # --- Queries ---
+
+    def tasks(self, filters=None, limit=100, cursor=None):
+        """
+        Task assignments matching filters, newest first. Returns (items, next_cursor); pass
+        next_cursor back as cursor for the next page (None on the last page).
+        """
+        filters = dict(filters or {})
+        limit = max(1, min(int(limit), HISTORY_PAGE_MAX))
+        where, params = _where(filters)
+        if cursor is not None:
+            where = f"{where} AND t.id < ?" if where else " WHERE t.id < ?"
+            params.append(int(cursor))
+        rows = self._connection().execute(
+            "SELECT t.*, u.model, u.pipeline_mode, u.allocation_mode FROM task_assignments t "
+            f"JOIN use_cases u ON u.id = t.use_case_id{where} ORDER BY t.id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        return items, (items[-1]["id"] if len(rows) > limit else None)
+
+    def use_case(self, history_id):
+        """A recorded use case with its task assignments, or None."""
+        conn = self._connection()
+        row = conn.execute("SELECT * FROM use_cases WHERE id = ?", (history_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["tasks"] = [
+            dict(task) for task in conn.execute(
+                "SELECT * FROM task_assignments WHERE use_case_id = ? ORDER BY id", (history_id,)
+            )
+        ]
+        return record
+
+    def workload(self, group_by="developer", bucket=None, filters=None, limit=100):
+        """
+        Task counts and total effort per developer or category (and per time bucket), ordered by
+        bucket and then by effort, largest first. Unassigned tasks are left out when grouping by developer.
+        """
+        filters = dict(filters or {})
+        where, params = _where(filters)
+        if group_by == "developer":
+            keys = ["t.developer_id", "MAX(t.developer_name) AS developer_name"]
+            group = ["t.developer_id"]
+            excluded = "t.developer_id IS NOT NULL AND t.developer_id != 'unassigned'"
+            where = f"{where} AND {excluded}" if where else f" WHERE {excluded}"
+        else:
+            keys = ["t.category"]
+            group = ["t.category"]
+        if bucket:
+            keys.insert(0, f"{HISTORY_BUCKETS[bucket]} AS bucket")
+            group.insert(0, "bucket")
+        rows = self._connection().execute(
+            f"SELECT {', '.join(keys)}, COUNT(*) AS task_count, COALESCE(SUM(t.effort_score), 0) AS effort_score "
+            f"FROM task_assignments t JOIN use_cases u ON u.id = t.use_case_id{where} "
+            f"GROUP BY {', '.join(group)} ORDER BY {'bucket DESC, ' if bucket else ''}effort_score DESC, task_count DESC "
+            f"LIMIT ?",
+            params + [max(1, min(int(limit), HISTORY_PAGE_MAX * 10))]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+
+history_store = HistoryStore()
+# Write what is still queued when the process exits; the writer is a daemon thread.
+atexit.register(history_store.flush)
+
+
+def _history_metrics():
+    stats = history_store.stats()
+    return {(outcome,): stats[outcome] for outcome in ("written", "dropped", "errors")}
+
+
+registry.callback(
+    "taskmgr_history_records_total", "Use case results recorded in the history store, by outcome.",
+    _history_metrics, ("outcome",), kind="counter"
+)
+registry.callback(
+    "taskmgr_history_queue_depth", "Results waiting for the history writer.",
+    lambda: {(): history_store.stats()["queued"]}
+)
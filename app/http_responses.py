@@ -0,0 +1,84 @@
+# app/http_responses.py
+"""
+Conditional and compressed HTTP responses.
+
+GET responses carry a content-hash ETag, and a request whose If-None-Match already names it gets
+an empty 304 instead of the body. Responses of at least RESPONSE_COMPRESS_MIN_BYTES are compressed
+with brotli (if the optional `brotli` package is installed) or gzip, whichever the client accepts.
+Streamed responses are left alone, so NDJSON and Server-Sent Events still flush line by line.
+"""
+import gzip
+import hashlib
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "1") != "0"
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+_COMPRESSIBLE_MIMETYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+
+
+def _choose_encoding(request):
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def apply_etag(request, response):
+    """
+    Tags a successful GET response with a strong ETag of its body and turns it into a 304 when
+    If-None-Match matches. Tags of compressed variants ("<hash>-gzip") match their base tag too.
+    """
+    if request.method != "GET" or response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+        return response
+    etag = hashlib.sha256(response.get_data()).hexdigest()[:32]
+    response.set_etag(etag)
+    if_none_match = request.if_none_match
+    if if_none_match:
+        candidates = {tag.rsplit("-", 1)[0] if tag.endswith(("-gzip", "-br")) else tag
+                      for tag in if_none_match.as_set(include_weak=True)}
+        if if_none_match.star_tag or etag in candidates:
+            response.status_code = 304
+            response.set_data(b"")
+            response.headers.pop("Content-Type", None)
+            response.headers.pop("Content-Length", None)
+    return response
+
+
+def compress_response(request, response):
+    """Compresses a large, non-streamed response with the best encoding the client accepts."""
+    if not RESPONSE_COMPRESSION_ENABLED or response.is_streamed or response.direct_passthrough:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in _COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+    encoding = _choose_encoding(request)
+    if encoding is None:
+        return response
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    logger.debug(f"Compressed {request.path} response with {encoding}: {len(data)} -> {len(compressed)} bytes.")
+    return response
@@ -0,0 +1,135 @@
+# app/idempotency.py
+"""
+Idempotency keys for POST endpoints.
+
+A client that sends an `Idempotency-Key` header can safely retry: the first request with a key
+runs and its response is stored in SQLite (shared by every worker process), and later requests
+with the same key and the same body get the stored response back instead of running the
+pipeline again. Reusing a key for a different body is an error, and a retry that arrives while
+the first request is still running is told to try again shortly. Only successful (2xx) responses
+are stored; after a failure the key is released so the next retry runs normally.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import record_event
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_DB_PATH = os.getenv(
+    "IDEMPOTENCY_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'idempotency.sqlite3')
+)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+# A request still marked in progress after this long is assumed to have died with its worker.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "600"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+_PURGE_INTERVAL_SECONDS = 300
+
+IDEMPOTENCY_NEW = "new"
+IDEMPOTENCY_REPLAY = "replay"
+IDEMPOTENCY_IN_PROGRESS = "in_progress"
+IDEMPOTENCY_MISMATCH = "mismatch"
+
+
+def request_fingerprint(path, query_string, data):
+    """Hash of what makes two requests identical: the path, the query string and the JSON body."""
+    canonical = json.dumps({"path": path, "query": query_string, "body": data}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Stored responses by (scope, key); scope is the endpoint so keys cannot collide across routes."""
+
+    def __init__(self, db_path=IDEMPOTENCY_DB_PATH, ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+                 lock_seconds=IDEMPOTENCY_LOCK_SECONDS):
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                "scope TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, state TEXT NOT NULL, "
+                "http_status INTEGER, body TEXT, created_at REAL NOT NULL, PRIMARY KEY (scope, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency_keys (created_at)")
+            self._local.conn = conn
+        return conn
+
+    def begin(self, scope, key, fingerprint):
+        """
+        Claims a key for a request. Returns (outcome, stored) where outcome is IDEMPOTENCY_NEW (run the
+        request, then call complete() or release()), IDEMPOTENCY_REPLAY (stored is (http_status, body)),
+        IDEMPOTENCY_IN_PROGRESS or IDEMPOTENCY_MISMATCH (the key was used for a different request).
+        """
+        now = time.time()
+        self._purge_if_due(now)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT fingerprint, state, http_status, body, created_at FROM idempotency_keys "
+                "WHERE scope = ? AND key = ?", (scope, key)
+            ).fetchone()
+            if row is not None:
+                stored_fingerprint, state, http_status, body, created_at = row
+                expired = created_at < now - (self.ttl_seconds if state == "done" else self.lock_seconds)
+                if not expired:
+                    conn.execute("COMMIT")
+                    if stored_fingerprint != fingerprint:
+                        return IDEMPOTENCY_MISMATCH, None
+                    if state == "done":
+                        record_event("idempotent_replay")
+                        return IDEMPOTENCY_REPLAY, (http_status, json.loads(body))
+                    return IDEMPOTENCY_IN_PROGRESS, None
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (scope, key, fingerprint, state, created_at) "
+                "VALUES (?, ?, ?, 'in_progress', ?)", (scope, key, fingerprint, now)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return IDEMPOTENCY_NEW, None
+
+    def complete(self, scope, key, http_status, body):
+        """Stores the response of a claimed key for replay."""
+        self._connection().execute(
+            "UPDATE idempotency_keys SET state = 'done', http_status = ?, body = ?, created_at = ? "
+            "WHERE scope = ? AND key = ?", (http_status, json.dumps(body), time.time(), scope, key)
+        )
+
+    def release(self, scope, key):
+        """Forgets a claimed key whose request failed, so that a retry runs again."""
+        self._connection().execute(
+            "DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND state = 'in_progress'", (scope, key)
+        )
+
+    def _purge_if_due(self, now):
+        if now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        try:
+            removed = self._connection().execute(
+                "DELETE FROM idempotency_keys WHERE created_at < ?", (now - max(self.ttl_seconds, self.lock_seconds),)
+            ).rowcount
+            if removed:
+                logger.info(f"Idempotency: purged {removed} expired key(s).")
+        except sqlite3.Error as e:
+            logger.warning(f"Idempotency: purge failed ({e}).")
+
+
+idempotency_store = IdempotencyStore()
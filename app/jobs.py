@@ -0,0 +1,196 @@
+# app/jobs.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .pipeline import run_use_case_pipeline
+from .scheduler import PRIORITY_BATCH, llm_priority
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv(
+    "JOBS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'jobs.sqlite3')
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "32"))  # Queued + running jobs per process
+JOB_RETRY_AFTER_SECONDS = int(os.getenv("JOB_RETRY_AFTER_SECONDS", "5"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 60 * 60)))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the worker queue is at JOB_QUEUE_MAX_DEPTH."""
+
+    def __init__(self, retry_after_seconds):
+        super().__init__("Job queue is full")
+        self.retry_after_seconds = retry_after_seconds
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed job records, shared by every worker process."""
+
+    def __init__(self, db_path=JOBS_DB_PATH):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+                "result TEXT, http_status INTEGER, error TEXT, worker_pid INTEGER, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql, params=()):
+        conn = self._connection()
+        conn.execute(sql, params)
+        conn.commit()
+
+    def create(self, job_id, request_options):
+        self._execute(
+            "INSERT INTO jobs (id, status, request, worker_pid, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, JOB_QUEUED, json.dumps(request_options), os.getpid(), time.time())
+        )
+
+    def mark_running(self, job_id):
+        self._execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+            (JOB_RUNNING, time.time(), job_id)
+        )
+
+    def mark_finished(self, job_id, result, http_status):
+        status = JOB_SUCCEEDED if http_status < 400 else JOB_FAILED
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, http_status = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result), http_status, time.time(), job_id)
+        )
+
+    def mark_error(self, job_id, error):
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, http_status = 500, finished_at = ? WHERE id = ?",
+            (JOB_FAILED, error, time.time(), job_id)
+        )
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['request'] = json.loads(job['request'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def fail_orphaned_jobs(self):
+        """Marks queued/running jobs whose worker process no longer exists as failed."""
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, worker_pid FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+        ).fetchall()
+        orphaned = [row['id'] for row in rows if not row['worker_pid'] or not _pid_alive(row['worker_pid'])]
+        for job_id in orphaned:
+            self.mark_error(job_id, "Job was interrupted because its worker process exited.")
+        return len(orphaned)
+
+    def prune(self, older_than_seconds=JOB_RETENTION_SECONDS):
+        self._execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - older_than_seconds,)
+        )
+
+
+class JobManager:
+    """
+    Runs use case pipelines on a background thread pool.
+    At most max_queue_depth jobs may be queued or running in this process; beyond that,
+    submit() raises QueueFullError so the API can answer 429.
+    """
+
+    def __init__(self, store=None, runner=run_use_case_pipeline,
+                 max_workers=JOB_WORKERS, max_queue_depth=JOB_QUEUE_MAX_DEPTH):
+        self.store = store or JobStore()
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _ensure_started(self):
+        # Called with self._lock held. The pool and store housekeeping are started lazily so
+        # importing the app does not spawn threads or touch the database.
+        if self._executor is None:
+            interrupted = self.store.fail_orphaned_jobs()
+            if interrupted:
+                logger.warning(f"Jobs: marked {interrupted} interrupted job(s) from exited workers as failed.")
+            self.store.prune()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job-worker")
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending
+
+    def submit(self, request_options):
+        """Queues a pipeline run and returns the new job id."""
+        with self._lock:
+            self._ensure_started()
+            if self._pending >= self.max_queue_depth:
+                raise QueueFullError(JOB_RETRY_AFTER_SECONDS)
+            self._pending += 1
+        job_id = uuid.uuid4().hex
+        try:
+            self.store.create(job_id, request_options)
+            self._executor.submit(self._run, job_id, request_options)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, request_options):
+        try:
+            self.store.mark_running(job_id)
+            with llm_priority(PRIORITY_BATCH):  # Interactive requests get the LLM first
+                result, http_status = self.runner(**request_options)
+            self.store.mark_finished(job_id, result, http_status)
+        except Exception as e:
+            logger.error(f"Jobs: job {job_id} failed with an unexpected error: {e}")
+            self.store.mark_error(job_id, str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+
+job_manager = JobManager()
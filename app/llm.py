@@ -0,0 +1,385 @@
+# app/llm.py
+import contextlib
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from .metrics import LLM_COALESCED, record_llm_call, span
+from .scheduler import LLM_SCHEDULER_ENABLED, llm_scheduler
+from .singleflight import SINGLEFLIGHT_ENABLED, coalescing_key, single_flight
+
+# Load .env from the project root (one level up from 'app' directory)
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path=dotenv_path)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # "gemini" or "fake"
+# Using the model name specified by the user; shared by the breakdown and allocation agents.
+MODEL_NAME = os.getenv("GEMINI_MODEL", 'gemini-2.0-flash-001')
+
+# Settings for the offline fake backend
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0"))
+FAKE_LLM_JITTER_SECONDS = float(os.getenv("FAKE_LLM_JITTER_SECONDS", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_TASK_COUNT = int(os.getenv("FAKE_LLM_TASK_COUNT", "0"))  # 0 = derive from the use case text
+FAKE_LLM_RESPONSES_PATH = os.getenv("FAKE_LLM_RESPONSES_PATH")  # JSON object: purpose -> canned response text
+# Simulated quota errors: a fraction of calls, and calls beyond a server-side concurrency limit (0 = off)
+FAKE_LLM_THROTTLE_RATE = float(os.getenv("FAKE_LLM_THROTTLE_RATE", "0"))
+FAKE_LLM_MAX_CONCURRENCY = int(os.getenv("FAKE_LLM_MAX_CONCURRENCY", "0"))
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for prompts whose usage is not reported."""
+    return max(1, len(text or "") // 4)
+
+
+class UsageMetadata:
+    """Token counts in the same shape as Gemini's response.usage_metadata."""
+
+    def __init__(self, prompt_token_count=0, candidates_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class ThrottledError(Exception):
+    """Quota error (HTTP 429) raised by the fake backend, shaped like google.api_core's ResourceExhausted."""
+    code = 429
+
+    def __init__(self, message="Resource has been exhausted (e.g. check quota).", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMResponse:
+    """Backend-neutral response: the generated text plus token usage (if known)."""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class LLMBackend:
+    """
+    Interface shared by every LLM backend. `purpose` names the caller ("breakdown", "allocation")
+    so backends that do not call a real model can shape their answer.
+    """
+    name = "base"
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+
+    def generate(self, prompt, purpose=None):
+        """Returns an LLMResponse for the prompt."""
+        raise NotImplementedError
+
+    def generate_stream(self, prompt, purpose=None):
+        """Yields the response text in chunks as it is generated."""
+        yield self.generate(prompt, purpose=purpose).text
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend. The SDK is imported and configured on first use, not at import time."""
+    name = "gemini"
+
+    def __init__(self, model_name=MODEL_NAME):
+        super().__init__(model_name)
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt, purpose=None):
+        response = self._get_model().generate_content(prompt)
+        return LLMResponse(response.text, getattr(response, 'usage_metadata', None))
+
+    def generate_stream(self, prompt, purpose=None):
+        for chunk in self._get_model().generate_content(prompt, stream=True):
+            yield chunk.text
+
+
+# Keywords used by the fake backend to pick a category for a generated task.
+_FAKE_CATEGORY_KEYWORDS = [
+    ("Frontend", ("page", "ui", "screen", "form", "button", "display", "view", "dashboard")),
+    ("API", ("api", "endpoint", "webhook", "integration")),
+    ("Database", ("database", "store", "schema", "record", "data", "history")),
+    ("QA", ("test", "verify", "validation", "quality")),
+    ("DevOps", ("deploy", "pipeline", "monitor", "infrastructure", "scale")),
+    ("Documentation", ("document", "docs", "guide")),
+    ("Design", ("design", "layout", "mockup")),
+    ("Backend", ("email", "account", "login", "register", "password", "service", "process")),
+]
+_FAKE_EFFORTS = ["Small", "Medium", "Large"]
+
+
+def _extract_json_after(marker, text):
+    """Decodes the first JSON value that follows marker in text, or returns None."""
+    start = text.find(marker)
+    if start == -1:
+        return None
+    remainder = text[start + len(marker):]
+    for i, char in enumerate(remainder):
+        if char in '[{':
+            try:
+                value, _ = json.JSONDecoder().raw_decode(remainder[i:])
+                return value
+            except json.JSONDecodeError:
+                return None
+    return None
+
+
+def _extract_developers(text):
+    """Decodes the developer roster of an allocation prompt, in either the compact or the JSON format."""
+    from .roster import parse_roster
+
+    start = text.find("AVAILABLE DEVELOPERS:")
+    if start != -1:
+        developers = parse_roster(text[start + len("AVAILABLE DEVELOPERS:"):])
+        if developers is not None:
+            return developers
+    return _extract_json_after("AVAILABLE DEVELOPERS:", text) or []
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic offline stand-in for Gemini, for load tests, benchmarks and development
+    without network access. Responses are either canned (per purpose) or generated by rules:
+    breakdown prompts get tasks derived from the use case text, allocation prompts are answered
+    with the local allocation engine, and fused prompts get both. Latency (plus optional jitter)
+    is simulated with sleep().
+    Quota errors can be simulated for a fraction of calls (throttle_rate) and for calls made while
+    more than max_concurrency others are in flight; both raise ThrottledError.
+    """
+    name = "fake"
+
+    def __init__(self, model_name=MODEL_NAME, latency_seconds=FAKE_LLM_LATENCY_SECONDS,
+                 jitter_seconds=FAKE_LLM_JITTER_SECONDS, seed=FAKE_LLM_SEED,
+                 task_count=FAKE_LLM_TASK_COUNT, canned_responses=None,
+                 throttle_rate=FAKE_LLM_THROTTLE_RATE, max_concurrency=FAKE_LLM_MAX_CONCURRENCY):
+        super().__init__(model_name)
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.task_count = task_count
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.canned_responses = dict(canned_responses or {})
+        if not canned_responses and FAKE_LLM_RESPONSES_PATH:
+            with open(FAKE_LLM_RESPONSES_PATH, 'r') as f:
+                self.canned_responses = json.load(f)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_seconds, self.jitter_seconds) if self.jitter_seconds else 0.0
+        return max(0.0, self.latency_seconds + jitter)
+
+    @contextlib.contextmanager
+    def _admit(self):
+        with self._lock:
+            throttled = (self.throttle_rate and self._random.random() < self.throttle_rate) or \
+                (self.max_concurrency and self.in_flight >= self.max_concurrency)
+            if not throttled:
+                self.in_flight += 1
+        if throttled:
+            raise ThrottledError()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _respond(self, prompt, purpose):
+        if purpose in self.canned_responses:
+            return self.canned_responses[purpose]
+        if purpose in ("breakdown", "breakdown_repair"):
+            return self._breakdown_response(prompt)
+        if purpose in ("allocation", "allocation_reask"):
+            return self._allocation_response(prompt)
+        if purpose == "fused":
+            return self._fused_response(prompt)
+        return "[]"
+
+    def _breakdown_response(self, prompt):
+        match = re.search(r'User Case / Feature Request:\s*"(.*?)"\s*(?:Please format|AVAILABLE DEVELOPERS:)', prompt, re.DOTALL)
+        use_case = match.group(1).strip() if match else prompt
+        clauses = [c.strip() for c in re.split(r'[.;,\n]|\band\b', use_case) if len(c.strip()) > 3]
+        if not clauses:
+            clauses = [use_case.strip() or "Investigate request"]
+        count = self.task_count or min(8, max(3, len(clauses)))
+        digest = hashlib.sha256(use_case.encode("utf-8")).digest()
+
+        tasks = []
+        for i in range(count):
+            clause = clauses[i % len(clauses)]
+            lowered = clause.lower()
+            category = next(
+                (name for name, words in _FAKE_CATEGORY_KEYWORDS if any(word in lowered for word in words)),
+                _FAKE_CATEGORY_KEYWORDS[(digest[i % len(digest)] + i) % len(_FAKE_CATEGORY_KEYWORDS)][0]
+            )
+            tasks.append({
+                "title": f"{category} work {i + 1}: {clause[:60]}",
+                "description": f"Implement the part of the request that covers: {clause}",
+                "category": category,
+                "effort": _FAKE_EFFORTS[digest[(i * 7) % len(digest)] % len(_FAKE_EFFORTS)],
+            })
+        return json.dumps(tasks)
+
+    def _allocation_response(self, prompt):
+        from .allocation import get_effort_score
+        from .local_allocation import LocalAllocator
+
+        tasks = _extract_json_after("TASKS TO ASSIGN:", prompt) or []
+        developers = _extract_developers(prompt)
+        allocator = LocalAllocator(developers, get_effort_score)
+        results = []
+        for task in tasks:
+            placed = allocator.place(task)
+            results.append({
+                **{key: task.get(key) for key in ("title", "category", "effort", "description")},
+                "assigned_developer_id": placed['assigned_to']['id'] if placed else "unassigned",
+                "reasoning": placed['ai_reasoning'] if placed else "No developer has a matching skill.",
+            })
+        return json.dumps(results)
+
+    def _fused_response(self, prompt):
+        from .allocation import get_effort_score
+        from .local_allocation import LocalAllocator
+
+        tasks = json.loads(self._breakdown_response(prompt))
+        allocator = LocalAllocator(_extract_developers(prompt), get_effort_score)
+        for task in tasks:
+            placed = allocator.place(task)
+            task["assigned_developer_id"] = placed['assigned_to']['id'] if placed else "unassigned"
+            task["reasoning"] = placed['ai_reasoning'] if placed else "No developer has a matching skill."
+        return json.dumps(tasks)
+
+    def generate(self, prompt, purpose=None):
+        with self._admit():
+            time.sleep(self._delay())
+            text = self._respond(prompt, purpose)
+        return LLMResponse(text, UsageMetadata(estimate_tokens(prompt), estimate_tokens(text)))
+
+    def generate_stream(self, prompt, purpose=None, chunk_size=64):
+        with self._admit():
+            text = self._respond(prompt, purpose)
+            chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+            delay = self._delay() / len(chunks)
+            for chunk in chunks:
+                time.sleep(delay)
+                yield chunk
+
+
+_BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the process-wide backend selected by LLM_BACKEND, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if LLM_BACKEND not in _BACKENDS:
+                    raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}'. Expected one of {sorted(_BACKENDS)}.")
+                _backend = _BACKENDS[LLM_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    """Replaces the process-wide backend (used by benchmarks and load tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _response_to_dict(response):
+    usage = response.usage_metadata
+    return {
+        "text": response.text,
+        "prompt_token_count": getattr(usage, 'prompt_token_count', 0) or 0,
+        "candidates_token_count": getattr(usage, 'candidates_token_count', 0) or 0,
+    }
+
+
+def _response_from_dict(data):
+    return LLMResponse(data["text"], UsageMetadata(data["prompt_token_count"], data["candidates_token_count"]))
+
+
+def generate(prompt, purpose=None):
+    """
+    Sends a prompt to the current backend, recording latency, size and token usage metrics.
+    Identical prompts that are already in flight (in this or another worker process) are not sent
+    again; the caller waits for and shares the in-flight call's response. Calls that are sent go
+    through the shared scheduler (rate limits, priority, adaptive concurrency and retries).
+    """
+    purpose = purpose or "other"
+    with span(f"llm_{purpose}", prompt_bytes=len(prompt)) as details:
+        backend = get_backend()
+        try:
+            def call_backend():
+                if not LLM_SCHEDULER_ENABLED:
+                    return backend.generate(prompt, purpose=purpose)
+                return llm_scheduler.run(
+                    lambda: backend.generate(prompt, purpose=purpose), tokens=estimate_tokens(prompt),
+                    usage_tokens=lambda response: getattr(response.usage_metadata, 'total_token_count', 0)
+                )
+
+            if SINGLEFLIGHT_ENABLED:
+                key = coalescing_key(backend.name, backend.model_name, purpose, prompt)
+                response, shared = single_flight.call(
+                    key, call_backend, serialize=_response_to_dict, deserialize=_response_from_dict
+                )
+            else:
+                response, shared = call_backend(), None
+        except Exception:
+            record_llm_call(purpose, prompt, outcome="error")
+            raise
+        if shared:
+            # No tokens were spent for this caller, so usage is not counted again.
+            LLM_COALESCED.inc(purpose=purpose, scope=shared)
+            record_llm_call(purpose, prompt, response.text, outcome="coalesced")
+        else:
+            record_llm_call(purpose, prompt, response.text, response.usage_metadata)
+        details["response_bytes"] = len(response.text or "")
+        details["coalesced"] = shared or "no"
+    return response
+
+
+def generate_stream(prompt, purpose=None):
+    """
+    Streams a response from the current backend, recording the same metrics as generate().
+    Streams are admitted by the scheduler but not retried, since chunks may already have been used.
+    """
+    purpose = purpose or "other"
+    with span(f"llm_{purpose}_stream", prompt_bytes=len(prompt)) as details:
+        chunks = []
+        try:
+            with llm_scheduler.slot(tokens=estimate_tokens(prompt)) if LLM_SCHEDULER_ENABLED else contextlib.nullcontext():
+                for chunk in get_backend().generate_stream(prompt, purpose=purpose):
+                    chunks.append(chunk)
+                    yield chunk
+        except Exception:
+            record_llm_call(purpose, prompt, outcome="error")
+            raise
+        text = "".join(chunks)
+        record_llm_call(purpose, prompt, text, UsageMetadata(estimate_tokens(prompt), estimate_tokens(text)))
+        details["response_bytes"] = len(text)
@@ -0,0 +1,172 @@
+# app/local_allocation.py
+import heapq
+
+# Skills that count as a match for a task category, in addition to the category name itself.
+# Mirrors the guidance given to the AI allocator ("a "Frontend" task needs a developer with
+# "Frontend" or a more specific frontend skill like "React" or "JavaScript"").
+CATEGORY_SKILL_HINTS = {
+    "Frontend": ["React", "JavaScript", "TypeScript", "CSS", "HTML", "Vue", "Angular", "UI/UX"],
+    "Backend": ["Python", "Flask", "Django", "Node.js", "Java", "Go"],
+    "Database": ["SQL", "PostgreSQL", "MySQL", "MongoDB", "Redis"],
+    "API": ["REST", "GraphQL", "Flask", "FastAPI"],
+    "QA": ["Testing", "Automation", "Selenium", "Pytest"],
+    "DevOps": ["Docker", "Kubernetes", "CI/CD", "AWS", "GCP", "Azure"],
+    "Documentation": ["Technical Writing"],
+    "Design": ["UI/UX", "Figma"],
+    "Research": [],
+}
+
+
+def developer_matches_category(developer, category):
+    """Returns True if the developer has the primary skill (or a more specific one) for a category."""
+    if not category:
+        return False
+    wanted = {category.lower()}
+    wanted.update(skill.lower() for skill in CATEGORY_SKILL_HINTS.get(category, []))
+    skills = {str(skill).lower() for skill in developer.get('skills') or []}
+    if skills & wanted:
+        return True
+    experience = developer.get('experience') or {}
+    return any(str(key).lower() == category.lower() and years for key, years in experience.items())
+
+
+def build_category_index(developers, categories):
+    """Maps each category to the list of developer indexes that can take tasks in it."""
+    index = {}
+    for category in categories:
+        index[category] = [i for i, dev in enumerate(developers) if developer_matches_category(dev, category)]
+    return index
+
+
+def top_candidates(developers, category, k, category_index=None):
+    """
+    Positions of the k developers best suited to a category by the allocation rules: matching
+    skill, then lowest current_workload_score, then most experience in the category.
+    """
+    members = category_index.get(category) if category_index else None
+    if members is None:
+        members = build_category_index(developers, [category])[category]
+
+    def rank(i):
+        dev = developers[i]
+        return (dev.get('current_workload_score', 0) or 0, -((dev.get('experience') or {}).get(category, 0) or 0))
+
+    return heapq.nsmallest(k, members, key=rank)
+
+
+class LocalAllocator:
+    """
+    Deterministic rule-based allocator implementing the same rules as the AI allocation prompt:
+    skill match first, then lowest current_workload_score, then most experience in the category,
+    with fair distribution falling out of the workload increasing as tasks are placed.
+
+    One min-heap per category holds (workload, -experience, developer index). Entries
+    go stale when a developer picks up work; stale entries are discarded lazily on pop.
+    The developer dicts passed in are never mutated. effort_scorer converts an effort string to
+    a numeric score (allocation.get_effort_score). category_index optionally maps categories to
+    developer positions in `developers` (e.g. DeveloperSnapshot.by_category) to skip the skill scan.
+    """
+
+    def __init__(self, developers, effort_scorer, category_index=None):
+        self.developers = list(developers or [])
+        self.effort_scorer = effort_scorer
+        self.category_index = category_index or {}
+        self.workloads = [dev.get('current_workload_score', 0) or 0 for dev in self.developers]
+        self._heaps = {}
+        self._dev_categories = [set() for _ in self.developers]
+
+    def _experience(self, dev_index, category):
+        experience = self.developers[dev_index].get('experience') or {}
+        return experience.get(category, 0) or 0
+
+    def _heap_for(self, category):
+        heap = self._heaps.get(category)
+        if heap is None:
+            members = self.category_index.get(category)
+            if members is None:
+                members = build_category_index(self.developers, [category])[category]
+            heap = [(self.workloads[i], -self._experience(i, category), i) for i in members]
+            heapq.heapify(heap)
+            self._heaps[category] = heap
+            for i in members:
+                self._dev_categories[i].add(category)
+        return heap
+
+    def can_place(self, task):
+        return bool(self._heap_for(task.get('category')))
+
+    def _record_workload(self, dev_index, new_workload):
+        self.workloads[dev_index] = new_workload
+        for category in self._dev_categories[dev_index]:
+            heapq.heappush(self._heaps[category], (new_workload, -self._experience(dev_index, category), dev_index))
+
+    def place(self, task):
+        """
+        Assigns a single task and returns a copy of it with 'assigned_to', 'ai_reasoning' and
+        'effort_score', or None if no developer has a matching skill.
+        """
+        category = task.get('category')
+        heap = self._heap_for(category)
+        while heap:
+            workload, neg_experience, dev_index = heap[0]
+            if workload != self.workloads[dev_index]:
+                heapq.heappop(heap)  # Stale entry; the developer's workload has changed since it was pushed.
+                continue
+            break
+        else:
+            return None
+
+        developer = self.developers[dev_index]
+        effort_score = self.effort_scorer(task.get('effort', "Medium"))
+        task_copy = task.copy()
+        task_copy['assigned_to'] = {"id": developer.get('id'), "name": developer.get('name')}
+        task_copy['ai_reasoning'] = (
+            f"{developer.get('name')} ({developer.get('id')}) has {category} skills "
+            f"({-neg_experience} years experience) and the lowest workload score ({workload}) "
+            f"among matching developers."
+        )
+        task_copy['effort_score'] = effort_score
+        self._record_workload(dev_index, workload + effort_score)
+        return task_copy
+
+    def record_assignment(self, developer_id, effort_score):
+        """Adds workload for a task placed by another allocator (e.g. the AI) so later placements see it."""
+        for dev_index, dev in enumerate(self.developers):
+            if dev.get('id') == developer_id:
+                self._record_workload(dev_index, self.workloads[dev_index] + effort_score)
+                return True
+        return False
+
+    def workload_preview(self):
+        """Returns shallow copies of the developers with their workloads after the placements so far."""
+        return [
+            {**dev, 'current_workload_score': workload}
+            for dev, workload in zip(self.developers, self.workloads)
+        ]
+
+    def unassigned(self, task, name="Unassigned (No matching skills)",
+                   reasoning="No developer has a skill matching this task's category."):
+        task_copy = task.copy()
+        task_copy['assigned_to'] = {"id": "unassigned", "name": name}
+        task_copy['ai_reasoning'] = reasoning
+        task_copy['effort_score'] = self.effort_scorer(task.get('effort', "Medium"))
+        return task_copy
+
+
+def assign_tasks_locally(tasks, developers, effort_scorer, category_index=None):
+    """
+    Allocates tasks with the rule-based engine.
+    Returns (assigned_tasks, unplaced_indexes): assigned_tasks has one entry per input task in the
+    same order, with tasks that could not be placed marked unassigned; unplaced_indexes lists
+    their positions so a caller can hand them to another allocator.
+    """
+    allocator = LocalAllocator(developers, effort_scorer=effort_scorer, category_index=category_index)
+    assigned_tasks = []
+    unplaced_indexes = []
+    for i, task in enumerate(tasks or []):
+        placed = allocator.place(task)
+        if placed is None:
+            unplaced_indexes.append(i)
+            placed = allocator.unassigned(task)
+        assigned_tasks.append(placed)
+    return assigned_tasks, unplaced_indexes
@@ -1,7 +1,11 @@
 # app/main.py
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context, url_for
+import functools
+import json
+import logging
 import os
 import sys # Import sys
+import time
 
 # ---- Add project root to sys.path if not already there ----
 # This helps when running app/main.py directly from the project root as CWD.
@@ -20,12 +24,84 @@ if project_root not in sys.path:
 # if VSCode runs main.py with a CWD *inside* the app directory.
 # Let's stick to the `from .module` style for consistency within the app package.
 
-from .agent import split_use_case_into_tasks
-from .allocation import assign_tasks_with_ai, get_effort_score
-from .data_manager import load_developers, save_developers
+from .batch import BATCH_CONCURRENCY, iter_batch_file, run_batch
+from .breakdown_cache import breakdown_cache
+from .http_responses import apply_etag, compress_response
+from .history import HISTORY_BUCKETS, HISTORY_GROUPS, history_store, parse_history_filters, parse_history_page
+from .idempotency import (
+    IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_KEY_MAX_LENGTH, IDEMPOTENCY_MISMATCH, IDEMPOTENCY_REPLAY, idempotency_store,
+    request_fingerprint
+)
+from .jobs import JOB_QUEUED, JOB_RUNNING, QueueFullError, job_manager
+from .metrics import HTTP_REQUEST_DURATION, registry
+from .plans import create_plan, parse_replan_request, plan_store, plan_view, replan
+from .pipeline import parse_pipeline_request, run_use_case_pipeline, stream_use_case_pipeline
+from .workload_ledger import WORKLOAD_LEDGER_ENABLED, parse_compact_request, workload_ledger
+
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__) # Flask will find templates/static relative to `app` directory if main.py is in `app`
 
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started_at = g.get('request_started_at')
+    if started_at is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started_at, endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.after_request
+def finalize_response(response):
+    # Registered after the timer, so Flask runs it first: the timer sees the final 304 or 200.
+    return compress_response(request, apply_etag(request, response))
+
+def _run_idempotent(data, run):
+    """
+    Runs run() -> (body, http_status) as a JSON response, honouring an Idempotency-Key header:
+    a retry of a completed request with the same key and body gets the stored response back.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        body, http_status = run()
+        return jsonify(body), http_status
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return jsonify({"error": f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters"}), 400
+
+    scope = request.path
+    outcome, stored = idempotency_store.begin(
+        scope, key, request_fingerprint(request.path, request.query_string.decode('utf-8', 'replace'), data)
+    )
+    if outcome == IDEMPOTENCY_REPLAY:
+        http_status, body = stored
+        response = jsonify(body)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response, http_status
+    if outcome == IDEMPOTENCY_MISMATCH:
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    if outcome == IDEMPOTENCY_IN_PROGRESS:
+        response = jsonify({"error": "A request with this Idempotency-Key is still being processed. Please retry later."})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+
+    try:
+        body, http_status = run()
+    except BaseException:
+        idempotency_store.release(scope, key)
+        raise
+    if 200 <= http_status < 300:
+        idempotency_store.complete(scope, key, http_status, body)
+    else:
+        idempotency_store.release(scope, key)
+    return jsonify(body), http_status
+
 # ... (rest of your Flask routes and logic from the previous version)
 # Make sure the @app.route('/') and @app.route('/process_use_case') are here.
 # For brevity, I'm not pasting them again. Assume they are unchanged.
@@ -36,81 +112,226 @@ def index():
 
 @app.route('/process_use_case', methods=['POST'])
 def process_use_case():
-    data = request.get_json()
-    use_case_description = data.get('use_case')
+    data = request.get_json(silent=True)
+    options, error_msg = parse_pipeline_request(data)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
 
-    if not use_case_description:
-        return jsonify({"error": "No use case description provided"}), 400
+    return _run_idempotent(data, lambda: run_use_case_pipeline(**options))
 
-    # --- Agent 1: Task Breakdown ---
-    print("Agent 1 (Breakdown): Processing use case...")
-    ai_tasks_breakdown = split_use_case_into_tasks(use_case_description)
-    
-    if ai_tasks_breakdown is None:
-        error_msg = "Agent 1 (Breakdown): Failed to process use case with AI. Check Gemini configuration or prompt."
-        print(error_msg)
-        return jsonify({"error": error_msg}), 500
-    
-    if not ai_tasks_breakdown:
-        print("Agent 1 (Breakdown): Gemini returned an empty list of tasks.")
-        devs_for_empty_tasks = load_developers()
-        if not devs_for_empty_tasks:
-             devs_for_empty_tasks = []
-
-        return jsonify({
-            "message": "AI (Breakdown) processed the use case but did not generate any specific sub-tasks.",
-            "original_tasks_from_ai": [],
-            "allocated_tasks": [],
-            "updated_developer_workloads_preview": devs_for_empty_tasks
-        }), 200
-
-    # --- Load Developer Data ---
-    developers_initial_state = load_developers()
-    if not developers_initial_state:
-        print("Error: Failed to load developer data. AI allocation will be impacted.")
-        developers_initial_state = [] 
-    
-    developers_for_this_run = [d.copy() for d in developers_initial_state]
-    for dev in developers_for_this_run:
-        dev['experience'] = dev.get('experience', {}).copy()
-        dev['current_workload_score'] = dev.get('current_workload_score', 0)
-        dev['skills'] = dev.get('skills', [])
-
-    # --- Agent 2: AI Task Allocation ---
-    print(f"Agent 2 (Allocation): Allocating {len(ai_tasks_breakdown)} tasks using AI...")
-    tasks_with_ai_assignment = assign_tasks_with_ai(ai_tasks_breakdown, developers_for_this_run)
-    
-    # --- Update Developer Workloads based on AI Assignment ---
-    if developers_for_this_run:
-        temp_dev_map_for_workload_update = {dev['id']: dev for dev in developers_for_this_run}
-        
-        for task in tasks_with_ai_assignment:
-            assigned_to_info = task.get('assigned_to')
-            if assigned_to_info:
-                assignee_id = assigned_to_info.get('id')
-                if assignee_id and assignee_id != "unassigned" and assignee_id in temp_dev_map_for_workload_update:
-                    task_effort_score = task.get('effort_score') 
-                    if task_effort_score is None:
-                        task_effort_score = get_effort_score(task.get('effort'))
-                        print(f"Warning: effort_score missing for task '{task.get('title')}', recalculating.")
-
-                    developer_to_update = temp_dev_map_for_workload_update[assignee_id]
-                    developer_to_update['current_workload_score'] = \
-                        developer_to_update.get('current_workload_score', 0) + task_effort_score
-                elif assignee_id and assignee_id != "unassigned":
-                    print(f"Workload Update SKIPPED: Assigned developer ID '{assignee_id}' for task '{task.get('title')}' not found.")
+@app.route('/process_use_case/stream', methods=['POST'])
+def process_use_case_stream():
+    """
+    Streams allocated tasks as they are generated. Responds with Server-Sent Events when the
+    client asks for text/event-stream (or ?format=sse) and with NDJSON otherwise.
+    """
+    options, error_msg = parse_pipeline_request(request.get_json(silent=True))
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+
+    stream_format = request.args.get('format')
+    if stream_format is None:
+        stream_format = 'sse' if 'text/event-stream' in request.headers.get('Accept', '') else 'ndjson'
+    if stream_format not in ('sse', 'ndjson'):
+        return jsonify({"error": f"Invalid format '{stream_format}'. Expected 'sse' or 'ndjson'."}), 400
+
+    def generate_events():
+        for event, payload in stream_use_case_pipeline(**options):
+            if stream_format == 'sse':
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
             else:
-                 print(f"Workload Update SKIPPED: Task '{task.get('title')}' has no 'assigned_to' info.")
+                yield json.dumps({"event": event, "data": payload}) + "\n"
+
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate_events()), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+    return response
+
+@app.route('/batch', methods=['POST'])
+def process_batch():
+    """
+    Processes a JSONL body (one use case per line, same format as `python -m app.batch`) and
+    streams one NDJSON result per record as it finishes. ?concurrency= (up to BATCH_CONCURRENCY),
+    ?allocation_mode=, ?pipeline_mode= and ?bypass_cache=1 apply to records that do not set them.
+    """
+    lines = request.get_data(as_text=True).splitlines()
+    concurrency = min(max(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), 1), BATCH_CONCURRENCY)
+    defaults = {"bypass_cache": request.args.get('bypass_cache') == '1'}
+    for key in ('allocation_mode', 'pipeline_mode'):
+        if request.args.get(key):
+            defaults[key] = request.args[key]
+
+    def generate_results():
+        for result in run_batch(iter_batch_file(lines, defaults), concurrency):
+            yield json.dumps(result) + "\n"
+
+    response = Response(stream_with_context(generate_results()), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    options, error_msg = parse_pipeline_request(request.get_json(silent=True))
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
 
-    # print("Persisting updated developer workloads...")
-    # save_developers(developers_for_this_run)
+    try:
+        job_id = job_manager.submit(options)
+    except QueueFullError as e:
+        response = jsonify({"error": "Job queue is full. Please retry later."})
+        response.headers['Retry-After'] = str(e.retry_after_seconds)
+        return response, 429
 
-    print("Processing complete. Returning results.")
     return jsonify({
-        "original_tasks_from_ai": ai_tasks_breakdown,
-        "allocated_tasks": tasks_with_ai_assignment,
-        "updated_developer_workloads_preview": developers_for_this_run
-    })
+        "job_id": job_id,
+        "status": JOB_QUEUED,
+        "status_url": url_for('get_job', job_id=job_id),
+        "result_url": url_for('get_job_result', job_id=job_id)
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    job.pop('result', None)
+    job.pop('worker_pid', None)
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    if job['status'] in (JOB_QUEUED, JOB_RUNNING):
+        return jsonify({"job_id": job_id, "status": job['status']}), 202
+    if job['result'] is None:
+        return jsonify({"error": job['error'] or "Job failed without a result"}), job['http_status'] or 500
+    return jsonify(job['result']), job['http_status']
+
+@app.route('/plans', methods=['POST'])
+def submit_plan():
+    """Runs the pipeline like /process_use_case and stores the allocation as a re-plannable plan."""
+    data = request.get_json(silent=True)
+    options, error_msg = parse_pipeline_request(data)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    return _run_idempotent(data, lambda: create_plan(options))
+
+@app.route('/plans/<plan_id>', methods=['GET'])
+def get_plan(plan_id):
+    plan = plan_store.get(plan_id)
+    if plan is None:
+        return jsonify({"error": f"Plan '{plan_id}' not found"}), 404
+    return jsonify(plan_view(plan))
+
+@app.route('/plans/<plan_id>', methods=['DELETE'])
+def delete_plan(plan_id):
+    if not plan_store.delete(plan_id):
+        return jsonify({"error": f"Plan '{plan_id}' not found"}), 404
+    return jsonify({"plan_id": plan_id, "status": "deleted"})
+
+@app.route('/plans/<plan_id>/replan', methods=['POST'])
+def replan_plan(plan_id):
+    """Applies a diff to a plan and returns only the rows whose assignment changed."""
+    diff, error_msg = parse_replan_request(request.get_json(silent=True))
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    body, http_status = replan(plan_id, diff)
+    return jsonify(body), http_status
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"breakdown_cache": breakdown_cache.stats()})
+
+def _requires_workload_ledger(view):
+    """Answers 404 instead of touching the ledger while WORKLOAD_LEDGER_ENABLED is off."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not WORKLOAD_LEDGER_ENABLED:
+            return jsonify({"error": "The workload ledger is disabled. Set WORKLOAD_LEDGER_ENABLED=1 to enable it."}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/workload', methods=['GET'])
+@_requires_workload_ledger
+def workload():
+    return jsonify({"totals": workload_ledger.totals(), "stats": workload_ledger.stats()})
+
+@app.route('/workload/assignments', methods=['GET'])
+@_requires_workload_ledger
+def workload_assignments():
+    developer_id = request.args.get('developer_id')
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"assignments": workload_ledger.open_assignments(developer_id, limit=limit)})
+
+@app.route('/workload/assignments/<int:assignment_id>/complete', methods=['POST'])
+@_requires_workload_ledger
+def complete_assignment(assignment_id):
+    if not workload_ledger.complete(assignment_id):
+        return jsonify({"error": f"Open assignment '{assignment_id}' not found"}), 404
+    return jsonify({"assignment_id": assignment_id, "status": "completed"})
+
+@app.route('/workload/compact', methods=['POST'])
+@_requires_workload_ledger
+def compact_workload():
+    options, error_msg = parse_compact_request(request.get_json(silent=True))
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    expired = 0
+    if options['expire_older_than_seconds']:
+        expired = workload_ledger.expire_older_than(options['expire_older_than_seconds'])
+    removed = workload_ledger.compact(options['older_than_seconds'])
+    return jsonify({"expired": expired, "removed_events": removed, "stats": workload_ledger.stats()})
+
+@app.route('/history/tasks', methods=['GET'])
+def history_tasks():
+    """
+    Recorded task assignments, newest first. Filters: developer_id, category, effort, model,
+    use_case_id, since and until (epoch seconds or ISO 8601). Paginate with ?limit= and ?cursor=.
+    """
+    filters, error_msg = parse_history_filters(request.args)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    page, error_msg = parse_history_page(request.args)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    items, next_cursor = history_store.tasks(filters, limit=page['limit'], cursor=page['cursor'])
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+@app.route('/history/use_cases/<history_id>', methods=['GET'])
+def history_use_case(history_id):
+    record = history_store.use_case(history_id)
+    if record is None:
+        return jsonify({"error": f"History record '{history_id}' not found"}), 404
+    return jsonify(record)
+
+@app.route('/history/workload', methods=['GET'])
+def history_workload():
+    """
+    Task counts and effort per developer or category (?group_by=), optionally per ?bucket=day,
+    week or month, with the same filters as /history/tasks.
+    """
+    group_by = request.args.get('group_by', 'developer')
+    bucket = request.args.get('bucket') or None
+    if group_by not in HISTORY_GROUPS:
+        return jsonify({"error": f"Invalid group_by '{group_by}'. Expected one of {list(HISTORY_GROUPS)}."}), 400
+    if bucket is not None and bucket not in HISTORY_BUCKETS:
+        return jsonify({"error": f"Invalid bucket '{bucket}'. Expected one of {list(HISTORY_BUCKETS)}."}), 400
+    filters, error_msg = parse_history_filters(request.args)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    page, error_msg = parse_history_page(request.args)
+    if error_msg:
+        return jsonify({"error": error_msg}), 400
+    rows = history_store.workload(group_by, bucket, filters, limit=page['limit'])
+    return jsonify({"group_by": group_by, "bucket": bucket, "rows": rows, "stats": history_store.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # This is the crucial part for direct execution
 if __name__ == '__main__':
     # When app/main.py is run directly, __name__ becomes "__main__".
@@ -118,8 +339,8 @@ if __name__ == '__main__':
     
     # You might need to adjust host and port if needed, or load from env vars.
     port = int(os.environ.get("PORT", 5001))
-    print(f"Starting Flask server on host 0.0.0.0, port {port}...")
-    print(f"Project root identified as: {project_root}")
-    print(f"Python sys.path includes: {sys.path[0]}, {sys.path[1]}...")
-    print(f"To access the app, open http://127.0.0.1:{port}/ in your browser.")
+    logger.info(f"Starting Flask server on host 0.0.0.0, port {port}...")
+    logger.info(f"Project root identified as: {project_root}")
+    logger.info(f"Python sys.path includes: {sys.path[0]}, {sys.path[1]}...")
+    logger.info(f"To access the app, open http://127.0.0.1:{port}/ in your browser.")
     app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
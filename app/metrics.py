@@ -0,0 +1,206 @@
+# app/metrics.py
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds; LLM calls take seconds, local stages take microseconds to milliseconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """Counter or gauge whose labelled values are read from a callback when metrics are scraped."""
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback  # Returns {label values tuple: value}
+
+    def render(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.warning("Metrics: callback for %s failed: %s", self.name, e)
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, kind))
+
+    def render(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_DURATION = registry.histogram(
+    "taskmgr_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+HTTP_REQUEST_DURATION = registry.histogram(
+    "taskmgr_http_request_duration_seconds", "HTTP request latency by endpoint and status.", ("endpoint", "status"))
+LLM_REQUESTS = registry.counter(
+    "taskmgr_llm_requests_total", "LLM calls by purpose and outcome.", ("purpose", "outcome"))
+LLM_COALESCED = registry.counter(
+    "taskmgr_llm_coalesced_total",
+    "LLM calls saved by sharing the result of an identical in-flight call, by purpose and scope (thread/process).",
+    ("purpose", "scope"))
+LLM_PROMPT_BYTES = registry.histogram(
+    "taskmgr_llm_prompt_bytes", "Size of prompts sent to the LLM.", ("purpose",), SIZE_BUCKETS)
+LLM_RESPONSE_BYTES = registry.histogram(
+    "taskmgr_llm_response_bytes", "Size of LLM responses.", ("purpose",), SIZE_BUCKETS)
+LLM_TOKENS = registry.counter(
+    "taskmgr_llm_tokens_total", "Tokens reported by the LLM usage metadata.", ("purpose", "kind"))
+ALLOCATION_PROMPT_DEVELOPERS = registry.histogram(
+    "taskmgr_allocation_prompt_developers", "Developers included in each allocation prompt.", (), COUNT_BUCKETS)
+ALLOCATION_ROSTER_TOKENS = registry.histogram(
+    "taskmgr_allocation_roster_tokens", "Estimated tokens of the developer roster in each allocation prompt, by format.",
+    ("format",), SIZE_BUCKETS)
+PIPELINE_EVENTS = registry.counter(
+    "taskmgr_pipeline_events_total",
+    "Errors and fallbacks in the pipeline (JSON decode failures, hallucinated developer IDs, missing tasks, ...).",
+    ("event",))
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Times a block, records it in the stage histogram and logs a structured line at DEBUG level.
+    The yielded dict can be filled with extra fields (sizes, counts) to include in the log line.
+    """
+    details = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield details
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        if logger.isEnabledFor(logging.DEBUG):
+            extra = " ".join(f"{key}={value}" for key, value in details.items())
+            logger.debug("span stage=%s duration_ms=%.2f %s", stage, elapsed * 1000, extra)
+
+
+def record_event(event, amount=1):
+    """Counts a pipeline error or fallback event."""
+    PIPELINE_EVENTS.inc(amount, event=event)
+
+
+def record_llm_call(purpose, prompt, response_text=None, usage_metadata=None, outcome="ok"):
+    LLM_REQUESTS.inc(purpose=purpose, outcome=outcome)
+    LLM_PROMPT_BYTES.observe(len(prompt.encode("utf-8")), purpose=purpose)
+    if response_text is not None:
+        LLM_RESPONSE_BYTES.observe(len(response_text.encode("utf-8")), purpose=purpose)
+    if usage_metadata is not None:
+        prompt_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+        completion_tokens = getattr(usage_metadata, 'candidates_token_count', 0) or 0
+        LLM_TOKENS.inc(prompt_tokens, purpose=purpose, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, purpose=purpose, kind="completion")
@@ -0,0 +1,311 @@
+# app/pipeline.py
+import logging
+import os
+import time
+
+from .agent import split_use_case_into_tasks, stream_use_case_tasks
+from .allocation import (
+    ALLOCATION_MODES, assign_tasks, assign_tasks_with_ai, get_effort_score, resolve_allocation_mode
+)
+from .data_manager import get_developer_snapshot
+from .fused import fused_breakdown_and_allocation
+from .hierarchical import hierarchical_breakdown
+from .history import HISTORY_ENABLED, history_store
+from .llm import get_backend
+from .local_allocation import LocalAllocator
+from .metrics import STAGE_DURATION, record_event, span
+from .workload_ledger import WORKLOAD_LEDGER_ENABLED, workload_ledger
+
+logger = logging.getLogger(__name__)
+
+# "two_stage": breakdown call, then allocation call. "fused": one call that does both.
+# "hierarchical": two_stage with long use cases broken down section by section in parallel.
+PIPELINE_MODES = ("two_stage", "fused", "hierarchical")
+DEFAULT_PIPELINE_MODE = os.getenv("PIPELINE_MODE", "two_stage")
+# "full": the workload preview lists the whole team. "touched": only developers who received tasks.
+WORKLOAD_PREVIEW_MODES = ("full", "touched")
+DEFAULT_WORKLOAD_PREVIEW = os.getenv("WORKLOAD_PREVIEW", "full")
+
+
+def create_workload_overlay(developer_snapshot):
+    """Overlay seeded with the outstanding assignments from the workload ledger (if enabled)."""
+    if not WORKLOAD_LEDGER_ENABLED:
+        return developer_snapshot.overlay()
+    try:
+        return developer_snapshot.overlay(workload_ledger.effective_workloads(developer_snapshot))
+    except Exception as e:
+        logger.error(f"Could not read the workload ledger, using stored workloads only: {e}")
+        return developer_snapshot.overlay()
+
+
+def _record_assignments(allocated_tasks):
+    """Persists assigned tasks to the workload ledger (if enabled) and tags them with their assignment id."""
+    if not WORKLOAD_LEDGER_ENABLED:
+        return
+    assigned = [
+        task for task in allocated_tasks
+        if task.get('assigned_to', {}).get('id') not in (None, "unassigned")
+    ]
+    try:
+        assignment_ids = workload_ledger.record_assignments([
+            (task['assigned_to']['id'], task.get('title'),
+             task.get('effort_score', get_effort_score(task.get('effort'))))
+            for task in assigned
+        ])
+    except Exception as e:
+        logger.error(f"Could not record assignments in the workload ledger: {e}")
+        record_event("workload_ledger_error")
+        return
+    for task, assignment_id in zip(assigned, assignment_ids):
+        task['workload_assignment_id'] = assignment_id
+
+
+def _assignee_ids(allocated_tasks):
+    return sorted({task.get('assigned_to', {}).get('id') for task in allocated_tasks} - {None, "unassigned"})
+
+
+def _record_history(use_case_description, allocated_tasks, pipeline_mode, allocation_mode, started_at):
+    """Queues a result for the history store (if enabled). Returns its history id, or None."""
+    if not HISTORY_ENABLED:
+        return None
+    try:
+        backend = get_backend()
+        return history_store.record(
+            use_case_description, allocated_tasks, pipeline_mode=pipeline_mode, allocation_mode=allocation_mode,
+            model=f"{backend.name}/{backend.model_name}",
+            duration_ms=round((time.perf_counter() - started_at) * 1000, 1)
+        )
+    except Exception as e:
+        logger.error(f"Could not record the result in the history store: {e}")
+        return None
+
+
+def parse_pipeline_request(data):
+    """
+    Validates a /process_use_case style JSON payload.
+    Returns (options, None) where options are keyword arguments for run_use_case_pipeline,
+    or (None, error_message) if the payload is invalid.
+    """
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+    use_case_description = data.get('use_case')
+    allocation_mode = data.get('allocation_mode')
+    pipeline_mode = data.get('pipeline_mode')
+    workload_preview = data.get('workload_preview')
+
+    if not use_case_description:
+        return None, "No use case description provided"
+    if allocation_mode is not None and allocation_mode not in ALLOCATION_MODES:
+        return None, f"Invalid allocation_mode '{allocation_mode}'. Expected one of {list(ALLOCATION_MODES)}."
+    if pipeline_mode is not None and pipeline_mode not in PIPELINE_MODES:
+        return None, f"Invalid pipeline_mode '{pipeline_mode}'. Expected one of {list(PIPELINE_MODES)}."
+    if workload_preview is not None and workload_preview not in WORKLOAD_PREVIEW_MODES:
+        return None, f"Invalid workload_preview '{workload_preview}'. Expected one of {list(WORKLOAD_PREVIEW_MODES)}."
+    if pipeline_mode == "fused" and allocation_mode not in (None, "ai"):
+        return None, "pipeline_mode 'fused' allocates with the AI; allocation_mode must be omitted or 'ai'."
+
+    return {
+        "use_case_description": use_case_description,
+        "allocation_mode": allocation_mode,
+        "use_cache": not data.get('bypass_cache', False),
+        "pipeline_mode": pipeline_mode,
+        "workload_preview": workload_preview,
+    }, None
+
+
+def run_use_case_pipeline(use_case_description, allocation_mode=None, use_cache=True, workload_overlay=None,
+                          pipeline_mode=None, workload_preview=None):
+    """
+    Runs breakdown -> allocation -> workload update for one use case.
+    Returns (response_body, http_status) so both the synchronous route and background jobs can use it.
+    workload_overlay lets several runs (e.g. the items of a batch) share and accumulate workload;
+    by default each run starts from a fresh overlay over the current developer snapshot.
+    pipeline_mode "fused" breaks down and allocates with a single LLM call, falling back to the
+    two-stage path if that call fails or its answer does not validate. pipeline_mode
+    "hierarchical" splits long use cases into sections and breaks them down concurrently.
+    workload_preview "touched" limits updated_developer_workloads_preview to the developers who
+    received tasks instead of the whole team.
+    """
+    pipeline_mode = pipeline_mode or DEFAULT_PIPELINE_MODE
+    touched_only = (workload_preview or DEFAULT_WORKLOAD_PREVIEW) == "touched"
+    started_at = time.perf_counter()
+
+    # --- Load Developer Data ---
+    with span("load_developers") as details:
+        developer_snapshot = workload_overlay.snapshot if workload_overlay else get_developer_snapshot()
+        if not developer_snapshot.developers:
+            logger.error("Failed to load developer data. AI allocation will be impacted.")
+        # Copy-on-write: only developers who receive tasks are copied when workloads are updated.
+        if workload_overlay is None:
+            workload_overlay = create_workload_overlay(developer_snapshot)
+        developers_for_this_run = workload_overlay.developers()
+        details["developer_count"] = len(developers_for_this_run)
+
+    tasks_with_ai_assignment = None
+    fallback_reason = None
+    similar_match = {}
+    sections = None
+    if pipeline_mode == "fused":
+        logger.info("Fused agent: Breaking down and allocating the use case in one call...")
+        with span("fused"):
+            ai_tasks_breakdown, tasks_with_ai_assignment, fallback_reason = fused_breakdown_and_allocation(
+                use_case_description, developers_for_this_run, category_index=developer_snapshot.by_category
+            )
+        if fallback_reason:
+            record_event("fused_fallback_two_stage")
+            logger.warning(f"Fused agent: falling back to the two-stage pipeline ({fallback_reason}).")
+
+    if tasks_with_ai_assignment is None:
+        # --- Agent 1: Task Breakdown ---
+        logger.info("Agent 1 (Breakdown): Processing use case...")
+        with span("breakdown"):
+            if pipeline_mode == "hierarchical":
+                ai_tasks_breakdown, sections = hierarchical_breakdown(use_case_description, use_cache=use_cache)
+            else:
+                ai_tasks_breakdown = split_use_case_into_tasks(
+                    use_case_description, use_cache=use_cache, similar_match=similar_match
+                )
+
+        if ai_tasks_breakdown is None:
+            error_msg = "Agent 1 (Breakdown): Failed to process use case with AI. Check Gemini configuration or prompt."
+            logger.error(error_msg)
+            record_event("breakdown_failed")
+            return {"error": error_msg}, 500
+
+        if not ai_tasks_breakdown:
+            logger.info("Agent 1 (Breakdown): Gemini returned an empty list of tasks.")
+
+            return {
+                "message": "AI (Breakdown) processed the use case but did not generate any specific sub-tasks.",
+                "original_tasks_from_ai": [],
+                "allocated_tasks": [],
+                "updated_developer_workloads_preview": [] if touched_only else developers_for_this_run
+            }, 200
+
+        # --- Agent 2: Task Allocation (AI, local engine or hybrid) ---
+        logger.info(f"Agent 2 (Allocation): Allocating {len(ai_tasks_breakdown)} tasks (mode: {allocation_mode or 'default'})...")
+        with span("allocation", task_count=len(ai_tasks_breakdown), mode=allocation_mode or "default"):
+            tasks_with_ai_assignment = assign_tasks(
+                ai_tasks_breakdown, developers_for_this_run, mode=allocation_mode,
+                category_index=developer_snapshot.by_category
+            )
+    
+    # --- Update Developer Workloads based on AI Assignment ---
+    with span("workload_update"):
+        for task in tasks_with_ai_assignment:
+            assigned_to_info = task.get('assigned_to')
+            if assigned_to_info:
+                assignee_id = assigned_to_info.get('id')
+                if assignee_id and assignee_id != "unassigned":
+                    task_effort_score = task.get('effort_score')
+                    if task_effort_score is None:
+                        task_effort_score = get_effort_score(task.get('effort'))
+                        logger.warning(f"effort_score missing for task '{task.get('title')}', recalculating.")
+
+                    if not workload_overlay.add_workload(assignee_id, task_effort_score):
+                        logger.warning(f"Workload Update SKIPPED: Assigned developer ID '{assignee_id}' for task '{task.get('title')}' not found.")
+            else:
+                 logger.warning(f"Workload Update SKIPPED: Task '{task.get('title')}' has no 'assigned_to' info.")
+
+        _record_assignments(tasks_with_ai_assignment)
+
+    logger.info("Processing complete. Returning results.")
+    effective_pipeline_mode = "two_stage" if fallback_reason else pipeline_mode
+    # The fused call allocates with the AI itself; every other path ran assign_tasks.
+    effective_allocation_mode = "ai" if effective_pipeline_mode == "fused" else resolve_allocation_mode(allocation_mode)
+    history_id = _record_history(
+        use_case_description, tasks_with_ai_assignment, effective_pipeline_mode, effective_allocation_mode, started_at
+    )
+    response_body = {
+        "original_tasks_from_ai": ai_tasks_breakdown,
+        "allocated_tasks": tasks_with_ai_assignment,
+        "updated_developer_workloads_preview": workload_overlay.developers(
+            _assignee_ids(tasks_with_ai_assignment) if touched_only else None
+        ),
+        "pipeline_mode": effective_pipeline_mode,
+    }
+    if history_id:
+        response_body["history_id"] = history_id
+    if fallback_reason:
+        response_body["fused_fallback_reason"] = fallback_reason
+    if similar_match:
+        response_body["similar_use_case_match"] = similar_match
+    if sections is not None:
+        response_body["sections"] = sections
+    return response_body, 200
+
+
+def stream_use_case_pipeline(use_case_description, allocation_mode=None, use_cache=True, pipeline_mode=None,
+                             workload_preview=None):
+    """
+    Streaming variant of run_use_case_pipeline. Yields (event, data) pairs:
+    - ("task", allocated_task) for each task, as soon as it has been generated, validated and placed;
+    - ("done", summary) at the end, with the workload preview, rejected tasks and timings;
+    - ("error", {"error": message}) if the breakdown fails.
+    Tasks are placed by the local allocation engine as they arrive, since one Gemini call per task
+    (or a global solve) would defeat the purpose. Unless allocation_mode is "local" or "optimal",
+    tasks the engine cannot place are sent to the AI allocator in a single call once the breakdown
+    is complete. pipeline_mode is accepted for symmetry with run_use_case_pipeline; streaming
+    always uses the two-stage path. workload_preview works as in run_use_case_pipeline.
+    """
+    started_at = time.perf_counter()
+    first_task_at = None
+    developer_snapshot = get_developer_snapshot()
+    developers = create_workload_overlay(developer_snapshot).developers()
+    allocator = LocalAllocator(developers, get_effort_score, category_index=developer_snapshot.by_category)
+    rejected = []
+    unplaced = []
+    allocated_tasks = []
+
+    logger.info("Agent 1 (Breakdown): Streaming use case breakdown...")
+    try:
+        for task in stream_use_case_tasks(use_case_description, use_cache=use_cache, rejected=rejected):
+            placed = allocator.place(task)
+            if placed is None:
+                unplaced.append(task)
+                continue
+            if first_task_at is None:
+                first_task_at = time.perf_counter()
+                STAGE_DURATION.observe(first_task_at - started_at, stage="stream_first_task")
+            allocated_tasks.append(placed)
+            yield "task", placed
+    except Exception as e:
+        error_msg = f"Agent 1 (Breakdown): Streaming failed: {e}"
+        logger.error(error_msg)
+        yield "error", {"error": error_msg}
+        return
+
+    # Streaming places tasks with the local engine and, unless told not to, asks the AI about the rest.
+    effective_allocation_mode = "local" if allocation_mode in ("local", "optimal") or not developers else "hybrid"
+    if unplaced:
+        if effective_allocation_mode == "local":
+            late_results = [allocator.unassigned(task) for task in unplaced]
+        else:
+            logger.info(f"Agent 2 (Allocation): {len(unplaced)} streamed task(s) could not be placed locally, asking AI.")
+            late_results = assign_tasks_with_ai(
+                unplaced, allocator.workload_preview(), category_index=developer_snapshot.by_category
+            )
+        for result in late_results:
+            assignee_id = result.get('assigned_to', {}).get('id')
+            if assignee_id and assignee_id != "unassigned":
+                allocator.record_assignment(assignee_id, result.get('effort_score', get_effort_score(result.get('effort'))))
+            if first_task_at is None:
+                first_task_at = time.perf_counter()
+            allocated_tasks.append(result)
+            yield "task", result
+
+    _record_assignments(allocated_tasks)
+    history_id = _record_history(use_case_description, allocated_tasks, "stream", effective_allocation_mode, started_at)
+    workload_preview_list = allocator.workload_preview()
+    if (workload_preview or DEFAULT_WORKLOAD_PREVIEW) == "touched":
+        touched = set(_assignee_ids(allocated_tasks))
+        workload_preview_list = [dev for dev in workload_preview_list if dev.get('id') in touched]
+    finished_at = time.perf_counter()
+    yield "done", {
+        "history_id": history_id,
+        "task_count": len(allocated_tasks),
+        "rejected_tasks": [{"task": task, "reason": reason} for task, reason in rejected],
+        "updated_developer_workloads_preview": workload_preview_list,
+        "time_to_first_task_ms": round((first_task_at - started_at) * 1000, 1) if first_task_at else None,
+        "total_time_ms": round((finished_at - started_at) * 1000, 1),
+    }
@@ -0,0 +1,324 @@
+# app/plans.py
+"""
+Persisted allocation plans and incremental re-planning.
+
+A plan is the allocation produced for one use case, stored with a stable `task_id` per task.
+A re-plan applies a diff (tasks added or removed, developers becoming unavailable or available
+again, workload changes) and re-allocates only the affected tasks: new tasks, tasks held by
+developers who are no longer available or whose workload went up, and (when developers become
+available) tasks that were left unassigned. Every other assignment is kept as is, and only the
+rows that changed are returned.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .agent import normalize_task, task_validation_error
+from .allocation import assign_tasks, get_effort_score
+from .data_manager import get_developer_snapshot
+from .metrics import record_event, span
+from .pipeline import _record_assignments, _record_history, create_workload_overlay, run_use_case_pipeline
+from .workload_ledger import WORKLOAD_LEDGER_ENABLED, workload_ledger
+
+logger = logging.getLogger(__name__)
+
+PLANS_DB_PATH = os.getenv(
+    "PLANS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'plans.sqlite3')
+)
+
+CHANGE_ADDED = "added"
+CHANGE_REMOVED = "removed"
+CHANGE_REASSIGNED = "reassigned"
+
+
+class PlanConflictError(Exception):
+    """Raised when a plan was changed by someone else since it was read."""
+
+    def __init__(self, plan_id, current_version):
+        super().__init__(f"Plan '{plan_id}' was modified concurrently (now at version {current_version})")
+        self.current_version = current_version
+
+
+class PlanStore:
+    """SQLite-backed allocation plans. Updates are optimistic: they only apply to the version that was read."""
+
+    def __init__(self, db_path=PLANS_DB_PATH):
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                "id TEXT PRIMARY KEY, use_case TEXT NOT NULL, allocation_mode TEXT, version INTEGER NOT NULL, "
+                "state TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def create(self, use_case_description, allocation_mode, allocated_tasks):
+        """Stores a new plan, numbering its tasks. Returns the plan."""
+        tasks = [{**task, "task_id": f"t{number}"} for number, task in enumerate(allocated_tasks, start=1)]
+        plan = {
+            "id": uuid.uuid4().hex,
+            "use_case": use_case_description,
+            "allocation_mode": allocation_mode,
+            "version": 1,
+            "tasks": tasks,
+            "next_task_number": len(tasks) + 1,
+            "unavailable_developer_ids": [],
+            "workload_overrides": {},
+        }
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO plans (id, use_case, allocation_mode, version, state, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (plan["id"], use_case_description, allocation_mode, 1, json.dumps(self._state(plan)), now, now)
+        )
+        conn.commit()
+        plan["created_at"] = plan["updated_at"] = now
+        return plan
+
+    @staticmethod
+    def _state(plan):
+        return {key: plan[key] for key in ("tasks", "next_task_number", "unavailable_developer_ids", "workload_overrides")}
+
+    def get(self, plan_id):
+        row = self._connection().execute("SELECT * FROM plans WHERE id = ?", (plan_id,)).fetchone()
+        if row is None:
+            return None
+        plan = {key: row[key] for key in ("id", "use_case", "allocation_mode", "version", "created_at", "updated_at")}
+        plan.update(json.loads(row["state"]))
+        return plan
+
+    def update(self, plan, expected_version):
+        """Writes the plan as version expected_version + 1. Raises PlanConflictError if it moved on."""
+        conn = self._connection()
+        cursor = conn.execute(
+            "UPDATE plans SET version = ?, state = ?, updated_at = ? WHERE id = ? AND version = ?",
+            (expected_version + 1, json.dumps(self._state(plan)), time.time(), plan["id"], expected_version)
+        )
+        conn.commit()
+        if cursor.rowcount != 1:
+            current = self.get(plan["id"])
+            raise PlanConflictError(plan["id"], current["version"] if current else None)
+        plan["version"] = expected_version + 1
+        return plan
+
+    def amend(self, plan):
+        """Rewrites the current version's state in place (for bookkeeping that follows an update)."""
+        conn = self._connection()
+        cursor = conn.execute(
+            "UPDATE plans SET state = ? WHERE id = ? AND version = ?",
+            (json.dumps(self._state(plan)), plan["id"], plan["version"])
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, plan_id):
+        conn = self._connection()
+        deleted = conn.execute("DELETE FROM plans WHERE id = ?", (plan_id,)).rowcount
+        conn.commit()
+        return deleted == 1
+
+
+plan_store = PlanStore()
+
+
+def create_plan(options):
+    """
+    Runs the pipeline for a /process_use_case style request and stores the result as a plan.
+    Returns (response_body, http_status); on success the body is the pipeline's, with plan_id,
+    version and a task_id on every allocated task.
+    """
+    body, http_status = run_use_case_pipeline(**options)
+    if http_status >= 400:
+        return body, http_status
+    plan = plan_store.create(options["use_case_description"], options.get("allocation_mode"), body["allocated_tasks"])
+    body["allocated_tasks"] = plan["tasks"]
+    return {"plan_id": plan["id"], "version": plan["version"], **body}, 201
+
+
+def plan_view(plan):
+    """Public representation of a stored plan."""
+    return {
+        "plan_id": plan["id"],
+        "version": plan["version"],
+        "use_case": plan["use_case"],
+        "allocation_mode": plan["allocation_mode"],
+        "tasks": plan["tasks"],
+        "unavailable_developer_ids": plan["unavailable_developer_ids"],
+        "workload_overrides": plan["workload_overrides"],
+        "created_at": plan["created_at"],
+        "updated_at": plan["updated_at"],
+    }
+
+
+def parse_replan_request(data):
+    """
+    Validates a re-plan diff. Returns (diff, None) or (None, error_message). Accepted keys:
+    add_tasks, remove_task_ids, unavailable_developer_ids, available_developer_ids,
+    developer_workloads ({developer_id: new score}) and expected_version.
+    """
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+    diff = {
+        "add_tasks": data.get("add_tasks") or [],
+        "remove_task_ids": data.get("remove_task_ids") or [],
+        "unavailable_developer_ids": data.get("unavailable_developer_ids") or [],
+        "available_developer_ids": data.get("available_developer_ids") or [],
+        "developer_workloads": data.get("developer_workloads") or {},
+        "expected_version": data.get("expected_version"),
+    }
+    for key in ("add_tasks", "remove_task_ids", "unavailable_developer_ids", "available_developer_ids"):
+        if not isinstance(diff[key], list):
+            return None, f"'{key}' must be a list"
+    if not isinstance(diff["developer_workloads"], dict) or not all(
+            isinstance(score, (int, float)) and not isinstance(score, bool) for score in diff["developer_workloads"].values()):
+        return None, "'developer_workloads' must map developer ids to numbers"
+    if diff["expected_version"] is not None and not isinstance(diff["expected_version"], int):
+        return None, "'expected_version' must be an integer"
+    diff["add_tasks"] = [normalize_task(task) for task in diff["add_tasks"]]
+    for i, task in enumerate(diff["add_tasks"]):
+        error = task_validation_error(task, check_category=True)
+        if error:
+            return None, f"add_tasks[{i}]: {error}"
+    if not any(diff[key] for key in diff if key != "expected_version"):
+        return None, "The diff is empty"
+    return diff, None
+
+
+def _assignee_id(task):
+    return task.get('assigned_to', {}).get('id')
+
+
+def replan(plan_id, diff):
+    """
+    Applies a diff to a stored plan, re-allocating only the affected tasks.
+    Returns (response_body, http_status); the body lists only the changed rows.
+    """
+    started_at = time.perf_counter()
+    plan = plan_store.get(plan_id)
+    if plan is None:
+        return {"error": f"Plan '{plan_id}' not found"}, 404
+    version = plan["version"]
+    if diff["expected_version"] is not None and diff["expected_version"] != version:
+        return {"error": f"Plan '{plan_id}' is at version {version}, not {diff['expected_version']}",
+                "version": version}, 409
+
+    tasks_by_id = {task["task_id"]: task for task in plan["tasks"]}
+    unknown_ids = [task_id for task_id in diff["remove_task_ids"] if task_id not in tasks_by_id]
+    if unknown_ids:
+        return {"error": f"Unknown task id(s): {', '.join(map(str, unknown_ids))}"}, 400
+
+    developer_snapshot = get_developer_snapshot()
+    unavailable = (set(plan["unavailable_developer_ids"]) | set(diff["unavailable_developer_ids"])) \
+        - set(diff["available_developer_ids"])
+    overlay = create_workload_overlay(developer_snapshot)
+    previous_workloads = {developer_id: overlay.workload(developer_id) for developer_id in developer_snapshot.by_id}
+    previous_workloads.update(plan["workload_overrides"])
+    workload_overrides = {**plan["workload_overrides"], **diff["developer_workloads"]}
+    for developer_id, score in workload_overrides.items():
+        overlay.add_workload(developer_id, score - overlay.workload(developer_id))
+    busier = {
+        developer_id for developer_id, score in diff["developer_workloads"].items()
+        if score > previous_workloads.get(developer_id, 0)
+    }
+    availability_grew = bool(set(plan["unavailable_developer_ids"]) - unavailable)
+
+    removed_ids = set(diff["remove_task_ids"])
+    kept, affected = [], []
+    for task in plan["tasks"]:
+        if task["task_id"] in removed_ids:
+            continue
+        assignee_id = _assignee_id(task)
+        if assignee_id in unavailable or assignee_id in busier or (assignee_id == "unassigned" and availability_grew):
+            affected.append(task)
+        else:
+            kept.append(task)
+
+    # Kept tasks count towards their assignee's workload, unless the ledger already holds them.
+    for task in kept:
+        if _assignee_id(task) != "unassigned" and not (WORKLOAD_LEDGER_ENABLED and task.get('workload_assignment_id')):
+            overlay.add_workload(_assignee_id(task), task.get('effort_score', get_effort_score(task.get('effort'))))
+    available_developers = [dev for dev in overlay.developers() if dev.get('id') not in unavailable]
+
+    to_allocate = [
+        {key: task[key] for key in ("title", "description", "category", "effort") if key in task}
+        for task in affected + diff["add_tasks"]
+    ]
+    logger.info(f"Re-plan {plan_id}: re-allocating {len(affected)} affected and {len(diff['add_tasks'])} new "
+                f"task(s), keeping {len(kept)}.")
+    with span("replan", task_count=len(to_allocate), kept=len(kept)):
+        allocated = assign_tasks(to_allocate, available_developers, mode=plan["allocation_mode"]) if to_allocate else []
+
+    changes = []
+    new_tasks = list(kept)
+    newly_assigned = []
+    closed_assignment_ids = []
+    for old_task, result in zip(affected, allocated):
+        result["task_id"] = old_task["task_id"]
+        if _assignee_id(result) == _assignee_id(old_task):
+            new_tasks.append(old_task)
+            continue
+        if old_task.get('workload_assignment_id'):
+            closed_assignment_ids.append(old_task['workload_assignment_id'])
+        newly_assigned.append(result)
+        new_tasks.append(result)
+        changes.append({"change": CHANGE_REASSIGNED, "task_id": result["task_id"],
+                        "previous_assigned_to": old_task.get('assigned_to'), "task": result})
+    for result in allocated[len(affected):]:
+        result["task_id"] = f"t{plan['next_task_number']}"
+        plan["next_task_number"] += 1
+        newly_assigned.append(result)
+        new_tasks.append(result)
+        changes.append({"change": CHANGE_ADDED, "task_id": result["task_id"], "task": result})
+    for task_id in diff["remove_task_ids"]:
+        old_task = tasks_by_id[task_id]
+        if old_task.get('workload_assignment_id'):
+            closed_assignment_ids.append(old_task['workload_assignment_id'])
+        changes.append({"change": CHANGE_REMOVED, "task_id": task_id, "previous_assigned_to": old_task.get('assigned_to')})
+
+    order = {task["task_id"]: position for position, task in enumerate(plan["tasks"])}
+    plan["tasks"] = sorted(new_tasks, key=lambda task: order.get(task["task_id"], len(order)))
+    plan["unavailable_developer_ids"] = sorted(unavailable)
+    plan["workload_overrides"] = workload_overrides
+    try:
+        plan_store.update(plan, version)
+    except PlanConflictError as e:
+        record_event("replan_conflict")
+        return {"error": str(e), "version": e.current_version}, 409
+
+    # The plan is committed; move the workload ledger along with it.
+    if WORKLOAD_LEDGER_ENABLED and (newly_assigned or closed_assignment_ids):
+        for assignment_id in closed_assignment_ids:
+            try:
+                workload_ledger.complete(assignment_id)
+            except Exception as e:
+                logger.error(f"Re-plan {plan_id}: could not close ledger assignment {assignment_id}: {e}")
+        _record_assignments(newly_assigned)
+        if not plan_store.amend(plan):
+            logger.warning(f"Re-plan {plan_id}: plan changed before its ledger assignment ids were stored.")
+
+    if newly_assigned:
+        _record_history(plan["use_case"], newly_assigned, "replan", plan["allocation_mode"], started_at)
+    record_event("replan")
+    return {
+        "plan_id": plan_id,
+        "version": plan["version"],
+        "reallocated_task_count": len(to_allocate),
+        "unchanged_task_count": len(plan["tasks"]) - sum(1 for c in changes if c["change"] != CHANGE_REMOVED),
+        "changes": changes,
+    }, 200
@@ -0,0 +1,211 @@
+# app/roster.py
+"""
+Compact developer rosters for allocation prompts.
+
+Instead of a JSON list with verbose keys and repeated skill strings, the roster is a table with
+one line per developer under short aliases (d1, d2, ...), and every skill or experience category
+is written once in a vocabulary line and referred to by code (s1, s2, ...):
+
+    VOCABULARY: s1=Frontend s2=React s3=Backend
+    d1|Alice|s1,s2|s1:5,s3:2|3
+
+Everything but the workload column only changes when the team changes, so the encoded rows of
+the whole team are built once per roster version (the developer snapshot version) and cached;
+a prompt only picks its developers' rows and appends their current workload. Aliases are mapped
+back to real developer ids when the answer is parsed.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .data_manager import get_developer_snapshot
+
+logger = logging.getLogger(__name__)
+
+# "0" sends the roster as the original JSON list.
+ALLOCATION_COMPACT_ROSTER = os.getenv("ALLOCATION_COMPACT_ROSTER", "1") != "0"
+ROSTER_CACHE_SIZE = 4  # Roster versions kept encoded (a batch may straddle a developers.json change)
+
+ROSTER_VOCABULARY_MARKER = "VOCABULARY:"
+_ALIAS_PATTERN = re.compile(r"\bd\d+\b")
+COMPACT_ROSTER_DESCRIPTION = (
+    "A table of available developers. Skills and experience categories are written as codes defined "
+    f'on the "{ROSTER_VOCABULARY_MARKER}" line (e.g. s1=Frontend). Each following line is one developer: '
+    '"id|name|skills|experience|current_workload_score", where skills is a comma-separated list of codes '
+    'and experience lists code:years pairs. Use the developer\'s id (e.g. "d1") as "assigned_developer_id".'
+)
+JSON_ROSTER_DESCRIPTION = (
+    'A JSON list of available developers. Each developer has an "id", "name", "skills" (list of strings), '
+    '"experience" (an object mapping skill category to years of experience, e.g., {"Frontend": 5, "Backend": 2}), '
+    'and "current_workload_score".'
+)
+
+
+def _clean(value):
+    return " ".join(str(value if value is not None else "").replace("|", "/").split())
+
+
+def _format_number(value):
+    value = value or 0
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+class CompactRoster:
+    """The encoded static columns (alias, name, skills, experience) of a team, at one version."""
+
+    def __init__(self, developers, version=None):
+        self.version = version
+        self.developers = list(developers)
+        self.index_by_id = {}
+        self._term_codes = {}
+        self._term_definitions = []
+        self._rows = []
+        self._row_terms = []
+        for i, dev in enumerate(self.developers):
+            self.index_by_id.setdefault(dev.get('id'), i)
+            skills = [self._term(skill) for skill in dev.get('skills') or []]
+            experience = [(self._term(category), years) for category, years in (dev.get('experience') or {}).items()]
+            self._rows.append(
+                f"d{i + 1}|{_clean(dev.get('name'))}|{','.join(f's{n}' for n in skills)}|"
+                f"{','.join(f's{n}:{_format_number(years)}' for n, years in experience)}"
+            )
+            self._row_terms.append(set(skills) | {n for n, _ in experience})
+
+    def _term(self, term):
+        """Vocabulary number of a skill or category, adding it on first use."""
+        term = _clean(term)
+        number = self._term_codes.get(term)
+        if number is None:
+            number = len(self._term_definitions) + 1
+            self._term_codes[term] = number
+            self._term_definitions.append(f"s{number}={term.replace(' ', '_')}")
+        return number
+
+    def covers(self, developers):
+        """True if every developer is in this roster with the same name, skills and experience."""
+        for dev in developers:
+            i = self.index_by_id.get(dev.get('id'))
+            if i is None:
+                return False
+            known = self.developers[i]
+            if known is dev:
+                continue
+            for key in ('name', 'skills', 'experience'):
+                if known.get(key) is not dev.get(key) and known.get(key) != dev.get(key):
+                    return False
+        return True
+
+    def encode(self, developers):
+        """Returns (roster_text, alias_to_id) for the given developers with their current workloads."""
+        indexes = [self.index_by_id[dev.get('id')] for dev in developers]
+        used_terms = set()
+        for i in indexes:
+            used_terms |= self._row_terms[i]
+        lines = [f"{ROSTER_VOCABULARY_MARKER} {' '.join(self._term_definitions[n - 1] for n in sorted(used_terms))}"]
+        lines.extend(
+            f"{self._rows[i]}|{_format_number(dev.get('current_workload_score', 0))}"
+            for i, dev in zip(indexes, developers)
+        )
+        alias_to_id = {f"d{i + 1}": self.developers[i].get('id') for i in indexes}
+        return "\n".join(lines), alias_to_id
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _roster_for(developers):
+    """The cached roster of the current team if it covers the developers, else a one-off roster."""
+    try:
+        snapshot = get_developer_snapshot()
+    except Exception as e:
+        logger.warning(f"Roster: could not read the developer snapshot, encoding without the cache: {e}")
+        snapshot = None
+    if snapshot is not None and snapshot.version is not None:
+        with _cache_lock:
+            roster = _cache.get(snapshot.version)
+            if roster is not None:
+                _cache.move_to_end(snapshot.version)
+        if roster is None:
+            roster = CompactRoster(snapshot.developers, snapshot.version)
+            with _cache_lock:
+                _cache[snapshot.version] = roster
+                while len(_cache) > ROSTER_CACHE_SIZE:
+                    _cache.popitem(last=False)
+            logger.info(f"Roster: encoded {len(roster.developers)} developers for roster version {snapshot.version}.")
+        if roster.covers(developers):
+            return roster
+    return CompactRoster(developers)
+
+
+def encode_roster(developers, compact=None):
+    """
+    Encodes developers for a prompt. Returns (roster_text, description, alias_to_id): the
+    description explains the format to the model, and alias_to_id maps the ids used in the text
+    back to real developer ids (empty for the JSON format, which uses real ids).
+    """
+    if compact is None:
+        compact = ALLOCATION_COMPACT_ROSTER
+    if not compact:
+        roster_text = json.dumps([
+            {"id": d.get("id"), "name": d.get("name"), "skills": d.get("skills"), "experience": d.get("experience"),
+             "current_workload_score": d.get("current_workload_score", 0)}
+            for d in developers
+        ])
+        return roster_text, JSON_ROSTER_DESCRIPTION, {}
+    roster_text, alias_to_id = _roster_for(developers).encode(developers)
+    return roster_text, COMPACT_ROSTER_DESCRIPTION, alias_to_id
+
+
+def resolve_aliases(assignments, alias_to_id, key="assigned_developer_id", text_key="reasoning"):
+    """
+    Replaces roster aliases with real developer ids in the parsed answer objects (in place), in
+    the id field and wherever the explanation mentions them.
+    """
+    if not alias_to_id:
+        return assignments
+    for item in assignments:
+        if not isinstance(item, dict):
+            continue
+        if isinstance(item.get(key), str) and item[key].strip() in alias_to_id:
+            item[key] = alias_to_id[item[key].strip()]
+        if isinstance(item.get(text_key), str):
+            item[text_key] = _ALIAS_PATTERN.sub(
+                lambda match: str(alias_to_id.get(match.group(0), match.group(0))), item[text_key]
+            )
+    return assignments
+
+
+def parse_roster(text):
+    """
+    Decodes a compact roster back into developer dicts (with aliases as ids), e.g. for the fake
+    LLM backend. Returns None if text does not start with a compact roster.
+    """
+    lines = [line.strip() for line in (text or "").strip().splitlines()]
+    if not lines or not lines[0].startswith(ROSTER_VOCABULARY_MARKER):
+        return None
+    vocabulary = {}
+    for definition in lines[0][len(ROSTER_VOCABULARY_MARKER):].split():
+        code, _, term = definition.partition("=")
+        vocabulary[code] = term.replace("_", " ")
+    developers = []
+    for line in lines[1:]:
+        parts = line.split("|")
+        if len(parts) != 5:
+            break
+        alias, name, skills, experience, workload = parts
+        experience_years = {}
+        for pair in filter(None, experience.split(",")):
+            code, _, years = pair.partition(":")
+            experience_years[vocabulary.get(code, code)] = float(years) if "." in years else int(years)
+        developers.append({
+            "id": alias,
+            "name": name,
+            "skills": [vocabulary.get(code, code) for code in filter(None, skills.split(","))],
+            "experience": experience_years,
+            "current_workload_score": float(workload) if "." in workload else int(workload),
+        })
+    return developers
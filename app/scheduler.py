@@ -0,0 +1,300 @@
+# app/scheduler.py
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "1") != "0"
+LLM_RPM_LIMIT = float(os.getenv("LLM_RPM_LIMIT", "0"))  # Requests per minute, 0 = unlimited
+LLM_TPM_LIMIT = float(os.getenv("LLM_TPM_LIMIT", "0"))  # Tokens per minute, 0 = unlimited
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+# Concurrency backs off when the smoothed call latency rises above this.
+LLM_TARGET_LATENCY_SECONDS = float(os.getenv("LLM_TARGET_LATENCY_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# HTTP status codes (as exposed by google.api_core exceptions' `code`) that are worth retrying.
+_RETRYABLE_CODES = {429, 500, 502, 503, 504}
+_THROTTLE_CODES = {429}
+_RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                    "InternalServerError", "ThrottledError"}
+# Decrease at most once per round trip (smoothed latency), so one burst of errors halves the limit once.
+_DEFAULT_DECREASE_COOLDOWN_SECONDS = 1.0
+_EWMA_ALPHA = 0.2
+
+_current_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+def _status_code(error):
+    code = getattr(error, 'code', None)
+    code = code() if callable(code) else code  # grpc errors expose code() instead of an int
+    return code if isinstance(code, int) else None
+
+
+def is_retryable_error(error):
+    """Quota, overload and transient server errors are retried; everything else is raised at once."""
+    return _status_code(error) in _RETRYABLE_CODES or type(error).__name__ in _RETRYABLE_NAMES
+
+
+def is_throttling_error(error):
+    return _status_code(error) in _THROTTLE_CODES or type(error).__name__ in {"ResourceExhausted", "TooManyRequests", "ThrottledError"}
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+@contextmanager
+def llm_priority(priority):
+    """Runs the block's LLM calls at the given priority (e.g. PRIORITY_BATCH for background work)."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class TokenBucket:
+    """Refills at rate_per_minute up to capacity. Callers are not thread-safe; the scheduler holds its lock."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if they are available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # A request larger than the bucket waits for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= amount  # May go negative: the debt delays later callers
+
+    def refund(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMScheduler:
+    """
+    Admission control shared by every LLM call in the process.
+
+    Callers queue by priority (interactive before batch, FIFO within a priority) and are admitted
+    when a concurrency slot is free and the requests-per-minute and tokens-per-minute buckets allow.
+    The concurrency limit adapts AIMD-style: it grows by one slot per window of successful calls and
+    is halved on throttling errors or cut back when the smoothed latency exceeds the target.
+    Retryable errors are retried with jittered exponential backoff (honouring retry_after if set).
+    """
+
+    def __init__(self, rpm_limit=LLM_RPM_LIMIT, tpm_limit=LLM_TPM_LIMIT,
+                 min_concurrency=LLM_MIN_CONCURRENCY, max_concurrency=LLM_MAX_CONCURRENCY,
+                 initial_concurrency=LLM_INITIAL_CONCURRENCY, target_latency=LLM_TARGET_LATENCY_SECONDS,
+                 max_retries=LLM_MAX_RETRIES, backoff_base=LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max=LLM_BACKOFF_MAX_SECONDS, rng=None):
+        self.request_bucket = TokenBucket(rpm_limit) if rpm_limit > 0 else None
+        self.token_bucket = TokenBucket(tpm_limit) if tpm_limit > 0 else None
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._random = rng or random.Random()
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.error_rate_ewma = 0.0
+        self._last_decrease = 0.0
+        self.stats = {"admitted": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    @property
+    def concurrency_limit(self):
+        return max(self.min_concurrency, int(self.limit))
+
+    def queued(self):
+        with self._cond:
+            return len(self._queue)
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, tokens=0):
+        """Blocks until the caller may start a call. Returns the time spent waiting in seconds."""
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if self._queue[0] is entry and self.in_flight < self.concurrency_limit:
+                        wait = max(
+                            self.request_bucket.wait_time(1) if self.request_bucket else 0.0,
+                            self.token_bucket.wait_time(tokens) if self.token_bucket and tokens else 0.0,
+                        )
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            if self.request_bucket:
+                self.request_bucket.take(1)
+            if self.token_bucket and tokens:
+                self.token_bucket.take(tokens)
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            self._cond.notify_all()  # The next caller in line may be admitted too
+        waited = time.monotonic() - started
+        QUEUE_WAIT.observe(waited, priority="batch" if priority >= PRIORITY_BATCH else "interactive")
+        return waited
+
+    def release(self, latency, error=None, token_adjustment=0):
+        """
+        Frees a slot and feeds the outcome into the concurrency controller. token_adjustment
+        corrects the tokens-per-minute bucket once the real token usage is known.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if self.token_bucket and token_adjustment:
+                if token_adjustment > 0:
+                    self.token_bucket.take(token_adjustment)
+                else:
+                    self.token_bucket.refund(-token_adjustment)
+            failed = error is not None and is_retryable_error(error)
+            self.error_rate_ewma += _EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate_ewma)
+            if not failed:
+                self.latency_ewma = latency if self.latency_ewma is None else (
+                    self.latency_ewma + _EWMA_ALPHA * (latency - self.latency_ewma))
+
+            now = time.monotonic()
+            if error is not None and is_throttling_error(error):
+                self._decrease(now, 0.5)
+            elif failed and self.error_rate_ewma > 0.2:
+                self._decrease(now, 0.75)
+            elif not failed and self.latency_ewma is not None and self.latency_ewma > self.target_latency:
+                self._decrease(now, 0.9)
+            elif error is None:
+                # Additive increase: about one extra slot per `limit` successful calls.
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self, now, factor):
+        cooldown = self.latency_ewma if self.latency_ewma is not None else _DEFAULT_DECREASE_COOLDOWN_SECONDS
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        previous = self.concurrency_limit
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        if self.concurrency_limit != previous:
+            logger.info(f"LLM scheduler: concurrency limit {previous} -> {self.concurrency_limit}")
+
+    def backoff_delay(self, attempt, error=None):
+        """Full-jitter exponential backoff, never shorter than the server's retry_after hint."""
+        delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        retry_after = getattr(error, 'retry_after', None)
+        if isinstance(retry_after, (int, float)):
+            delay = max(delay, retry_after)
+        return delay
+
+    def run(self, func, tokens=0, priority=None, usage_tokens=None):
+        """
+        Calls func() under admission control, retrying retryable errors up to max_retries times.
+        usage_tokens(result) optionally returns the real token usage to settle the TPM bucket.
+        """
+        priority = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            self.acquire(priority, tokens)
+            started = time.monotonic()
+            try:
+                result = func()
+            except Exception as e:
+                self.release(time.monotonic() - started, error=e)
+                with self._cond:
+                    if is_throttling_error(e):
+                        self.stats["throttled"] += 1
+                    if not is_retryable_error(e) or attempt >= self.max_retries:
+                        self.stats["failed"] += 1
+                        raise
+                    self.stats["retries"] += 1
+                delay = self.backoff_delay(attempt, e)
+                logger.warning(f"LLM scheduler: retryable error ({type(e).__name__}: {e}); "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                attempt += 1
+                time.sleep(delay)
+                continue
+            adjustment = 0
+            if usage_tokens is not None and tokens:
+                used = usage_tokens(result)
+                adjustment = used - tokens if used else 0
+            self.release(time.monotonic() - started, token_adjustment=adjustment)
+            return result
+
+    @contextmanager
+    def slot(self, tokens=0, priority=None):
+        """Admission without retries, for streamed calls whose chunks may already have been consumed."""
+        self.acquire(current_priority() if priority is None else priority, tokens)
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(time.monotonic() - started, error=error)
+
+
+QUEUE_WAIT = registry.histogram(
+    "taskmgr_llm_queue_wait_seconds", "Time LLM calls waited for admission by the scheduler.", ("priority",))
+
+llm_scheduler = LLMScheduler()
+
+
+def _scheduler_metrics():
+    return {
+        ("concurrency_limit",): llm_scheduler.concurrency_limit,
+        ("in_flight",): llm_scheduler.in_flight,
+        ("queued",): llm_scheduler.queued(),
+    }
+
+
+def _scheduler_counters():
+    return {(name,): value for name, value in llm_scheduler.stats.items()}
+
+
+registry.callback("taskmgr_llm_scheduler", "LLM scheduler state.", _scheduler_metrics, ("state",))
+registry.callback(
+    "taskmgr_llm_scheduler_calls_total", "LLM scheduler admissions, retries, throttling errors and failures.",
+    _scheduler_counters, ("result",), kind="counter"
+)
@@ -0,0 +1,267 @@
+# app/similarity.py
+"""
+Near-duplicate detection for use cases, so resubmissions that were reformatted, lightly edited or
+slightly extended can reuse an earlier breakdown instead of calling Gemini.
+
+Use cases are normalized and split into word shingles. A MinHash signature (SIMILARITY_NUM_PERM
+hash functions, computed with NumPy) estimates their Jaccard similarity, and locality-sensitive
+hashing over SIMILARITY_BANDS bands of the signature turns a lookup into a handful of indexed
+SQLite reads: only entries that share at least one band bucket are candidates, candidates whose
+stored signature makes a match implausible are dropped, and the rest are scored by the exact
+Jaccard similarity of their shingles.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_ENABLED = os.getenv("SIMILARITY_ENABLED", "1") != "0"
+SIMILARITY_DB_PATH = os.getenv(
+    "SIMILARITY_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'similarity_index.sqlite3')
+)
+# Minimum Jaccard similarity of word shingles for a stored breakdown to be reused.
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+SIMILARITY_SHINGLE_SIZE = int(os.getenv("SIMILARITY_SHINGLE_SIZE", "2"))
+SIMILARITY_NUM_PERM = 64
+SIMILARITY_BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a bucket
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "100000"))
+_PRUNE_EVERY = 500
+_MAX_CANDIDATES = 50
+_MAX_BUCKET_SCAN = 200  # Newest entries read per bucket; very crowded buckets come from boilerplate text
+_ESTIMATE_MARGIN = 0.15  # Candidates whose MinHash estimate is this far below the threshold are not rescored
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text, size=SIMILARITY_SHINGLE_SIZE):
+    """Set of word n-grams of the lower-cased text with punctuation removed."""
+    words = re.sub(r"[^\w\s]", " ", (text or "").lower()).split()
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures with universal hash functions h(x) = (a*x + b) mod p, vectorized over shingles."""
+
+    def __init__(self, num_perm=SIMILARITY_NUM_PERM, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return np.full(len(self.a), _MAX_HASH, dtype=np.uint64)
+        hashed = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingle_set],
+            dtype=np.uint64
+        )
+        # a, x < 2**32 keeps a*x + b below 2**64, so the uint64 arithmetic cannot overflow.
+        permuted = (hashed[:, None] * self.a[None, :] + self.b[None, :]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+def _band_keys(signature, scope, bands=SIMILARITY_BANDS):
+    """One signed 64-bit bucket key per band, salted with the scope so different prompts never collide."""
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(
+            signature[band * rows:(band + 1) * rows].tobytes() + scope.encode("utf-8") + bytes([band]),
+            digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+class SimilarityIndex:
+    """
+    Persistent MinHash-LSH index of use cases and their breakdowns in SQLite.
+    `scope` identifies what shaped a breakdown (model, categories, prompt); entries only match
+    lookups from the same scope.
+    """
+
+    def __init__(self, db_path=SIMILARITY_DB_PATH, threshold=SIMILARITY_THRESHOLD, max_entries=SIMILARITY_MAX_ENTRIES):
+        self.db_path = os.path.abspath(db_path)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._hasher = MinHasher()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._adds_since_prune = 0
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS use_cases ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, text_hash TEXT NOT NULL, "
+                "use_case TEXT NOT NULL, tasks TEXT NOT NULL, signature BLOB NOT NULL, stored_at REAL NOT NULL, "
+                "UNIQUE (scope, text_hash))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lsh_buckets ("
+                "bucket INTEGER NOT NULL, entry_id INTEGER NOT NULL, PRIMARY KEY (bucket, entry_id)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_use_cases_stored_at ON use_cases (stored_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def find(self, use_case_description, scope):
+        """
+        Returns the best stored match at or above the threshold as a dict with score, entry_id,
+        matched use_case and tasks, or None.
+        """
+        query_shingles = shingles(use_case_description)
+        if not query_shingles:
+            return None
+        signature = self._hasher.signature(query_shingles)
+        keys = _band_keys(signature, scope)
+        try:
+            conn = self._connection()
+            shared_bands = Counter(row[0] for row in conn.execute(
+                " UNION ALL ".join(
+                    f"SELECT * FROM (SELECT entry_id FROM lsh_buckets WHERE bucket = ? "
+                    f"ORDER BY entry_id DESC LIMIT {_MAX_BUCKET_SCAN})" for _ in keys
+                ),
+                keys
+            ))
+            candidate_ids = [entry_id for entry_id, _ in shared_bands.most_common(_MAX_CANDIDATES)]
+            if not candidate_ids:
+                self._count("misses")
+                return None
+            # Unary + keeps SQLite on the primary key instead of scanning the whole scope via the UNIQUE index.
+            rows = conn.execute(
+                f"SELECT id, signature, use_case, tasks FROM use_cases "
+                f"WHERE id IN ({','.join('?' * len(candidate_ids))}) AND +scope = ?",
+                candidate_ids + [scope]
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning(f"Similarity index: lookup failed ({e}).")
+            return None
+
+        best = None
+        for entry_id, stored_signature, use_case, tasks in rows:
+            # The fraction of agreeing MinHash values estimates the similarity; only plausible matches get an exact score.
+            estimate = np.count_nonzero(np.frombuffer(stored_signature, dtype=np.uint64) == signature) / len(signature)
+            if estimate < self.threshold - _ESTIMATE_MARGIN:
+                continue
+            score = jaccard(query_shingles, shingles(use_case))
+            if best is None or score > best[0]:
+                best = (score, entry_id, use_case, tasks)
+        if best is None or best[0] < self.threshold:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return {"score": round(best[0], 4), "entry_id": best[1], "use_case": best[2], "tasks": json.loads(best[3])}
+
+    def add(self, use_case_description, scope, tasks):
+        """Indexes a use case with its breakdown (replacing an entry with the same normalized text)."""
+        self.add_many([(use_case_description, tasks)], scope)
+
+    def add_many(self, items, scope):
+        """Indexes (use_case_description, tasks) pairs in one transaction, e.g. to backfill the index."""
+        now = time.time()
+        try:
+            conn = self._connection()
+            stored = 0
+            with conn:
+                for use_case_description, tasks in items:
+                    stored += self._insert(conn, use_case_description, scope, tasks, now)
+            with self._lock:
+                self._counters["stores"] += stored
+                self._adds_since_prune += stored
+                prune = self._adds_since_prune >= _PRUNE_EVERY
+                if prune:
+                    self._adds_since_prune = 0
+            if prune:
+                self._prune(conn)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning(f"Similarity index: store failed ({e}).")
+
+    def _insert(self, conn, use_case_description, scope, tasks, now):
+        query_shingles = shingles(use_case_description)
+        if not query_shingles:
+            return 0
+        signature = self._hasher.signature(query_shingles)
+        keys = _band_keys(signature, scope)
+        text_hash = hashlib.sha256(" ".join(sorted(query_shingles)).encode("utf-8")).hexdigest()
+        old = conn.execute("SELECT id FROM use_cases WHERE scope = ? AND text_hash = ?", (scope, text_hash)).fetchone()
+        if old:
+            conn.execute("DELETE FROM lsh_buckets WHERE entry_id = ?", (old[0],))
+            conn.execute("DELETE FROM use_cases WHERE id = ?", (old[0],))
+        entry_id = conn.execute(
+            "INSERT INTO use_cases (scope, text_hash, use_case, tasks, signature, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (scope, text_hash, use_case_description, json.dumps(tasks), signature.tobytes(), now)
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO lsh_buckets (bucket, entry_id) VALUES (?, ?)", [(key, entry_id) for key in keys]
+        )
+        return 1
+
+    def _prune(self, conn):
+        with conn:
+            cutoff = conn.execute(
+                "SELECT stored_at FROM use_cases ORDER BY stored_at DESC LIMIT 1 OFFSET ?", (self.max_entries,)
+            ).fetchone()
+            if cutoff is None:
+                return
+            conn.execute(
+                "DELETE FROM lsh_buckets WHERE entry_id IN (SELECT id FROM use_cases WHERE stored_at <= ?)", (cutoff[0],)
+            )
+            conn.execute("DELETE FROM use_cases WHERE stored_at <= ?", (cutoff[0],))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        try:
+            stats["entries"] = self._connection().execute("SELECT COUNT(*) FROM use_cases").fetchone()[0]
+        except sqlite3.Error:
+            stats["entries"] = None
+        stats["threshold"] = self.threshold
+        return stats
+
+
+similarity_index = SimilarityIndex()
+
+
+def _similarity_lookup_metrics():
+    with similarity_index._lock:
+        counters = dict(similarity_index._counters)
+    return {(name,): counters[name] for name in ("hits", "misses")}
+
+
+registry.callback(
+    "taskmgr_similarity_lookups_total", "Near-duplicate use case lookups by result.",
+    _similarity_lookup_metrics, ("result",), kind="counter"
+)
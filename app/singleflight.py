@@ -0,0 +1,167 @@
+# app/singleflight.py
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing still works across threads, not across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") != "0"
+# Lock and result files for coalescing across worker processes ("" disables the cross-process part).
+SINGLEFLIGHT_DIR = os.getenv(
+    "SINGLEFLIGHT_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'singleflight')
+)
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "120"))
+_RESULT_FILE_MAX_AGE_SECONDS = 300
+_PRUNE_INTERVAL_SECONDS = 60
+_LOCK_POLL_SECONDS = 0.05
+_MTIME_SLACK_SECONDS = 1.0  # Some filesystems only store whole-second modification times
+
+SHARED_THREAD = "thread"
+SHARED_PROCESS = "process"
+
+
+def coalescing_key(*parts):
+    """Hashes the parts of a request; whitespace runs are collapsed so trivially reformatted prompts match."""
+    normalized = [re.sub(r"\s+", " ", str(part)).strip() for part in parts]
+    return hashlib.sha256("\x1f".join(normalized).encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls so that only one of them does the work.
+
+    Within a process, callers with the same key wait for the first caller's result (or error).
+    Across processes, the first caller holds an exclusive lock file for the key while it works and
+    then writes its serialized result next to it; a process that finds the lock held waits for it
+    and reuses that result if it was written while it waited. Results are never reused after the
+    call finished, so this is not a cache: sequential calls always do their own work.
+    """
+
+    def __init__(self, directory=SINGLEFLIGHT_DIR, wait_seconds=SINGLEFLIGHT_WAIT_SECONDS):
+        self.directory = os.path.abspath(directory) if directory and fcntl else None
+        self.wait_seconds = wait_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def call(self, key, func, serialize=None, deserialize=None):
+        """
+        Runs func() unless an identical call is already in flight, in which case its result is shared.
+        Returns (result, shared) where shared is None for the caller that did the work, or
+        SHARED_THREAD / SHARED_PROCESS for callers that received someone else's result.
+        serialize/deserialize convert the result to and from JSON-compatible data for other processes.
+        """
+        with self._lock:
+            in_flight = self._calls.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._calls[key] = _InFlight()
+
+        if not leader:
+            if in_flight.done.wait(self.wait_seconds):
+                if in_flight.error is not None:
+                    raise in_flight.error
+                return in_flight.result, SHARED_THREAD
+            logger.warning("Single-flight: timed out waiting for an identical in-flight call; calling directly.")
+            return func(), None
+
+        try:
+            if self.directory and serialize and deserialize:
+                result, shared = self._call_across_processes(key, func, serialize, deserialize)
+            else:
+                result, shared = func(), None
+            in_flight.result = result
+            return result, shared
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            in_flight.done.set()
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _call_across_processes(self, key, func, serialize, deserialize):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = os.path.join(self.directory, f"{key}.lock")
+        result_path = os.path.join(self.directory, f"{key}.json")
+        with open(lock_path, 'a') as lock_file:
+            waited_since = None
+            deadline = time.monotonic() + self.wait_seconds
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if waited_since is None:
+                        waited_since = time.time()
+                    if time.monotonic() > deadline:
+                        logger.warning("Single-flight: timed out waiting for another process; calling directly.")
+                        return func(), None
+                    time.sleep(_LOCK_POLL_SECONDS)
+            try:
+                if waited_since is not None:
+                    shared = self._read_result(result_path, waited_since, deserialize)
+                    if shared is not None:
+                        return shared, SHARED_PROCESS
+                result = func()
+                self._write_result(result_path, serialize(result))
+                return result, None
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._prune()
+
+    def _read_result(self, result_path, written_after, deserialize):
+        try:
+            if os.path.getmtime(result_path) < written_after - _MTIME_SLACK_SECONDS:
+                return None  # Left over from an earlier call, not the one we waited for
+            with open(result_path, 'r') as f:
+                return deserialize(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Single-flight: no usable shared result at {result_path}: {e}")
+            return None
+
+    def _write_result(self, result_path, data):
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".result-", dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, result_path)
+        except OSError as e:
+            logger.warning(f"Single-flight: could not share a result with other processes: {e}")
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < _PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        # Removing a lock file that is still in use only costs a missed coalescing opportunity:
+        # a process opening the path afterwards gets a fresh file and makes its own call.
+        try:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if now - os.path.getmtime(path) > _RESULT_FILE_MAX_AGE_SECONDS:
+                    os.remove(path)
+        except OSError:
+            pass  # Another process pruned the same file first
+
+
+single_flight = SingleFlight()
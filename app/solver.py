@@ -0,0 +1,216 @@
+# app/solver.py
+"""
+Workload-balanced optimal assignment of tasks to developers.
+
+The cost of giving a task to a developer is a skill gate (developers without a matching skill
+cannot take it), a credit for experience in the task's category, and a workload term that grows
+quadratically with the developer's load, so piling work onto one person gets more expensive with
+every task. Tasks of the same category share a cost row, so the task x developer matrix is stored
+compressed as category x developer and built with NumPy.
+
+The assignment is solved as a min-cost flow: categories supply tasks, developers absorb them at
+an increasing marginal workload cost, and every unit is routed along a shortest augmenting path
+(successive shortest paths). A path may move already placed tasks between developers when that
+makes room more cheaply, which is what makes the result optimal rather than greedy. Because a
+developer's load depends on task effort, the flow is solved one effort class at a time, largest
+first; each class is solved optimally on top of the load left by the previous ones.
+"""
+import logging
+import os
+
+import numpy as np
+
+from .local_allocation import build_category_index
+
+logger = logging.getLogger(__name__)
+
+SOLVER_EXPERIENCE_WEIGHT = float(os.getenv("SOLVER_EXPERIENCE_WEIGHT", "1.0"))
+SOLVER_WORKLOAD_WEIGHT = float(os.getenv("SOLVER_WORKLOAD_WEIGHT", "1.0"))
+SOLVER_EXPERIENCE_CAP_YEARS = 10  # More years than this earn no extra credit
+
+
+class _Stage:
+    """Min-cost flow for the tasks of one effort class (all tasks move a developer's load by `effort`)."""
+
+    def __init__(self, costs, loads, effort, supply, workload_weight):
+        self.costs = costs                # (categories, developers), inf where ineligible
+        self.loads = loads                # (developers,), updated in place as tasks are placed
+        self.effort = effort
+        self.remaining = supply.copy()    # Unplaced tasks per category
+        self.flow = np.zeros(costs.shape, dtype=np.int64)
+        self.workload_weight = workload_weight
+        categories = costs.shape[0]
+        # exchange[a, b]: cheapest way to turn a free task of category a into a free task of category b,
+        # by giving the a-task to a developer who releases one of their b-tasks (via exchange_dev[a, b]).
+        self.exchange = np.full((categories, categories), np.inf)
+        self.exchange_dev = np.zeros((categories, categories), dtype=np.int64)
+        self.marginal = self._marginal(self.loads)
+        self.finish = np.empty(categories)
+        self.finish_dev = np.zeros(categories, dtype=np.int64)
+        for category in range(categories):
+            self._refresh_finish(category)
+
+    def _marginal(self, loads):
+        return self.workload_weight * self.effort * (2 * loads + self.effort)
+
+    def _refresh_finish(self, category):
+        # Cheapest developer to take one more task of this category, workload included.
+        totals = self.costs[category] + self.marginal
+        dev = int(np.argmin(totals))
+        self.finish[category], self.finish_dev[category] = totals[dev], dev
+
+    def _refresh_exchange(self, released):
+        holders = self.flow[released] > 0
+        if not holders.any():
+            self.exchange[:, released] = np.inf
+            return
+        deltas = self.costs[:, holders] - self.costs[released, holders]
+        best = np.argmin(deltas, axis=1)
+        self.exchange[:, released] = deltas[np.arange(deltas.shape[0]), best]
+        self.exchange_dev[:, released] = np.flatnonzero(holders)[best]
+
+    def _shortest_paths(self):
+        """Bellman-Ford over the category nodes, starting from every category with unplaced tasks."""
+        categories = len(self.remaining)
+        distance = np.where(self.remaining > 0, 0.0, np.inf)
+        predecessor = np.full(categories, -1, dtype=np.int64)
+        exchange = self.exchange.copy()
+        np.fill_diagonal(exchange, np.inf)
+        for _ in range(categories):
+            candidates = distance[:, None] + exchange
+            best_from = np.argmin(candidates, axis=0)
+            best = candidates[best_from, np.arange(categories)]
+            improved = best < distance - 1e-9
+            if not improved.any():
+                break
+            distance = np.where(improved, best, distance)
+            predecessor = np.where(improved, best_from, predecessor)
+        return distance, predecessor
+
+    def place_one(self):
+        """Routes one more task along the cheapest augmenting path. Returns False when nothing is placeable."""
+        distance, predecessor = self._shortest_paths()
+        totals = distance + self.finish
+        end = int(np.argmin(totals))
+        if not np.isfinite(totals[end]):
+            return False
+
+        dev = int(self.finish_dev[end])
+        self.flow[end, dev] += 1
+        changed_flow = {end}
+        category = end
+        for _ in range(len(predecessor)):
+            if predecessor[category] == -1:
+                break
+            source = int(predecessor[category])
+            via = int(self.exchange_dev[source, category])
+            self.flow[source, via] += 1
+            self.flow[category, via] -= 1
+            changed_flow.update((source, category))
+            category = source
+        self.remaining[category] -= 1
+
+        self.loads[dev] += self.effort
+        self.marginal[dev] = self._marginal(self.loads[dev])
+        for row in np.flatnonzero(self.finish_dev == dev):
+            self._refresh_finish(int(row))
+        for released in changed_flow:
+            self._refresh_exchange(released)
+        return True
+
+
+def build_cost_matrix(developers, categories, category_index=None, experience_weight=SOLVER_EXPERIENCE_WEIGHT):
+    """
+    Returns (costs, experience): category x developer arrays where costs holds the skill gate (inf
+    for developers without a matching skill) and the experience credit, and experience the
+    (capped) years the credit is based on.
+    """
+    if category_index is None or any(category not in category_index for category in categories):
+        category_index = build_category_index(developers, categories)
+    experience = np.zeros((len(categories), len(developers)))
+    eligible = np.zeros((len(categories), len(developers)), dtype=bool)
+    for row, category in enumerate(categories):
+        members = category_index[category]
+        eligible[row, members] = True
+        experience[row, members] = [
+            (developers[i].get('experience') or {}).get(category, 0) or 0 for i in members
+        ]
+    experience = np.clip(experience, 0, SOLVER_EXPERIENCE_CAP_YEARS)
+    costs = np.where(eligible, -experience_weight * experience, np.inf)
+    return costs, experience
+
+
+def solve_assignments(tasks, developers, effort_scorer, category_index=None,
+                      experience_weight=SOLVER_EXPERIENCE_WEIGHT, workload_weight=SOLVER_WORKLOAD_WEIGHT):
+    """
+    Assigns tasks to minimize total cost (see the module docstring).
+    Returns (assigned_tasks, unplaced_indexes) like local_allocation.assign_tasks_locally; every
+    assigned task also carries 'assignment_cost', a breakdown of the cost the solver charged for it.
+    The developer dicts passed in are never mutated.
+    """
+    tasks = list(tasks or [])
+    developers = list(developers or [])
+    effort_scores = [effort_scorer(task.get('effort', "Medium")) for task in tasks]
+    categories = sorted({str(task.get('category')) for task in tasks})
+    category_rows = {category: row for row, category in enumerate(categories)}
+    task_rows = np.array([category_rows[str(task.get('category'))] for task in tasks], dtype=np.int64)
+
+    assignee = np.full(len(tasks), -1, dtype=np.int64)
+    if developers and tasks:
+        costs, experience = build_cost_matrix(developers, categories, category_index, experience_weight)
+        loads = np.array([dev.get('current_workload_score', 0) or 0 for dev in developers], dtype=float)
+        for effort in sorted(set(effort_scores), reverse=True):
+            in_stage = np.flatnonzero(np.array(effort_scores) == effort)
+            supply = np.bincount(task_rows[in_stage], minlength=len(categories))
+            supply[~np.isfinite(costs).any(axis=1)] = 0  # Nobody can take these; they stay unassigned
+            stage = _Stage(costs, loads, effort, supply, workload_weight)
+            for _ in range(int(supply.sum())):
+                if not stage.place_one():
+                    break
+            # Hand the per-category counts back to concrete tasks in input order.
+            for row in np.flatnonzero(stage.flow.sum(axis=1)):
+                row_tasks = in_stage[task_rows[in_stage] == row]
+                assignee[row_tasks[:stage.flow[row].sum()]] = np.repeat(np.arange(len(developers)), stage.flow[row])
+
+    workloads = [dev.get('current_workload_score', 0) or 0 for dev in developers]
+    assigned_tasks = [None] * len(tasks)
+    unplaced_indexes = []
+    # Replay in solving order (largest effort first) so each explanation shows the load it was charged.
+    for i in sorted(range(len(tasks)), key=lambda i: -effort_scores[i]):
+        task_copy = tasks[i].copy()
+        task_copy['effort_score'] = effort_scores[i]
+        dev_index = int(assignee[i])
+        category = str(tasks[i].get('category'))
+        if dev_index == -1:
+            unplaced_indexes.append(i)
+            task_copy['assigned_to'] = {"id": "unassigned", "name": "Unassigned (No matching skills)"}
+            task_copy['ai_reasoning'] = "No developer has a skill matching this task's category."
+            assigned_tasks[i] = task_copy
+            continue
+
+        developer = developers[dev_index]
+        before = workloads[dev_index]
+        after = before + effort_scores[i]
+        workloads[dev_index] = after
+        years = float(experience[category_rows[category], dev_index])
+        experience_cost = -experience_weight * years
+        workload_cost = workload_weight * (after ** 2 - before ** 2)
+        task_copy['assigned_to'] = {"id": developer.get('id'), "name": developer.get('name')}
+        task_copy['assignment_cost'] = {
+            "total": round(experience_cost + workload_cost, 3),
+            "experience": round(experience_cost, 3),
+            "workload": round(workload_cost, 3),
+            "experience_years": years,
+            "workload_before": before,
+            "workload_after": after,
+        }
+        task_copy['ai_reasoning'] = (
+            f"{developer.get('name')} ({developer.get('id')}) has {category} skills ({years:g} years experience, "
+            f"credit {experience_cost:.2f}); workload {before} -> {after} (cost {workload_cost:.2f}). "
+            f"Chosen by the optimal solver to minimize total cost across the team."
+        )
+        assigned_tasks[i] = task_copy
+
+    if unplaced_indexes:
+        logger.info(f"Solver: {len(unplaced_indexes)} of {len(tasks)} task(s) have no developer with a matching skill.")
+    return assigned_tasks, unplaced_indexes
@@ -0,0 +1,88 @@
+# app/stream_parser.py
+import json
+
+
+class IncrementalArrayParser:
+    """
+    Incremental parser for a streamed JSON array of objects, e.g. a Gemini response that is
+    still being generated. Text can be fed in arbitrary chunks; every top-level object is
+    returned as soon as its closing brace arrives, without waiting for the rest of the array.
+
+    Anything before the opening '[' (such as a ```json fence) is ignored, as is anything after
+    the closing ']'. Objects that are complete but not valid JSON are collected in `errors`.
+    """
+
+    def __init__(self):
+        self.started = False    # Seen the opening '[' of the array
+        self.finished = False   # Seen the closing ']' of the array
+        self.errors = []        # (raw_text, error message) for objects that failed json.loads
+        self._depth = 0         # Nesting depth inside the current object
+        self._in_string = False
+        self._escaped = False
+        self._current = []      # Characters of the object being captured
+
+    def feed(self, chunk):
+        """Consumes a chunk of text and returns the list of objects completed by it."""
+        completed = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if char == '[':
+                    self.started = True
+                continue
+
+            if self._depth == 0:
+                # Between objects at the array level: only '{' and ']' matter.
+                if char == '{':
+                    self._depth = 1
+                    self._current = [char]
+                elif char == ']':
+                    self.finished = True
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = ''.join(self._current)
+                    self._current = []
+                    try:
+                        completed.append(json.loads(raw))
+                    except json.JSONDecodeError as e:
+                        self.errors.append((raw, str(e)))
+        return completed
+
+    @property
+    def truncated(self):
+        """True if the input ended before the array (or the object being read) was closed."""
+        return not self.finished
+
+
+def salvage_json_array(text):
+    """
+    Parses a JSON array of objects from a complete (non-streamed) response, tolerating damage.
+    A well-formed array is returned as is; otherwise every complete, valid object is extracted
+    from the malformed or truncated text. Returns (objects, errors, truncated) where errors are
+    (raw_text, error message) pairs for objects that could not be decoded.
+    """
+    try:
+        value = json.loads(text)
+        if isinstance(value, list):
+            return value, [], False
+    except json.JSONDecodeError:
+        pass
+    parser = IncrementalArrayParser()
+    objects = parser.feed(text)
+    return objects, parser.errors, parser.truncated
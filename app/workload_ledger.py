@@ -0,0 +1,297 @@
+# app/workload_ledger.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Off by default: /process_use_case only previews workloads unless the ledger is enabled.
+WORKLOAD_LEDGER_ENABLED = os.getenv("WORKLOAD_LEDGER_ENABLED", "0") == "1"
+WORKLOAD_LEDGER_PATH = os.getenv(
+    "WORKLOAD_LEDGER_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'workload_ledger.sqlite3')
+)
+# Open assignments older than this are expired automatically (0 = never).
+WORKLOAD_MAX_AGE_SECONDS = int(os.getenv("WORKLOAD_MAX_AGE_SECONDS", "0"))
+# Closed assignments are kept this long before compaction removes them.
+WORKLOAD_RETENTION_SECONDS = int(os.getenv("WORKLOAD_RETENTION_SECONDS", str(30 * 24 * 60 * 60)))
+_EXPIRE_CHECK_INTERVAL_SECONDS = 60
+
+EVENT_ASSIGNED = "assigned"
+EVENT_COMPLETED = "completed"
+EVENT_EXPIRED = "expired"
+
+
+def parse_compact_request(data):
+    """
+    Validates a /workload/compact body. Returns ({"older_than_seconds", "expire_older_than_seconds"}, None)
+    or (None, error_message); expire_older_than_seconds is None when open assignments are not expired.
+    """
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return None, "Request body must be a JSON object"
+    options = {}
+    for key, default in (("older_than_seconds", WORKLOAD_RETENTION_SECONDS), ("expire_older_than_seconds", None)):
+        value = data.get(key)
+        if value is None:
+            options[key] = default
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not value >= 0:
+            return None, f"'{key}' must be a non-negative number of seconds"
+        options[key] = value
+    return options, None
+
+
+class WorkloadLedger:
+    """
+    Append-only log of workload assignments with materialized per-developer totals.
+
+    Every assignment is an `assigned` event carrying its effort score. Completing or expiring it
+    appends a closing event with the negated score instead of editing the original row, and the
+    totals table is updated in the same transaction. Writers take SQLite's write lock up front
+    (BEGIN IMMEDIATE), so concurrent requests and worker processes never lose updates.
+    The effective workload of a developer is their stored current_workload_score plus their total.
+    """
+
+    def __init__(self, db_path=WORKLOAD_LEDGER_PATH, max_age_seconds=WORKLOAD_MAX_AGE_SECONDS):
+        self.db_path = os.path.abspath(db_path)
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._totals_version = None
+        self._last_expire_check = 0.0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workload_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, assignment_id INTEGER, developer_id TEXT NOT NULL, "
+                "task_title TEXT, effort_score NUMERIC NOT NULL, status TEXT NOT NULL, source TEXT, "
+                "created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_workload_events_assignment ON workload_events (assignment_id)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_workload_events_open ON workload_events (status, created_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workload_totals ("
+                "developer_id TEXT PRIMARY KEY, total NUMERIC NOT NULL, open_count INTEGER NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _write(self, operation):
+        """Runs operation(conn) in an IMMEDIATE transaction and bumps the ledger version."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = operation(conn)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute(f"PRAGMA user_version = {int(version) + 1}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _apply_to_totals(self, conn, deltas, now):
+        # deltas: {developer_id: (score delta, open assignment count delta)}
+        conn.executemany(
+            "INSERT INTO workload_totals (developer_id, total, open_count, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(developer_id) DO UPDATE SET total = total + excluded.total, "
+            "open_count = open_count + excluded.open_count, updated_at = excluded.updated_at",
+            [(developer_id, score, count, now) for developer_id, (score, count) in deltas.items()]
+        )
+
+    def _close(self, conn, rows, status, now):
+        deltas = {}
+        for row in rows:
+            conn.execute(
+                "INSERT INTO workload_events (assignment_id, developer_id, task_title, effort_score, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (row['id'], row['developer_id'], row['task_title'], -row['effort_score'], status, now)
+            )
+            score, count = deltas.get(row['developer_id'], (0, 0))
+            deltas[row['developer_id']] = (score - row['effort_score'], count - 1)
+        self._apply_to_totals(conn, deltas, now)
+        return len(rows)
+
+    _OPEN_ASSIGNMENTS_SQL = (
+        "SELECT a.* FROM workload_events a WHERE a.status = 'assigned' "
+        "AND NOT EXISTS (SELECT 1 FROM workload_events c WHERE c.assignment_id = a.id)"
+    )
+
+    def record_assignments(self, assignments, source=None):
+        """
+        Appends one `assigned` event per (developer_id, task_title, effort_score) and updates the
+        totals atomically. Returns the new assignment ids in the same order.
+        """
+        if not assignments:
+            return []
+        self.expire_if_due()
+
+        def operation(conn):
+            now = time.time()
+            ids = []
+            deltas = {}
+            for developer_id, task_title, effort_score in assignments:
+                cursor = conn.execute(
+                    "INSERT INTO workload_events (developer_id, task_title, effort_score, status, source, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (developer_id, task_title, effort_score, EVENT_ASSIGNED, source, now)
+                )
+                ids.append(cursor.lastrowid)
+                score, count = deltas.get(developer_id, (0, 0))
+                deltas[developer_id] = (score + effort_score, count + 1)
+            self._apply_to_totals(conn, deltas, now)
+            return ids
+
+        return self._write(operation)
+
+    def complete(self, assignment_id):
+        """Marks an open assignment as done. Returns False if it does not exist or is already closed."""
+        def operation(conn):
+            rows = conn.execute(self._OPEN_ASSIGNMENTS_SQL + " AND a.id = ?", (assignment_id,)).fetchall()
+            return self._close(conn, rows, EVENT_COMPLETED, time.time()) == 1
+
+        return self._write(operation)
+
+    def expire_older_than(self, max_age_seconds):
+        """Closes every open assignment older than max_age_seconds. Returns how many were expired."""
+        def operation(conn):
+            now = time.time()
+            rows = conn.execute(
+                self._OPEN_ASSIGNMENTS_SQL + " AND a.created_at < ?", (now - max_age_seconds,)
+            ).fetchall()
+            return self._close(conn, rows, EVENT_EXPIRED, now)
+
+        expired = self._write(operation)
+        if expired:
+            logger.info(f"Workload ledger: expired {expired} assignment(s) older than {max_age_seconds}s.")
+        return expired
+
+    def expire_if_due(self):
+        """Applies max_age_seconds decay, at most once per check interval per process."""
+        if not self.max_age_seconds:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_expire_check < _EXPIRE_CHECK_INTERVAL_SECONDS:
+                return 0
+            self._last_expire_check = now
+        return self.expire_older_than(self.max_age_seconds)
+
+    def compact(self, older_than_seconds=WORKLOAD_RETENTION_SECONDS):
+        """
+        Deletes assignments that were closed more than older_than_seconds ago (together with their
+        closing events) and rebuilds the totals from the remaining log, correcting any drift.
+        Returns the number of events removed.
+        """
+        def operation(conn):
+            cutoff = time.time() - older_than_seconds
+            closed_ids = [row[0] for row in conn.execute(
+                "SELECT assignment_id FROM workload_events WHERE assignment_id IS NOT NULL AND created_at < ?",
+                (cutoff,)
+            )]
+            removed = 0
+            for start in range(0, len(closed_ids), 500):
+                chunk = closed_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                removed += conn.execute(
+                    f"DELETE FROM workload_events WHERE id IN ({placeholders}) OR assignment_id IN ({placeholders})",
+                    chunk + chunk
+                ).rowcount
+            conn.execute("DELETE FROM workload_totals")
+            conn.execute(
+                "INSERT INTO workload_totals (developer_id, total, open_count, updated_at) "
+                "SELECT developer_id, SUM(effort_score), "
+                "SUM(CASE WHEN status = 'assigned' THEN 1 ELSE -1 END), ? "
+                "FROM workload_events GROUP BY developer_id",
+                (time.time(),)
+            )
+            conn.execute("DELETE FROM workload_totals WHERE open_count = 0 AND ABS(total) < 1e-9")
+            return removed
+
+        removed = self._write(operation)
+        logger.info(f"Workload ledger: compaction removed {removed} event(s).")
+        return removed
+
+    def totals(self):
+        """
+        {developer_id: outstanding effort score}. Cached per process and re-read only after
+        another writer has changed the ledger.
+        """
+        conn = self._connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        with self._lock:
+            if version == self._totals_version:
+                return self._totals
+        totals = {
+            row['developer_id']: row['total']
+            for row in conn.execute("SELECT developer_id, total FROM workload_totals")
+        }
+        with self._lock:
+            self._totals, self._totals_version = totals, version
+        return totals
+
+    def effective_workloads(self, snapshot):
+        """Base workloads for a WorkloadOverlay: the snapshot workload plus outstanding ledger score."""
+        workloads = {}
+        for developer_id, total in self.totals().items():
+            dev = snapshot.get(developer_id)
+            if dev is not None and total:
+                workloads[developer_id] = dev.get('current_workload_score', 0) + total
+        return workloads
+
+    def open_assignments(self, developer_id=None, limit=100):
+        sql = self._OPEN_ASSIGNMENTS_SQL
+        params = []
+        if developer_id:
+            sql += " AND a.developer_id = ?"
+            params.append(developer_id)
+        sql += " ORDER BY a.id DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {key: row[key] for key in ("id", "developer_id", "task_title", "effort_score", "source", "created_at")}
+            for row in self._connection().execute(sql, params)
+        ]
+
+    def stats(self):
+        conn = self._connection()
+        events = conn.execute("SELECT COUNT(*) FROM workload_events").fetchone()[0]
+        open_count, outstanding = conn.execute(
+            "SELECT COALESCE(SUM(open_count), 0), COALESCE(SUM(total), 0) FROM workload_totals"
+        ).fetchone()
+        return {
+            "enabled": WORKLOAD_LEDGER_ENABLED,
+            "events": events,
+            "open_assignments": open_count,
+            "outstanding_effort": outstanding,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+
+workload_ledger = WorkloadLedger()
+
+
+def _open_assignment_metrics():
+    if not WORKLOAD_LEDGER_ENABLED:
+        return {}
+    return {(): workload_ledger.stats()["open_assignments"]}
+
+
+registry.callback(
+    "taskmgr_workload_open_assignments", "Open assignments in the workload ledger.", _open_assignment_metrics
+)
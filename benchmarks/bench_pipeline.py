@@ -0,0 +1,285 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark and load test for the use case pipeline.
+
+Drives the Flask app (POST /process_use_case) with the offline fake LLM backend and sweeps
+task counts, team sizes and concurrency levels. Results are written as JSON and can be compared
+against a previous run:
+
+    python -m benchmarks.bench_pipeline --team-sizes 10,500,5000 --concurrency 1,8
+    python -m benchmarks.bench_pipeline --baseline benchmarks/results/baseline.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# Keep benchmark runs away from the real cache, job and workload databases.
+_SCRATCH_DIR = tempfile.mkdtemp(prefix="bench-pipeline-")
+os.environ.setdefault("BREAKDOWN_CACHE_PATH", os.path.join(_SCRATCH_DIR, "breakdown_cache.sqlite3"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_SCRATCH_DIR, "jobs.sqlite3"))
+os.environ.setdefault("WORKLOAD_LEDGER_PATH", os.path.join(_SCRATCH_DIR, "workload_ledger.sqlite3"))
+os.environ.setdefault("SINGLEFLIGHT_DIR", os.path.join(_SCRATCH_DIR, "singleflight"))
+
+from app import data_manager, llm, pipeline  # noqa: E402
+from app.agent import TASK_CATEGORIES  # noqa: E402
+from app.local_allocation import CATEGORY_SKILL_HINTS  # noqa: E402
+from app.main import app  # noqa: E402
+
+DEFAULT_RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+STAGES = ("load_developers", "breakdown", "allocation")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(values):
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def generate_developers(team_size, seed=0):
+    """Builds a synthetic team with a realistic mix of skills, experience and workload."""
+    rng = random.Random(seed)
+    developers = []
+    for i in range(team_size):
+        categories = rng.sample(TASK_CATEGORIES, k=rng.randint(1, 4))
+        skills = list(categories)
+        for category in categories:
+            hints = CATEGORY_SKILL_HINTS.get(category, [])
+            skills.extend(rng.sample(hints, k=min(len(hints), rng.randint(0, 2))))
+        developers.append({
+            "id": f"dev{i + 1}",
+            "name": f"Developer {i + 1}",
+            "skills": skills,
+            "experience": {category: rng.randint(1, 10) for category in categories},
+            "current_workload_score": rng.randint(0, 10),
+        })
+    return developers
+
+
+class RecordingBackend(llm.FakeBackend):
+    """Fake backend that also records the size of every prompt it receives."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prompt_bytes = {}
+        self._record_lock = threading.Lock()
+
+    def generate(self, prompt, purpose=None):
+        with self._record_lock:
+            self.prompt_bytes.setdefault(purpose or "other", []).append(len(prompt.encode("utf-8")))
+        return super().generate(prompt, purpose=purpose)
+
+
+class StageTimer:
+    """Wraps the pipeline's stage functions to collect per-stage durations in milliseconds."""
+
+    def __init__(self):
+        self.durations = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def _wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self.durations[stage].append(elapsed_ms)
+        return timed
+
+    def install(self):
+        targets = {
+            "load_developers": "get_developer_snapshot",
+            "breakdown": "split_use_case_into_tasks",
+            "allocation": "assign_tasks",
+        }
+        for stage, attribute in targets.items():
+            self._originals[attribute] = getattr(pipeline, attribute)
+            setattr(pipeline, attribute, self._wrap(stage, self._originals[attribute]))
+
+    def uninstall(self):
+        for attribute, original in self._originals.items():
+            setattr(pipeline, attribute, original)
+        self._originals = {}
+
+
+def run_scenario(task_count, team_size, concurrency, requests_per_scenario, latency, jitter,
+                 allocation_mode, developers_path, seed):
+    with open(developers_path, 'w') as f:
+        json.dump(generate_developers(team_size, seed=seed), f)
+    data_manager.DATA_FILE_PATH = developers_path
+
+    backend = RecordingBackend(latency_seconds=latency, jitter_seconds=jitter, seed=seed, task_count=task_count)
+    llm.set_backend(backend)
+    timer = StageTimer()
+    timer.install()
+
+    latencies_ms = []
+    response_bytes = []
+    errors = 0
+    results_lock = threading.Lock()
+
+    def one_request(i):
+        nonlocal errors
+        client = app.test_client()
+        body = {
+            "use_case": f"As a user I want feature {i}: a dashboard page, an API endpoint, a database schema "
+                        f"and email notifications, with tests and deployment.",
+            "bypass_cache": True,
+        }
+        if allocation_mode:
+            body["allocation_mode"] = allocation_mode
+        started = time.perf_counter()
+        response = client.post('/process_use_case', json=body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with results_lock:
+            latencies_ms.append(elapsed_ms)
+            response_bytes.append(len(response.get_data()))
+            if response.status_code != 200:
+                errors += 1
+
+    try:
+        wall_started = time.perf_counter()
+        # The app logs every request to stdout; keep the benchmark report readable.
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(one_request, range(requests_per_scenario)))
+        wall_seconds = time.perf_counter() - wall_started
+    finally:
+        timer.uninstall()
+
+    prompt_stats = {}
+    for purpose, sizes in backend.prompt_bytes.items():
+        mean_bytes = sum(sizes) / len(sizes)
+        prompt_stats[purpose] = {"mean_bytes": round(mean_bytes, 1), "mean_tokens": round(mean_bytes / 4, 1)}
+
+    return {
+        "name": f"tasks={task_count},team={team_size},concurrency={concurrency}",
+        "params": {
+            "task_count": task_count, "team_size": team_size, "concurrency": concurrency,
+            "requests": requests_per_scenario, "llm_latency_s": latency, "llm_jitter_s": jitter,
+            "allocation_mode": allocation_mode,
+        },
+        "latency_ms": summarize(latencies_ms),
+        "throughput_rps": round(requests_per_scenario / wall_seconds, 2) if wall_seconds else 0.0,
+        "errors": errors,
+        "response_bytes_mean": round(sum(response_bytes) / len(response_bytes), 1) if response_bytes else 0,
+        "prompts": prompt_stats,
+        "stages_ms": {stage: summarize(durations) for stage, durations in timer.durations.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Returns a list of human-readable regressions of results against baseline."""
+    baseline_by_name = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in results["scenarios"]:
+        previous = baseline_by_name.get(scenario["name"])
+        if previous is None:
+            continue
+        old_p95, new_p95 = previous["latency_ms"]["p95"], scenario["latency_ms"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{scenario['name']}: p95 latency {old_p95:.1f} ms -> {new_p95:.1f} ms")
+        old_rps, new_rps = previous["throughput_rps"], scenario["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - threshold):
+            regressions.append(f"{scenario['name']}: throughput {old_rps:.2f} -> {new_rps:.2f} req/s")
+    return regressions
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the use case pipeline with a simulated LLM.")
+    parser.add_argument("--task-counts", type=_int_list, default=[5, 20], help="Comma-separated tasks per use case")
+    parser.add_argument("--team-sizes", type=_int_list, default=[10, 500, 5000], help="Comma-separated team sizes")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Simulated LLM latency jitter in seconds")
+    parser.add_argument("--allocation-mode", default=None, help="allocation_mode sent with each request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Where to write the JSON results")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    developers_path = os.path.join(_SCRATCH_DIR, "developers.json")
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+        },
+        "scenarios": [],
+    }
+    for team_size in args.team_sizes:
+        for task_count in args.task_counts:
+            for concurrency in args.concurrency:
+                scenario = run_scenario(
+                    task_count, team_size, concurrency, args.requests, args.latency, args.jitter,
+                    args.allocation_mode, developers_path, args.seed
+                )
+                results["scenarios"].append(scenario)
+                latency = scenario["latency_ms"]
+                print(f"{scenario['name']:<40} p50 {latency['p50']:>8.1f} ms  p95 {latency['p95']:>8.1f} ms  "
+                      f"p99 {latency['p99']:>8.1f} ms  {scenario['throughput_rps']:>7.2f} req/s  "
+                      f"alloc prompt {scenario['prompts'].get('allocation', {}).get('mean_bytes', 0):>10.0f} B  "
+                      f"rss {scenario['peak_rss_mb']} MB")
+
+    output_path = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
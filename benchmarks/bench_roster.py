@@ -0,0 +1,94 @@
+# benchmarks/bench_roster.py
+"""
+Benchmark for the compact allocation roster (app/roster.py).
+
+For synthetic teams of several sizes, compares the developer roster of an allocation prompt in
+the original JSON format and in the compact format: estimated tokens of the roster and of the
+whole prompt, and the time to encode it (the compact roster cold, i.e. on a new team version,
+and warm, when only the workload column is filled in):
+
+    python -m benchmarks.bench_roster --team-sizes 8,25,100 --tasks 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.allocation import generate_ai_allocation_prompt  # noqa: E402
+from app.llm import estimate_tokens  # noqa: E402
+from app.roster import COMPACT_ROSTER_DESCRIPTION, CompactRoster, encode_roster  # noqa: E402
+from benchmarks.bench_pipeline import DEFAULT_RESULTS_DIR, generate_developers  # noqa: E402
+from benchmarks.bench_solver import generate_tasks  # noqa: E402
+
+
+def _best_seconds(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    return min(durations)
+
+
+def run_scenario(team_size, task_count, repeat, seed):
+    developers = generate_developers(team_size, seed=seed)
+    tasks_json = json.dumps([
+        {key: task[key] for key in ("title", "category", "effort", "description")}
+        for task in generate_tasks(task_count, seed=seed)
+    ])
+    json_roster, json_description, _ = encode_roster(developers, compact=False)
+    roster = CompactRoster(developers, version="bench")
+    compact_roster, _ = roster.encode(developers)
+    json_prompt = generate_ai_allocation_prompt(tasks_json, json_roster, json_description)
+    compact_prompt = generate_ai_allocation_prompt(tasks_json, compact_roster, COMPACT_ROSTER_DESCRIPTION, "d1")
+    return {
+        "name": f"team={team_size},tasks={task_count}",
+        "params": {"team_size": team_size, "task_count": task_count, "repeat": repeat, "seed": seed},
+        "roster_tokens": {"json": estimate_tokens(json_roster), "compact": estimate_tokens(compact_roster)},
+        "prompt_tokens": {"json": estimate_tokens(json_prompt), "compact": estimate_tokens(compact_prompt)},
+        "encode_ms": {
+            "json": round(_best_seconds(lambda: encode_roster(developers, compact=False), repeat) * 1000, 3),
+            "compact_cold": round(_best_seconds(lambda: CompactRoster(developers).encode(developers), repeat) * 1000, 3),
+            "compact_warm": round(_best_seconds(lambda: roster.encode(developers), repeat) * 1000, 3),
+        },
+    }
+
+
+def parse_int_list(value):
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare JSON and compact allocation rosters.")
+    parser.add_argument("--team-sizes", type=parse_int_list, default=[8, 25, 100], help="Comma-separated team sizes")
+    parser.add_argument("--tasks", type=int, default=10, help="Tasks in each prompt")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/roster-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    scenarios = []
+    for team_size in args.team_sizes:
+        scenario = run_scenario(team_size, args.tasks, args.repeat, args.seed)
+        scenarios.append(scenario)
+        roster, prompt, encode = scenario["roster_tokens"], scenario["prompt_tokens"], scenario["encode_ms"]
+        print(f"{scenario['name']}: roster ~{roster['json']} -> ~{roster['compact']} tokens "
+              f"({100 * (1 - roster['compact'] / roster['json']):.0f}% fewer), prompt ~{prompt['json']} -> "
+              f"~{prompt['compact']} tokens | encode json {encode['json']} ms, compact cold "
+              f"{encode['compact_cold']} ms, warm {encode['compact_warm']} ms")
+
+    output_path = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"roster-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({"scenarios": scenarios}, f, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
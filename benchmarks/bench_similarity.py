@@ -0,0 +1,92 @@
+# benchmarks/bench_similarity.py
+"""
+Benchmark for the near-duplicate use case index (app/similarity.py).
+
+Fills a scratch index with synthetic use cases, then times lookups of near-duplicates (a copy
+with one sentence appended) and of unrelated texts, and reports how many near-duplicates were found:
+
+    python -m benchmarks.bench_similarity --entries 100000 --queries 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.similarity import SimilarityIndex  # noqa: E402
+from benchmarks.bench_pipeline import percentile  # noqa: E402
+
+_SUBJECTS = ["user", "admin", "customer", "manager", "guest", "developer", "support agent", "auditor"]
+_ACTIONS = ["export", "import", "search", "filter", "archive", "share", "approve", "schedule", "review", "sync"]
+_OBJECTS = ["invoices", "reports", "orders", "profiles", "tickets", "documents", "payments", "projects",
+            "messages", "calendars", "dashboards", "contracts"]
+_DETAILS = ["as CSV files", "with email notifications", "from the mobile app", "with an audit trail",
+            "in bulk", "by date range", "with role-based access", "through the public API",
+            "with two-factor authentication", "in real time", "with retries on failure", "per team"]
+
+
+_VOCABULARY = [f"{a}{b}" for a in ("ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "vu", "ze")
+               for b in ("bar", "dex", "fin", "gol", "hum", "jet", "kor", "lum", "mox", "nip",
+                         "pov", "qua", "rin", "sol", "tev", "urn", "vak", "wil", "xen", "yor")]
+
+
+def generate_use_case(rng):
+    sentences = [
+        f"As a {rng.choice(_SUBJECTS)}, I want to {rng.choice(_ACTIONS)} {rng.choice(_OBJECTS)} "
+        f"{rng.choice(_DETAILS)} so that the {' '.join(rng.sample(_VOCABULARY, 3))} works."
+        for _ in range(rng.randint(2, 4))
+    ]
+    sentences.append(f"Reference {rng.randrange(10 ** 9)}.")
+    return " ".join(sentences)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the near-duplicate use case index.")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Exit non-zero if the p95 lookup time exceeds this many milliseconds")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    scope = "bench"
+    index = SimilarityIndex(db_path=os.path.join(tempfile.mkdtemp(prefix="bench-similarity-"), "index.sqlite3"),
+                            max_entries=args.entries + 1)
+    use_cases = [generate_use_case(rng) for _ in range(args.entries)]
+    started = time.perf_counter()
+    for start in range(0, len(use_cases), 5000):
+        index.add_many([(text, [{"title": f"Task for entry {start + i}"}])
+                        for i, text in enumerate(use_cases[start:start + 5000])], scope)
+    print(f"Indexed {args.entries} use cases in {time.perf_counter() - started:.1f}s")
+
+    results = {}
+    for kind in ("near_duplicate", "unrelated"):
+        durations_ms = []
+        found = 0
+        for _ in range(args.queries):
+            if kind == "near_duplicate":
+                query = rng.choice(use_cases) + " The page should also work offline."
+            else:
+                query = generate_use_case(rng)
+            started = time.perf_counter()
+            match = index.find(query, scope)
+            durations_ms.append((time.perf_counter() - started) * 1000)
+            found += match is not None
+        results[kind] = (percentile(durations_ms, 50), percentile(durations_ms, 95), found)
+        print(f"{kind}: p50 {results[kind][0]:.3f} ms, p95 {results[kind][1]:.3f} ms, "
+              f"matched {found}/{args.queries}")
+
+    if args.max_p95_ms is not None and any(p95 > args.max_p95_ms for _, p95, _ in results.values()):
+        print(f"Lookup p95 exceeded {args.max_p95_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# benchmarks/bench_solver.py
+"""
+Benchmark for the optimal assignment solver (allocation_mode "optimal").
+
+Generates synthetic sprints and teams, then times app.solver.solve_assignments against the local
+rule-based engine and compares how balanced the resulting workloads are:
+
+    python -m benchmarks.bench_solver --tasks 5000 --team-sizes 500 --repeat 3
+    python -m benchmarks.bench_solver --tasks 500,5000 --team-sizes 50,500 --max-seconds 1.0
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.agent import EFFORT_SCALE, TASK_CATEGORIES  # noqa: E402
+from app.allocation import get_effort_score  # noqa: E402
+from app.local_allocation import assign_tasks_locally  # noqa: E402
+from app.solver import SOLVER_EXPERIENCE_WEIGHT, SOLVER_WORKLOAD_WEIGHT, solve_assignments  # noqa: E402
+from benchmarks.bench_pipeline import DEFAULT_RESULTS_DIR, generate_developers  # noqa: E402
+
+
+def generate_tasks(task_count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "title": f"Task {i + 1}",
+            "description": f"Synthetic task {i + 1}",
+            "category": rng.choice(TASK_CATEGORIES),
+            "effort": rng.choice(EFFORT_SCALE),
+        }
+        for i in range(task_count)
+    ]
+
+
+def evaluate(assigned_tasks, developers):
+    """Workload spread and the solver's objective for a set of assignments."""
+    base = {dev['id']: dev.get('current_workload_score', 0) or 0 for dev in developers}
+    loads = dict(base)
+    experience_credit = 0.0
+    by_id = {dev['id']: dev for dev in developers}
+    unassigned = 0
+    for task in assigned_tasks:
+        assignee_id = task['assigned_to']['id']
+        if assignee_id == "unassigned":
+            unassigned += 1
+            continue
+        loads[assignee_id] += task['effort_score']
+        years = (by_id[assignee_id].get('experience') or {}).get(task['category'], 0) or 0
+        experience_credit += SOLVER_EXPERIENCE_WEIGHT * min(years, 10)
+    values = list(loads.values())
+    workload_cost = SOLVER_WORKLOAD_WEIGHT * sum(loads[i] ** 2 - base[i] ** 2 for i in loads)
+    return {
+        "unassigned": unassigned,
+        "max_workload": max(values),
+        "min_workload": min(values),
+        "workload_stdev": round(statistics.pstdev(values), 3),
+        "objective": round(workload_cost - experience_credit, 1),
+    }
+
+
+def run_scenario(task_count, team_size, repeat, seed):
+    developers = generate_developers(team_size, seed=seed)
+    tasks = generate_tasks(task_count, seed=seed)
+    results = {}
+    for name, allocate in (
+        ("solver", lambda: solve_assignments(tasks, developers, get_effort_score)),
+        ("local", lambda: assign_tasks_locally(tasks, developers, get_effort_score)),
+    ):
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            assigned_tasks, _ = allocate()
+            durations.append(time.perf_counter() - started)
+        results[name] = {
+            "seconds_best": round(min(durations), 4),
+            "seconds_mean": round(sum(durations) / len(durations), 4),
+            **evaluate(assigned_tasks, developers),
+        }
+    return {
+        "name": f"tasks={task_count},team={team_size}",
+        "params": {"task_count": task_count, "team_size": team_size, "repeat": repeat, "seed": seed},
+        **results,
+    }
+
+
+def parse_int_list(value):
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the optimal assignment solver.")
+    parser.add_argument("--tasks", type=parse_int_list, default=[5000], help="Comma-separated task counts")
+    parser.add_argument("--team-sizes", type=parse_int_list, default=[500], help="Comma-separated team sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Exit non-zero if the solver's best time exceeds this in any scenario")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/solver-<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    scenarios = []
+    for task_count in args.tasks:
+        for team_size in args.team_sizes:
+            scenario = run_scenario(task_count, team_size, args.repeat, args.seed)
+            scenarios.append(scenario)
+            solver, local = scenario["solver"], scenario["local"]
+            print(f"{scenario['name']}: solver {solver['seconds_best']:.3f}s "
+                  f"(stdev {solver['workload_stdev']}, max {solver['max_workload']}, objective {solver['objective']}) | "
+                  f"local {local['seconds_best']:.3f}s "
+                  f"(stdev {local['workload_stdev']}, max {local['max_workload']}, objective {local['objective']})")
+
+    output_path = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"solver-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({"scenarios": scenarios}, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if args.max_seconds is not None:
+        too_slow = [s["name"] for s in scenarios if s["solver"]["seconds_best"] > args.max_seconds]
+        if too_slow:
+            print(f"Solver exceeded {args.max_seconds}s in: {', '.join(too_slow)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())